@@ -1,25 +1,15 @@
 # accuracy_checker.py
 import time
-import json
-import re
 import csv
 from datetime import datetime
-from reviewer import fetch_pr_diff, llm, parser, save_text_to_file
+from reviewer import fetch_pr_diff, build_chain, save_text_to_file
+from llm_cache import get_cache
 from config import OWNER, REPO, PR_NUMBER, GITHUB_TOKEN
 from prompts_v2 import get_prompts
+from map_reduce import review_diff
+from review_heuristics import heuristic_metrics  # shared heuristics scanner
+from json_extract import parse_verdict
 from langchain.prompts import ChatPromptTemplate
-from langchain.schema.output_parser import StrOutputParser
-
-def heuristic_metrics(review: str):
-    metrics = {}
-    metrics["length_words"] = len(review.split())
-    metrics["bullet_points"] = len(re.findall(r"^\s*[-•*]\s+", review, flags=re.MULTILINE))
-    metrics["mentions_bug"] = bool(re.search(r"\bbug\b|\berror\b|\bfail\b|\bissue\b", review, flags=re.I))
-    metrics["mentions_suggest"] = bool(re.search(r"\bsuggest\b|\brecommend\b|\bconsider\b|\bfix\b|\baction\b", review, flags=re.I))
-    sections = ["summary", "bugs", "errors", "code quality", "suggestions", "improvements", "tests", "positive", "final review"]
-    lowered = review.lower()
-    metrics["sections_presence"] = {s: (s.lower() in lowered) for s in sections}
-    return metrics
 
 evaluator_prompt = ChatPromptTemplate.from_messages([
     ("system", "You are an objective senior software engineer who judges review quality."),
@@ -41,24 +31,14 @@ evaluator_prompt = ChatPromptTemplate.from_messages([
 ])
 
 def meta_evaluate(diff: str, review: str):
-    chain = evaluator_prompt | llm | StrOutputParser()
+    chain = build_chain(evaluator_prompt)
     try:
         out = chain.invoke({"diff": diff[:4000], "review": review})
     except Exception as e:
         return {"error": f"evaluator invoke failed: {e}"}, None
 
-    parsed = None
-    try:
-        parsed = json.loads(out.strip())
-    except Exception:
-        m = re.search(r"\{.*\}", out, flags=re.S)
-        if m:
-            try:
-                parsed = json.loads(m.group(0))
-            except Exception:
-                parsed = {"error": "could not parse JSON", "raw": out}
-        else:
-            parsed = {"error": "no JSON in evaluator output", "raw": out}
+    # first well-formed JSON object in the answer, schema-checked, scores clamped to 1-10
+    parsed = parse_verdict(out)
     return parsed, out
 
 def meta_to_score(meta_parsed: dict):
@@ -101,10 +81,9 @@ def run_all(post_to_github: bool = False):
     results = []
     for name, prompt in prompts.items():
         print(f"-> Running prompt: {name}")
-        chain = prompt | llm | parser
         start = time.time()
         try:
-            review = chain.invoke({"diff": diff_text[:4000]})
+            review = review_diff(prompt, diff_text)
         except Exception as e:
             review = f"ERROR: prompt invoke failed: {e}"
         elapsed = time.time() - start
@@ -168,6 +147,10 @@ def run_all(post_to_github: bool = False):
         print(f"{r['prompt']:20} | {'█' * bars} {r['final_score']}")
     print("===============================\n")
 
+    cache = get_cache()
+    if cache is not None:
+        print(f"LLM cache: {cache.stats()}")
+
     return results_sorted
 
 if __name__ == "__main__":
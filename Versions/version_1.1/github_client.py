@@ -0,0 +1,132 @@
+# github_client.py
+#
+# Shared GitHub REST client used by reviewer.py (and everything that fetches PRs).
+#
+# Responsible for:
+#  - Keeping one pooled requests.Session alive (no new TCP+TLS handshake per call)
+#  - Fetching a PR diff in a single request via the v3 diff media type
+#  - On-disk ETag / Last-Modified cache: unchanged resources come back as 304s,
+#    which GitHub does not count against the rate limit
+
+import hashlib
+import json
+import os
+import threading
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+CACHE_DIR = os.getenv("GITHUB_CACHE_DIR", ".github_cache")
+JSON_MEDIA_TYPE = "application/vnd.github+json"
+DIFF_MEDIA_TYPE = "application/vnd.github.v3.diff"
+
+
+class GitHubClient:
+    def __init__(self, token: Optional[str] = None, api_url: str = API_URL,
+                 cache_dir: Optional[str] = CACHE_DIR, pool_size: int = 10):
+        self.token = token
+        self.api_url = api_url.rstrip("/")
+        self.cache_dir = cache_dir
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.stats = {"requests": 0, "not_modified": 0}
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    # ------------------------------
+    # Conditional-request cache
+    # ------------------------------
+    def _cache_path(self, url: str, accept: str) -> str:
+        key = hashlib.sha1(f"{accept}\n{url}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load_cached(self, url: str, accept: str) -> Optional[dict]:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._cache_path(url, accept), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _store_cached(self, url: str, accept: str, response: requests.Response):
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if not self.cache_dir or not (etag or last_modified):
+            return
+        path = self._cache_path(url, accept)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"etag": etag, "last_modified": last_modified, "body": response.text}, f)
+        os.replace(tmp, path)
+
+    # ------------------------------
+    # Requests
+    # ------------------------------
+    def _headers(self, accept: str, token: Optional[str]) -> dict:
+        headers = {"Accept": accept}
+        token = token or self.token
+        if token:
+            headers["Authorization"] = f"token {token}"
+        return headers
+
+    def get_text(self, path: str, accept: str = JSON_MEDIA_TYPE, token: Optional[str] = None,
+                 params: Optional[dict] = None) -> str:
+        """GET an API path, revalidating any cached copy with If-None-Match / If-Modified-Since"""
+        url = path if path.startswith("http") else f"{self.api_url}{path}"
+        if params:
+            url = requests.Request("GET", url, params=params).prepare().url
+        headers = self._headers(accept, token)
+        cached = self._load_cached(url, accept)
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        response = self.session.get(url, headers=headers)
+        with self._lock:
+            self.stats["requests"] += 1
+            if response.status_code == 304:
+                self.stats["not_modified"] += 1
+
+        if response.status_code == 304 and cached:
+            return cached["body"]
+        if response.status_code != 200:
+            raise Exception(f"GitHub API Error ({response.status_code}): {response.text[:500]}")
+        self._store_cached(url, accept, response)
+        return response.text
+
+    def get_json(self, path: str, token: Optional[str] = None, params: Optional[dict] = None):
+        return json.loads(self.get_text(path, JSON_MEDIA_TYPE, token, params))
+
+    def post_json(self, path: str, payload: dict, token: Optional[str] = None) -> dict:
+        url = f"{self.api_url}{path}"
+        response = self.session.post(url, headers=self._headers(JSON_MEDIA_TYPE, token), json=payload)
+        if response.status_code not in (200, 201):
+            raise Exception(f"GitHub API Error ({response.status_code}): {response.text[:500]}")
+        return response.json()
+
+    # ------------------------------
+    # PR helpers
+    # ------------------------------
+    def get_pr_diff(self, owner: str, repo: str, pr_number: int, token: Optional[str] = None) -> str:
+        """Fetch the unified diff of a PR in one round-trip"""
+        return self.get_text(f"/repos/{owner}/{repo}/pulls/{pr_number}", DIFF_MEDIA_TYPE, token)
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+def get_client() -> GitHubClient:
+    """Process-wide client so every caller shares the same connection pool and cache"""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = GitHubClient()
+        return _default_client
@@ -0,0 +1,121 @@
+# map_reduce.py
+#
+# Map-reduce review for diffs that do not fit in a single prompt.
+# Replaces the old `diff_text[:4000]` truncation, which silently dropped every
+# file past the first few thousand characters.
+#
+#  - split:  the diff is cut on file boundaries ("diff --git"), oversized files on
+#            hunk boundaries ("@@"), and the pieces are packed into chunks of at most
+#            `max_chars` characters (each piece keeps its file header)
+#  - map:    every chunk is reviewed with the caller's prompt, in parallel (bounded)
+#  - reduce: partial reviews are merged, `REDUCE_FANIN` at a time, into one review
+#            that keeps the section layout of the prompt
+#
+# A diff that already fits in one chunk costs exactly one LLM call, as before.
+# A larger diff costs ~len(diff)/max_chars map calls plus a few merge calls.
+
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from langchain.prompts import ChatPromptTemplate
+from reviewer import build_chain
+
+MAX_CHARS = int(os.getenv("REVIEW_CHUNK_CHARS", "4000"))
+MAP_WORKERS = int(os.getenv("REVIEW_MAP_WORKERS", "4"))
+REDUCE_FANIN = 4
+
+merge_prompt = ChatPromptTemplate.from_messages([
+    ("system", "You are a senior software engineer consolidating a code review."),
+    ("human",
+     "A Pull Request diff was too large for one pass, so it was reviewed in {num_parts} parts.\n"
+     "Merge the partial reviews below into ONE review of the whole PR:\n"
+     "- Keep the section headings and layout used by the partial reviews "
+     "(e.g. Summary, Bugs, Suggestions, Final Review).\n"
+     "- Merge duplicate findings, keep file names and concrete details.\n"
+     "- Do not mention that the review was split into parts.\n\n"
+     "{reviews}")
+])
+
+# -------------------------
+# Splitting
+# -------------------------
+_FILE_SPLIT = re.compile(r"^(?=diff --git )", re.MULTILINE)
+_HUNK_SPLIT = re.compile(r"^(?=@@ )", re.MULTILINE)
+
+def _split_oversized(piece: str, max_chars: int):
+    """Split one file's diff on hunk boundaries, then on lines, keeping the file header"""
+    parts = _HUNK_SPLIT.split(piece)
+    header, hunks = parts[0], parts[1:]
+    if not hunks:
+        hunks, header = [piece], ""
+    budget = max(1, max_chars - len(header))
+    for hunk in hunks:
+        if len(hunk) <= budget:
+            yield header + hunk
+            continue
+        # a single huge hunk: cut on line boundaries, repeating the hunk header line
+        hunk_header, _, body = hunk.partition("\n")
+        line_budget = max(1, budget - len(hunk_header) - 1)
+        current = []
+        size = 0
+        for line in body.splitlines(keepends=True):
+            if current and size + len(line) > line_budget:
+                yield f"{header}{hunk_header}\n{''.join(current)}"
+                current, size = [], 0
+            current.append(line)
+            size += len(line)
+        if current:
+            yield f"{header}{hunk_header}\n{''.join(current)}"
+
+def split_diff(diff_text: str, max_chars: int = MAX_CHARS):
+    """Split a unified diff into chunks of at most ~max_chars, on file/hunk boundaries"""
+    pieces = []
+    for file_diff in _FILE_SPLIT.split(diff_text):
+        if not file_diff:
+            continue
+        if len(file_diff) <= max_chars:
+            pieces.append(file_diff)
+        else:
+            pieces.extend(_split_oversized(file_diff, max_chars))
+
+    # greedy packing: small files share a chunk instead of costing one call each
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + len(piece) > max_chars:
+            chunks.append(current)
+            current = ""
+        current += piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+# -------------------------
+# Map / reduce
+# -------------------------
+def _merge(partials, max_workers):
+    chain = build_chain(merge_prompt)
+
+    def merge_group(group):
+        if len(group) == 1:
+            return group[0]
+        reviews = "\n\n".join(f"### Partial review {i + 1}\n{text}" for i, text in enumerate(group))
+        return chain.invoke({"num_parts": len(group), "reviews": reviews})
+
+    while len(partials) > 1:
+        groups = [partials[i:i + REDUCE_FANIN] for i in range(0, len(partials), REDUCE_FANIN)]
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            partials = list(pool.map(merge_group, groups))
+    return partials[0]
+
+def review_diff(prompt, diff_text: str, max_chars: int = MAX_CHARS, max_workers: int = MAP_WORKERS) -> str:
+    """Review a diff of any size with `prompt` (a template taking {diff})"""
+    chain = build_chain(prompt)
+    chunks = split_diff(diff_text, max_chars) or [diff_text]
+    if len(chunks) == 1:
+        return chain.invoke({"diff": chunks[0]})
+
+    print(f"Diff is {len(diff_text)} chars: reviewing {len(chunks)} chunks (map-reduce)")
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        partials = list(pool.map(lambda chunk: chain.invoke({"diff": chunk}), chunks))
+    return _merge(partials, max(1, max_workers))
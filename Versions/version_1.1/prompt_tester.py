@@ -13,13 +13,15 @@
 
 import time
 import json
-import re
 import os
 from datetime import datetime
-from reviewer import fetch_pr_diff, save_text_to_file, post_review_comment, llm, parser
+from reviewer import fetch_pr_diff, save_text_to_file, post_review_comment, build_chain
+from llm_cache import get_cache
 from config import OWNER, REPO, PR_NUMBER, GITHUB_TOKEN
 from prompts import ACTIVE_PROMPT  # user must uncomment one ACTIVE_PROMPT in prompts.py
-from langchain.schema.output_parser import StrOutputParser
+from map_reduce import review_diff
+from review_heuristics import heuristic_metrics as _heuristic_metrics
+from json_extract import parse_verdict
 from langchain.prompts import ChatPromptTemplate
 
 # Fallback check
@@ -29,27 +31,9 @@ if "ACTIVE_PROMPT" not in globals() and ACTIVE_PROMPT is None:
 # ------------------------------
 # Heuristic scoring functions
 # ------------------------------
-def count_bullets(text: str) -> int:
-    return len(re.findall(r"^\s*[-•*]\s+", text, flags=re.MULTILINE))
-
-def has_sections(text: str, section_titles):
-    found = {}
-    lowered = text.lower()
-    for s in section_titles:
-        found[s] = (s.lower() in lowered)
-    return found
-
 def heuristic_metrics(review: str):
-    metrics = {}
-    metrics["length_chars"] = len(review)
-    metrics["length_words"] = len(review.split())
-    metrics["bullet_points"] = count_bullets(review)
-    metrics["mentions_bug"] = bool(re.search(r"\bbug\b|\berror\b|\bfail\b", review, flags=re.I))
-    metrics["mentions_suggest"] = bool(re.search(r"\bsuggest\b|\brecommend\b|\bconsider\b|\bfix\b", review, flags=re.I))
-    # detect structured headings
-    sections = ["summary", "bugs", "errors", "code quality", "suggestions", "improvements", "tests", "positive", "positive notes"]
-    metrics["sections_presence"] = has_sections(review, sections)
-    return metrics
+    # prompt_tester's keyword/section set (see review_heuristics.PROFILES)
+    return _heuristic_metrics(review, profile="tester")
 
 # ------------------------------
 # Meta-evaluator: ask LLM to score the review
@@ -77,22 +61,11 @@ evaluator_prompt_template = ChatPromptTemplate.from_messages([
 ])
 
 def meta_evaluate(diff: str, review: str):
-    chain = evaluator_prompt_template | llm | StrOutputParser()
+    chain = build_chain(evaluator_prompt_template)
     # pass both diff and review as input
     out = chain.invoke({"diff": diff[:4000], "review": review})
-    # try to parse JSON from LLM output robustly
-    try:
-        parsed = json.loads(out.strip())
-    except Exception:
-        # attempt to extract JSON-like substring
-        m = re.search(r"\{.*\}", out, flags=re.S)
-        if m:
-            try:
-                parsed = json.loads(m.group(0))
-            except Exception:
-                parsed = {"error": "Could not parse JSON from evaluator output", "raw": out}
-        else:
-            parsed = {"error": "No JSON found", "raw": out}
+    # first well-formed JSON object in the answer, schema-checked, scores clamped to 1-10
+    parsed = parse_verdict(out)
     return parsed, out
 
 # ------------------------------
@@ -104,9 +77,8 @@ def run_test(post_to_github: bool = False, save_report: bool = True):
     print("Diff fetched (length: {} chars)".format(len(diff_text)))
 
     print("\nRunning active prompt through LLM...")
-    chain = ACTIVE_PROMPT | llm | parser
     start = time.time()
-    review_text = chain.invoke({"diff": diff_text[:4000]})
+    review_text = review_diff(ACTIVE_PROMPT, diff_text)
     elapsed = time.time() - start
     print(f"Review generated in {elapsed:.2f}s\n")
 
@@ -183,6 +155,9 @@ def run_test(post_to_github: bool = False, save_report: bool = True):
         print("Meta-evaluation could not be parsed. See report file for raw output.")
 
     print("===================")
+    cache = get_cache()
+    if cache is not None:
+        print(f"LLM cache: {cache.stats()}")
     return {
         "review": review_text,
         "heuristics": heur,
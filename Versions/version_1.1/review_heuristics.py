@@ -0,0 +1,107 @@
+# review_heuristics.py
+#
+# Deterministic review heuristics (length, bullets, keyword mentions, section headings),
+# shared by accuracy_checker and prompt_tester (one copy instead of one per tool).
+#
+# All patterns are compiled once per profile and the review is lower-cased once. Section
+# titles and keywords are located with plain substring search (str.find / `in`, C speed);
+# keyword hits then get a word-boundary check, which replaces the `\bbug\b|\berror\b|...`
+# regex scans. A single regex alternation over every title and keyword (Aho-Corasick
+# style) was measured at 13-27x slower than substring search in CPython, whose regex
+# engine retries the alternation at every character, so it is not used.
+#
+# Profiles keep the keyword/section sets the different tools have always used:
+#  - default: accuracy_checker (version_1.2 and version_1.1)
+#  - tester:  prompt_tester (version_1.1)
+
+import re
+import numpy as np
+
+PROFILES = {
+    "default": {
+        "sections": ["summary", "bugs", "errors", "code quality", "suggestions", "improvements",
+                     "tests", "positive", "final review"],
+        "bug_words": ["bug", "error", "fail", "issue"],
+        "suggest_words": ["suggest", "recommend", "consider", "fix", "action"],
+    },
+    "tester": {
+        "sections": ["summary", "bugs", "errors", "code quality", "suggestions", "improvements",
+                     "tests", "positive", "positive notes"],
+        "bug_words": ["bug", "error", "fail"],
+        "suggest_words": ["suggest", "recommend", "consider", "fix"],
+    },
+}
+
+_BULLET = re.compile(r"^\s*[-•*]\s+", re.MULTILINE)
+
+
+def _is_word(c: str) -> bool:
+    return c.isalnum() or c == "_"
+
+
+class ReviewScanner:
+    def __init__(self, sections, bug_words, suggest_words):
+        self.sections = list(sections)
+        self._titles = [s.lower() for s in sections]
+        self.bug_words = [w.lower() for w in bug_words]
+        self.suggest_words = [w.lower() for w in suggest_words]
+        self._bug = re.compile(r"\b(?:" + "|".join(map(re.escape, self.bug_words)) + r")\b", re.I)
+        self._suggest = re.compile(r"\b(?:" + "|".join(map(re.escape, self.suggest_words)) + r")\b", re.I)
+
+    @staticmethod
+    def _mentions(pattern, words, review: str, lowered: str) -> bool:
+        if not review.isascii():
+            # the regex's case folding is wider than lower() outside ASCII
+            return pattern.search(review) is not None
+        # ASCII: find each keyword with str.find (C speed) and check the word boundaries
+        end = len(lowered)
+        for w in words:
+            i = lowered.find(w)
+            while i != -1:
+                j = i + len(w)
+                if (i == 0 or not _is_word(lowered[i - 1])) and (j == end or not _is_word(lowered[j])):
+                    return True
+                i = lowered.find(w, i + 1)
+        return False
+
+    def scan(self, review: str) -> dict:
+        lowered = review.lower()
+        return {
+            "length_chars": len(review),
+            "length_words": len(review.split()),
+            "bullet_points": len(_BULLET.findall(review)),
+            "mentions_bug": self._mentions(self._bug, self.bug_words, review, lowered),
+            "mentions_suggest": self._mentions(self._suggest, self.suggest_words, review, lowered),
+            "sections_presence": {s: (t in lowered) for s, t in zip(self.sections, self._titles)},
+        }
+
+
+_scanners = {}
+
+def get_scanner(profile: str = "default") -> ReviewScanner:
+    if profile not in _scanners:
+        _scanners[profile] = ReviewScanner(**PROFILES[profile])
+    return _scanners[profile]
+
+
+def heuristic_metrics(review: str, profile: str = "default") -> dict:
+    return get_scanner(profile).scan(review)
+
+
+def heuristic_metrics_batch(reviews, profile: str = "default", columnar: bool = False):
+    """Heuristics for many reviews (e.g. the archive, when re-tuning score weights).
+
+    Returns a list of metric dicts, or with columnar=True a dict of NumPy arrays:
+    length_chars, length_words, bullet_points, mentions_bug, mentions_suggest (n,)
+    and sections (n, n_sections) in the profile's section order.
+    """
+    scanner = get_scanner(profile)
+    metrics = [scanner.scan(review) for review in reviews]
+    if not columnar:
+        return metrics
+    columns = {key: np.array([m[key] for m in metrics]) for key in
+               ("length_chars", "length_words", "bullet_points", "mentions_bug", "mentions_suggest")}
+    columns["sections"] = np.array([list(m["sections_presence"].values()) for m in metrics],
+                                   dtype=bool).reshape(len(metrics), len(scanner.sections))
+    columns["section_names"] = list(scanner.sections)
+    return columns
@@ -1,57 +1,50 @@
 # reviewer.py
 #
 # Responsible for:
-#  - Fetching PR diff from GitHub
+#  - Fetching PR diff from GitHub (via github_client)
 #  - Posting review comments (if permitted)
-#  - LLM initialization
+#  - LLM initialization (the backend comes from llm_backends, LLM_BACKEND; chains go
+#    through build_chain, cached by llm_cache)
 #
 # Note: posting can fail due to permissions; prompt_tester gracefully handles this.
 
-import requests
 from langchain.schema.output_parser import StrOutputParser
-from langchain_groq import ChatGroq
-from config import GITHUB_TOKEN, OWNER, REPO, PR_NUMBER, GROQ_API_KEY
+from config import GITHUB_TOKEN, OWNER, REPO, PR_NUMBER
+from github_client import get_client
+from llm_backends import get_llm
+from llm_cache import CachedChain, get_cache
 from typing import Optional
 
 # ------------------------------
 # GitHub helpers
 # ------------------------------
 def fetch_pr_diff(owner: str, repo: str, pr_number: int, token: str) -> str:
-    url = f"https://api.github.com/repos/{owner}/{repo}/pulls/{pr_number}"
-    headers = {"Authorization": f"token {token}"}
-    response = requests.get(url, headers=headers)
-    if response.status_code != 200:
-        raise Exception(f"GitHub API Error: {response.json()}")
-    pr_data = response.json()
-    diff_url = pr_data.get("diff_url")
-    if not diff_url:
-        raise Exception("No diff_url found in PR data.")
-    diff_resp = requests.get(diff_url, headers=headers)
-    if diff_resp.status_code != 200:
-        raise Exception(f"Failed to fetch diff from diff_url: {diff_resp.status_code}")
-    return diff_resp.text
+    # single conditional request through the shared pooled client (see github_client.py)
+    return get_client().get_pr_diff(owner, repo, pr_number, token)
 
 def post_review_comment(owner: str, repo: str, pr_number: int, token: str, review_body: str) -> dict:
-    url = f"https://api.github.com/repos/{owner}/{repo}/issues/{pr_number}/comments"
-    headers = {"Authorization": f"token {token}", "Accept": "application/vnd.github+json"}
-    payload = {"body": review_body}
-    response = requests.post(url, headers=headers, json=payload)
-    if response.status_code not in (200, 201):
-        raise Exception(f"❌ Failed to post comment: {response.json()}")
-    return response.json()
+    try:
+        return get_client().post_json(f"/repos/{owner}/{repo}/issues/{pr_number}/comments",
+                                      {"body": review_body}, token)
+    except Exception as e:
+        raise Exception(f"❌ Failed to post comment: {e}")
 
 # ------------------------------
 # LLM initialization
 # ------------------------------
-llm = ChatGroq(
-    model="llama-3.3-70b-versatile",
-    temperature=0.25,
-    api_key=GROQ_API_KEY,
-)
+llm = get_llm()
 
 # simple parser that returns string output
 parser = StrOutputParser()
 
+def build_chain(prompt):
+    """Single place where prompt chains are assembled (prompt -> llm -> string)"""
+    cache = get_cache()
+    if cache is None:
+        return prompt | llm | parser
+    # identical prompt + model + sampling params are answered from the on-disk cache
+    return CachedChain(prompt, llm, parser, cache)
+
 # ------------------------------
 # Utility: safe save
 # ------------------------------
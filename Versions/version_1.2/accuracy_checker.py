@@ -4,46 +4,38 @@
 # combined 0-10 score per prompt, and produces:
 #  - review_reports_all_prompts.csv
 #  - review_reports_all_prompts.md
+#  - one results-store row per prompt with the review itself (results_store.py)
 # plus an ASCII bar chart printed to terminal (sorted ascending).
 
 # This file generates different prompting techniques reports so that it could be assessed visually
 
 import time
-import json
-import re
 import csv
 import os
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from reviewer import fetch_pr_diff, llm, parser, save_text_to_file
+from reviewer import fetch_pr_diff, build_chain, save_text_to_file, llm_metrics
+from llm_cache import get_cache
+from rate_limit import budgets
 from config import OWNER, REPO, PR_NUMBER, GITHUB_TOKEN
 from prompts_v2 import get_prompts
+from map_reduce import review_diff
+from judge_cascade import JudgeCascade
+from json_extract import parse_verdict, parse_verdict_list
+from diff_parser import primary_language
+from results_store import get_store
+from review_heuristics import heuristic_metrics  # shared heuristics scanner
+from scoring import (DEFAULT_WEIGHTS, meta_columns, heuristic_columns, meta_scores,
+                     heuristic_scores, final_scores)
 from langchain.prompts import ChatPromptTemplate
-from langchain.schema.output_parser import StrOutputParser
-
-# -------------------------
-# Heuristic helpers
-# -------------------------
-def count_bullets(text: str) -> int:
-    return len(re.findall(r"^\s*[-•*]\s+", text, flags=re.MULTILINE))
-
-def has_sections(text: str, section_titles):
-    lowered = text.lower()
-    return {s: (s.lower() in lowered) for s in section_titles}
-
-def heuristic_metrics(review: str):
-    metrics = {}
-    metrics["length_chars"] = len(review)
-    metrics["length_words"] = len(review.split())
-    metrics["bullet_points"] = count_bullets(review)
-    metrics["mentions_bug"] = bool(re.search(r"\bbug\b|\berror\b|\bfail\b|\bissue\b", review, flags=re.I))
-    metrics["mentions_suggest"] = bool(re.search(r"\bsuggest\b|\brecommend\b|\bconsider\b|\bfix\b|\baction\b", review, flags=re.I))
-    sections = ["summary", "bugs", "errors", "code quality", "suggestions", "improvements", "tests", "positive", "final review"]
-    metrics["sections_presence"] = has_sections(review, sections)
-    return metrics
 
 # -------------------------
 # Meta-evaluator prompt (careful to escape JSON braces)
 # -------------------------
+JUDGE_DIFF_CHARS = 4000  # the judge only ever sees this much of the diff
+
 evaluator_prompt = ChatPromptTemplate.from_messages([
     ("system", "You are an objective senior software engineer who judges review quality."),
     ("human",
@@ -64,116 +56,186 @@ evaluator_prompt = ChatPromptTemplate.from_messages([
 ])
 
 def meta_evaluate(diff: str, review: str):
-    chain = evaluator_prompt | llm | StrOutputParser()
+    chain = build_chain(evaluator_prompt, json_mode=True)
     try:
-        out = chain.invoke({"diff": diff[:4000], "review": review})
+        out = chain.invoke({"diff": diff[:JUDGE_DIFF_CHARS], "review": review})
     except Exception as e:
         return {"error": f"evaluator invoke failed: {e}"}, None
 
-    # parse JSON robustly
-    parsed = None
-    try:
-        parsed = json.loads(out.strip())
-    except Exception:
-        m = re.search(r"\{.*\}", out, flags=re.S)
-        if m:
-            try:
-                parsed = json.loads(m.group(0))
-            except Exception:
-                parsed = {"error": "could not parse JSON", "raw": out}
-        else:
-            parsed = {"error": "no JSON in evaluator output", "raw": out}
-    return parsed, out
+    # first well-formed JSON object in the answer, schema-checked, scores clamped to 1-10
+    return parse_verdict(out), out
+
+# -------------------------
+# Batch meta-evaluation: the diff is sent once with several labelled reviews
+# -------------------------
+JUDGE_BATCH_SIZE = int(os.getenv("JUDGE_BATCH_SIZE", "8"))
+
+batch_evaluator_prompt = ChatPromptTemplate.from_messages([
+    ("system", "You are an objective senior software engineer who judges review quality."),
+    ("human",
+     "You will evaluate {count} different reviews of the same Pull Request. "
+     "Produce ONLY a JSON object (no extra commentary) whose `reviews` array has one object "
+     "per review, in order.\n\n"
+     "Fields (1-10 integers): clarity, usefulness, depth, actionability, positivity.\n"
+     "Also include `review` (the review number) and a short `explain` string (1-2 sentences).\n"
+     "Judge every review on its own merits, not relative to the others.\n\n"
+     "Output JSON (exact format):\n"
+     "{{\n"
+     '  "reviews": [\n'
+     "    {{\n"
+     '      "review": 1,\n'
+     '      "clarity": <int 1-10>,\n'
+     '      "usefulness": <int 1-10>,\n'
+     '      "depth": <int 1-10>,\n'
+     '      "actionability": <int 1-10>,\n'
+     '      "positivity": <int 1-10>,\n'
+     '      "explain": "short explanation"\n'
+     "    }}\n"
+     "  ]\n"
+     "}}\n\n"
+     "PR Diff (truncated):\n{diff}\n\n"
+     "{reviews}\n")
+])
+
+def meta_evaluate_batch(diff: str, reviews):
+    """Judge several reviews of one diff in as few calls as possible.
+
+    Returns one (meta_parsed, meta_raw) pair per review, like meta_evaluate. Reviews
+    whose verdict is missing or malformed in the batch answer are re-judged one by one.
+    """
+    results = [None] * len(reviews)
+    for offset in range(0, len(reviews), max(1, JUDGE_BATCH_SIZE)):
+        chunk = reviews[offset:offset + max(1, JUDGE_BATCH_SIZE)]
+        if len(chunk) == 1:
+            results[offset] = meta_evaluate(diff, chunk[0])
+            continue
+        labelled = "\n\n".join(f"=== Review {i} ===\n{review}" for i, review in enumerate(chunk, 1))
+        out = None
+        try:
+            out = build_chain(batch_evaluator_prompt, json_mode=True).invoke(
+                {"count": len(chunk), "diff": diff[:JUDGE_DIFF_CHARS], "reviews": labelled})
+            verdicts = parse_verdict_list(out, len(chunk))
+        except Exception:
+            verdicts = {}
+        for i, review in enumerate(chunk, 1):
+            if i in verdicts:
+                results[offset + i - 1] = (verdicts[i], out)
+            else:
+                results[offset + i - 1] = meta_evaluate(diff, review)  # fallback: single judge call
+    return results
+
+# -------------------------
+# Judge cascade: local model first, LLM judge only when it is unsure (judge_cascade.py)
+# -------------------------
+_judge = None
+_judge_lock = threading.Lock()
+
+def get_judge() -> JudgeCascade:
+    global _judge
+    with _judge_lock:
+        if _judge is None:
+            _judge = JudgeCascade(meta_evaluate)
+        return _judge
+
+def judge_review(diff: str, review: str, heur: dict):
+    """Like meta_evaluate, but answered by the local judge whenever it is confident"""
+    return get_judge().judge(diff, review, heur)
 
 # -------------------------
 # Score combining functions
 # -------------------------
-def meta_to_score(meta_parsed: dict):
-    # Weighted average of meta fields (1-10) -> 0-10
-    if not isinstance(meta_parsed, dict) or "error" in meta_parsed:
-        return None
-    weights = {"clarity": 0.18, "usefulness": 0.28, "depth": 0.2, "actionability": 0.24, "positivity": 0.1}
-    score = 0.0
-    for k, w in weights.items():
-        val = meta_parsed.get(k)
-        if isinstance(val, (int, float)):
-            score += val * w
-        else:
-            # If missing, down-weight by giving neutral 5
-            score += 5 * w
-    return round(score, 2)
-
-def heuristics_to_score(heur: dict):
-    # Produce a 0-10 heuristics score from several signals
-    # sections presence: fraction of important sections found
-    sections = heur.get("sections_presence", {})
-    if sections:
-        sec_frac = sum(1 for v in sections.values() if v) / max(1, len(sections))
-    else:
-        sec_frac = 0.0
-    # bullets score: clamp at 10 bullets
-    bullets = heur.get("bullet_points", 0)
-    bullets_score = min(bullets, 10) / 10.0
-    # length score: words between 80 and 800 => full score
-    words = heur.get("length_words", 0)
-    if 80 <= words <= 800:
-        length_score = 1.0
-    else:
-        # decay linearly away from that range
-        if words < 80:
-            length_score = max(0.0, words / 80.0)
-        else:
-            # if very long, penalize but not too harsh
-            length_score = max(0.0, 1.0 - (words - 800) / 2000.0)
-    bug_bonus = 0.1 if heur.get("mentions_bug") else 0.0
-    suggest_bonus = 0.1 if heur.get("mentions_suggest") else 0.0
-
-    # weighted mix to 0-1
-    mix = (0.45 * sec_frac) + (0.25 * bullets_score) + (0.25 * length_score) + bug_bonus + suggest_bonus
-    mix = max(0.0, min(mix, 1.0))
-    return round(mix * 10, 2)
+# One engine for live and offline scoring (scoring.py); these are its one-review forms
+def meta_to_score(meta_parsed: dict, weights: dict = DEFAULT_WEIGHTS):
+    # Weighted average of meta fields (1-10) -> 0-10; missing fields count as a neutral 5
+    score = meta_scores(meta_columns([meta_parsed]), weights)[0]
+    return None if np.isnan(score) else float(score)
+
+def heuristics_to_score(heur: dict, weights: dict = DEFAULT_WEIGHTS):
+    # Produce a 0-10 heuristics score from sections, bullets, length and keyword mentions
+    return float(heuristic_scores(heuristic_columns([heur]), weights)[0])
+
+def combine_scores(meta_score, heur_score, weights: dict = DEFAULT_WEIGHTS):
+    # final combined score: prefer meta if available
+    meta = np.nan if meta_score is None else meta_score
+    return float(final_scores([meta], [heur_score], weights)[0])
 
 # -------------------------
 # Runner: run all prompts
 # -------------------------
-def run_all(post_to_github: bool = False):
+# Generation is independent per prompt, so it runs as parallel tasks; the judge then sees
+# all the reviews of one diff in a batch (run_prompts)
+RUN_ALL_WORKERS = int(os.getenv("RUN_ALL_WORKERS", "4"))
+
+def generate_prompt_review(name: str, prompt, diff_text: str) -> dict:
+    """Generate a review with one prompt (no judging yet)"""
+    print(f"-> Running prompt: {name}")
+    start = time.time()
+    try:
+        review = review_diff(prompt, diff_text)
+    except Exception as e:
+        # every backend failed: an error message is not a review, so don't judge or score it
+        return {
+            "prompt": name,
+            "review": f"ERROR: prompt invoke failed: {e}",
+            "time_s": round(time.time() - start, 2),
+            "heur_score": "N/A",
+            "meta_score": "N/A",
+            "final_score": "N/A",
+            "meta_raw": "",
+            "failed": True
+        }
+    return {"prompt": name, "review": review, "time_s": round(time.time() - start, 2),
+            "heur": heuristic_metrics(review), "failed": False}
+
+def score_prompt_review(generated: dict, meta_parsed, meta_raw) -> dict:
+    """Combine heuristics and the judge's verdict into the report row"""
+    heur = generated["heur"]
+    meta_score = meta_to_score(meta_parsed)
+    heur_score = heuristics_to_score(heur)
+    final_score = combine_scores(meta_score, heur_score)
+
+    return {
+        "prompt": generated["prompt"],
+        "review": generated["review"],
+        "time_s": generated["time_s"],
+        "heur_score": heur_score,
+        "meta_score": meta_score if meta_score is not None else "N/A",
+        "final_score": final_score,
+        "meta_raw": meta_raw if meta_raw else "",
+        "heuristics": heur,
+        "meta_evaluation": meta_parsed
+    }
+
+def _score_or_none(value):
+    return float(value) if isinstance(value, (int, float)) else None
+
+def run_prompts(diff_text: str, prompts=None, max_workers: int = RUN_ALL_WORKERS):
+    """Generate a review of `diff_text` with every prompt in parallel, then judge them
+    together; returns the report rows in prompt order"""
+    prompts = prompts if prompts is not None else get_prompts()
+
+    # pool.map keeps prompt order, so the CSV/MD outputs stay deterministic;
+    # pacing against provider limits is done by rate_limit.llm_limiter inside each call
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        generated = list(pool.map(lambda item: generate_prompt_review(item[0], item[1], diff_text), prompts.items()))
+
+    # Judge every successful review together: the diff goes to the judge once per batch
+    ok = [g for g in generated if not g["failed"]]
+    verdicts = get_judge().judge_many(diff_text, [g["review"] for g in ok], [g["heur"] for g in ok],
+                                      meta_evaluate_batch)
+    scored = {id(g): score_prompt_review(g, *verdict) for g, verdict in zip(ok, verdicts)}
+    results = []
+    for g in generated:
+        failed = g.pop("failed")
+        results.append(g if failed else scored[id(g)])
+    return results
+
+def run_all(post_to_github: bool = False, max_workers: int = RUN_ALL_WORKERS):
     prompts = get_prompts()
     diff_text = fetch_pr_diff(OWNER, REPO, PR_NUMBER, GITHUB_TOKEN)
     print(f"Fetched PR diff ({len(diff_text)} chars). Running {len(prompts)} prompts...\n")
 
-    results = []
-    for name, prompt in prompts.items():
-        print(f"-> Running prompt: {name}")
-        chain = prompt | llm | parser
-        start = time.time()
-        try:
-            review = chain.invoke({"diff": diff_text[:4000]})
-        except Exception as e:
-            review = f"ERROR: prompt invoke failed: {e}"
-        elapsed = time.time() - start
-
-        heur = heuristic_metrics(review)
-        meta_parsed, meta_raw = meta_evaluate(diff_text, review)
-        meta_score = meta_to_score(meta_parsed) if not (isinstance(meta_parsed, dict) and "error" in meta_parsed) else None
-        heur_score = heuristics_to_score(heur)
-        # final combined score: prefer meta if available
-        if meta_score is not None:
-            final_score = round(0.7 * meta_score + 0.3 * heur_score, 2)
-        else:
-            final_score = round(heur_score, 2)
-
-        results.append({
-            "prompt": name,
-            "review": review,
-            "time_s": round(elapsed, 2),
-            "heur_score": heur_score,
-            "meta_score": meta_score if meta_score is not None else "N/A",
-            "final_score": final_score,
-            "meta_raw": meta_raw if meta_raw else ""
-        })
-
-        # small delay safety (optional)
-        time.sleep(0.2)
+    results = run_prompts(diff_text, prompts, max_workers)
 
     # Sort results by final_score ascending (so you can see improvement visually)
     results_sorted = sorted(results, key=lambda r: (r["final_score"] if isinstance(r["final_score"], (int, float)) else 0))
@@ -204,12 +266,17 @@ def run_all(post_to_github: bool = False):
     save_text_to_file(md_file, "\n".join(md_lines))
     print(f"\nSaved summary to {md_file} and CSV to {csv_file}")
 
-    # Save each raw review to files
+    # Save each raw review to the results store (one row per prompt, same run id)
+    store = get_store()
+    run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+    language = primary_language(diff_text)
     for r in results:
-        safe_name = r["prompt"].replace("/", "_")
-        fname = f"review_{safe_name}_PR{PR_NUMBER}.md"
-        save_text_to_file(fname, f"# Review by prompt: {r['prompt']}\n\n{r['review']}\n\n-- meta_raw:\n{r['meta_raw']}")
-    print("Saved individual reviews for each prompt.")
+        store.add_result("accuracy", PR_NUMBER, r["prompt"], r["review"], _score_or_none(r["final_score"]),
+                         run_id=run_id, repo=f"{OWNER}/{REPO}", language=language,
+                         heur_score=_score_or_none(r.get("heur_score")), meta_score=_score_or_none(r.get("meta_score")),
+                         time_s=r["time_s"], heuristics=r.get("heuristics"), meta=r.get("meta_evaluation"),
+                         meta_raw=r.get("meta_raw"))
+    print(f"Saved individual reviews for each prompt to {store.path} (run {run_id}).")
 
     # Print ASCII chart to terminal
     print("\n=== Final Scores (ascending) ===")
@@ -218,6 +285,13 @@ def run_all(post_to_github: bool = False):
         print(f"{r['prompt']:20} | {'█' * bars} {r['final_score']}")
     print("===============================\n")
 
+    cache = get_cache()
+    if cache is not None:
+        print(f"LLM cache: {cache.stats()}")
+    print(f"Rate limit budget: {budgets()}")
+    print(f"LLM backends: {llm_metrics()}")
+    print(f"Judge cascade: {get_judge().summary()}")
+
     return results_sorted
 
 if __name__ == "__main__":
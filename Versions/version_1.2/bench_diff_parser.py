@@ -0,0 +1,83 @@
+# bench_diff_parser.py
+#
+# Benchmark for diff_parser.parse_diff on synthetic multi-megabyte diffs.
+# Run: python bench_diff_parser.py
+#
+# For each size it prints parse time, throughput, and peak memory allocated
+# while parsing (tracemalloc), next to a bare `splitlines()` walk of the same diff
+# (the floor for anything that touches every line).
+
+import random
+import time
+import tracemalloc
+from diff_parser import parse_diff
+
+SIZES_MB = [1, 5, 20]
+
+def make_diff(target_bytes: int, seed: int = 0) -> str:
+    """Build a realistic-looking git diff: many files, several hunks each"""
+    rng = random.Random(seed)
+    exts = [".py", ".js", ".ts", ".java", ".go", ".md", ".json"]
+    parts = []
+    size = 0
+    n = 0
+    while size < target_bytes:
+        path = f"src/module_{n}/file_{n}{rng.choice(exts)}"
+        lines = [f"diff --git a/{path} b/{path}", f"index {n:07x}..{n + 1:07x} 100644",
+                 f"--- a/{path}", f"+++ b/{path}"]
+        old_start = 1
+        for _ in range(rng.randint(1, 6)):
+            body = []
+            old_count = new_count = 0
+            for _ in range(rng.randint(5, 60)):
+                kind = rng.random()
+                text = f"    value_{rng.randint(0, 10**6)} = compute(x, y)  # step"
+                if kind < 0.25:
+                    body.append("+" + text)
+                    new_count += 1
+                elif kind < 0.4:
+                    body.append("-" + text)
+                    old_count += 1
+                else:
+                    body.append(" " + text)
+                    old_count += 1
+                    new_count += 1
+            lines.append(f"@@ -{old_start},{old_count} +{old_start},{new_count} @@ def f_{n}():")
+            lines.extend(body)
+            old_start += old_count + rng.randint(5, 40)
+        chunk = "\n".join(lines) + "\n"
+        parts.append(chunk)
+        size += len(chunk)
+        n += 1
+    return "".join(parts)
+
+def naive_walk(diff_text: str) -> int:
+    files = 0
+    for line in diff_text.splitlines():
+        if line.startswith("diff --git"):
+            files += 1
+    return files
+
+def timed(fn, *args):
+    # time a clean run, then measure peak allocations in a second (traced) run
+    start = time.perf_counter()
+    result = fn(*args)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def main():
+    print(f"{'size':>8} | {'files':>6} | {'parse_diff':>12} | {'MB/s':>7} | {'peak mem':>9} | {'splitlines walk':>15} | {'peak mem':>9}")
+    for mb in SIZES_MB:
+        diff_text = make_diff(mb * 1024 * 1024)
+        files, t_parse, m_parse = timed(lambda d: list(parse_diff(d)), diff_text)
+        _, t_naive, m_naive = timed(naive_walk, diff_text)
+        real_mb = len(diff_text) / (1024 * 1024)
+        print(f"{real_mb:6.1f}MB | {len(files):6d} | {t_parse:10.3f}s | {real_mb / t_parse:7.1f} | "
+              f"{m_parse / 1e6:7.1f}MB | {t_naive:13.3f}s | {m_naive / 1e6:7.1f}MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# bench_feature_extraction.py
+#
+# Benchmark for pr_features.extract_pr_features (single pass) against the original
+# regex-based extractor, on 10 KB, 1 MB and 20 MB diffs.
+# Run: python bench_feature_extraction.py
+#
+# Every timed case is also checked for identical output, plus a few edge cases
+# (block comments with no closing "*/", "def" followed by a newline, non-ASCII text)
+# and the worst case for the old DOTALL comment regex.
+
+import re
+import time
+from bench_diff_parser import make_diff
+from pr_features import extract_pr_features
+
+SIZES = [("10 KB", 10 * 1024), ("1 MB", 1024 * 1024), ("20 MB", 20 * 1024 * 1024)]
+
+def legacy_extract_pr_features(diff_text):
+    """The original IterativePromptSelector.extract_pr_features (reference implementation)"""
+    features = {}
+    features['num_lines'] = len(diff_text.split('\n'))
+    features['num_files'] = len(re.findall(r'^diff --git', diff_text, re.MULTILINE))
+    features['additions'] = len(re.findall(r'^\+', diff_text, re.MULTILINE))
+    features['deletions'] = len(re.findall(r'^-', diff_text, re.MULTILINE))
+    features['net_changes'] = features['additions'] - features['deletions']
+    features['has_comments'] = int(bool(re.search(r'#.*|//.*|/\*.*?\*/', diff_text, re.DOTALL)))
+    features['has_functions'] = int(bool(re.search(r'def\s+\w+|\bfunction\b|\bfunc\b', diff_text, re.IGNORECASE)))
+    features['has_imports'] = int(bool(re.search(r'^import\s|^from\s|^#include', diff_text, re.MULTILINE)))
+    features['has_test'] = int(bool(re.search(r'test|spec|unittest', diff_text, re.IGNORECASE)))
+    features['has_docs'] = int(bool(re.search(r'readme|doc|comment|documentation', diff_text, re.IGNORECASE)))
+    features['has_config'] = int(bool(re.search(r'\.json$|\.yml$|\.yaml$|\.xml$|\.conf', diff_text, re.IGNORECASE)))
+    features['is_python'] = int(bool(re.search(r'\.py$', diff_text, re.IGNORECASE)))
+    features['is_js'] = int(bool(re.search(r'\.js$|\.ts$', diff_text, re.IGNORECASE)))
+    features['is_java'] = int(bool(re.search(r'\.java$', diff_text, re.IGNORECASE)))
+    return features
+
+EDGE_CASES = [
+    "",
+    "+int a; /* open\n+b = 1;\n+ */\n",
+    "+x = 1 /*/ y\n",
+    "+    DEF\n\n   \n  compute(x)\n",
+    "+def\n",
+    "import\nfrom\tx\n",
+    "+ Ünïcödé ſpec fiİe\n+ﬁle.conf\n",
+    "diff --git a/app.PY b/app.PY\n+print('x')\n+see a/settings.json\n",
+]
+
+def plain_diff(target_bytes):
+    # no comment markers, keywords or function definitions: every check runs to the end
+    line = "+    value = compute(x, y) / 2\n"
+    return line * (target_bytes // len(line))
+
+def open_block_comments(target_bytes):
+    # many "/*" with no closing "*/": the old DOTALL regex rescans the rest of the diff each time
+    line = "+ value = a /* b\n"
+    return line * (target_bytes // len(line))
+
+def best_of(fn, arg, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(arg)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def main():
+    for case in EDGE_CASES:
+        assert extract_pr_features(case) == legacy_extract_pr_features(case), case
+    print(f"{len(EDGE_CASES)} edge cases: identical output\n")
+
+    print(f"{'input':<24} | {'regex (old)':>11} | {'single pass':>11} | {'speedup':>7}")
+    inputs = []
+    for label, size in SIZES:
+        inputs.append((f"git diff {label}", make_diff(size)))
+        inputs.append((f"no matches {label}", plain_diff(size)))
+    inputs.append(("open '/*' x1000", open_block_comments(1000 * 17)))
+    inputs.append(("open '/*' x5000", open_block_comments(5000 * 17)))
+
+    for label, diff_text in inputs:
+        assert extract_pr_features(diff_text) == legacy_extract_pr_features(diff_text), label
+        repeat = 1 if len(diff_text) > 5 * 1024 * 1024 else 3
+        t_old = best_of(legacy_extract_pr_features, diff_text, repeat)
+        t_new = best_of(extract_pr_features, diff_text, repeat)
+        print(f"{label:<24} | {t_old:10.4f}s | {t_new:10.4f}s | {t_old / t_new:6.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+# bench_pipeline.py
+#
+# Benchmark of our own pipeline (accuracy_checker.run_prompts, the core of run_all:
+# map-reduce review with every prompt in parallel, then one batched judge pass) against
+# the offline fake LLM backend, so provider latency is a known, seeded quantity and
+# everything else is our overhead. The local judge cascade is off (JUDGE_CASCADE=0) so
+# every row pays the same judge calls.
+# Run: python bench_pipeline.py   (needs no network and no API keys)
+#
+# Prints, per worker count: wall time, LLM calls, simulated provider time, and the
+# speedup over one worker; then the same workload again with a warm response cache.
+
+import os
+import sys
+import tempfile
+
+os.environ["LLM_BACKEND"] = "fake"
+os.environ["LLM_FALLBACK_BACKEND"] = "none"
+os.environ.setdefault("FAKE_LLM_LATENCY_MS", "200")
+os.environ.setdefault("LLM_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "bench_llm_cache.sqlite3"))
+os.environ.setdefault("JUDGE_CASCADE", "0")
+os.environ.setdefault("JUDGE_SAMPLES_PATH", os.path.join(tempfile.mkdtemp(), "bench_judge_samples.jsonl"))
+
+import time
+from bench_diff_parser import make_diff
+from llm_backends import get_llm
+from llm_cache import get_cache
+from prompts_v2 import get_prompts
+from accuracy_checker import run_prompts
+
+WORKERS = [1, 2, 4, 8]
+DIFF_BYTES = 12 * 1024  # a few map chunks + a merge per review
+
+def run_workload(diff_text: str, workers: int):
+    prompts = get_prompts()
+    fake = get_llm("fake")
+    calls, latency = fake.calls, fake.latency_s
+    start = time.perf_counter()
+    run_prompts(diff_text, prompts, max_workers=workers)
+    return time.perf_counter() - start, fake.calls - calls, fake.latency_s - latency
+
+def main():
+    sys.stdout, real_stdout = open(os.devnull, "w"), sys.stdout  # silence per-prompt progress
+    rows = []
+    try:
+        # a fresh diff per row, so every cold run really misses the cache
+        for i, workers in enumerate(WORKERS):
+            rows.append(("cold", workers, *run_workload(make_diff(DIFF_BYTES, seed=i), workers)))
+        for i, workers in enumerate(WORKERS):
+            rows.append(("warm", workers, *run_workload(make_diff(DIFF_BYTES, seed=i), workers)))
+    finally:
+        sys.stdout.close()
+        sys.stdout = real_stdout
+
+    baseline = rows[0][2]
+    print(f"fake LLM median latency: {os.environ['FAKE_LLM_LATENCY_MS']} ms")
+    print(f"{'cache':>5} | {'workers':>7} | {'wall':>8} | {'LLM calls':>9} | {'LLM time':>9} | {'speedup':>7}")
+    for cache_state, workers, wall, calls, latency in rows:
+        print(f"{cache_state:>5} | {workers:7d} | {wall:7.2f}s | {calls:9d} | {latency:8.2f}s | {baseline / wall:6.1f}x")
+    print(f"LLM cache: {get_cache().stats()}")
+
+if __name__ == "__main__":
+    main()
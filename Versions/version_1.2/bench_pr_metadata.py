@@ -0,0 +1,116 @@
+# bench_pr_metadata.py
+#
+# Benchmark of batched GraphQL PR metadata (pr_metadata.py) against one REST call per
+# PR, with a local stub server standing in for the GitHub API (REST + GraphQL) and a
+# fixed per-request latency.
+# Run: python bench_pr_metadata.py   (needs no network and no token)
+#
+# Prints requests and wall time for the head SHAs of N_PRS open PRs both ways, and
+# checks that both return the same SHAs. Unknown PR numbers get GitHub's answer (a null
+# alias plus a NOT_FOUND error).
+
+import os
+
+os.environ.setdefault("GITHUB_RATE_PER_S", "100000")  # measure round-trips, not our pacing
+os.environ.setdefault("GITHUB_BURST", "100000")
+
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from github_client import GitHubClient
+from pr_metadata import fetch_open_prs, fetch_prs
+
+N_PRS = 500
+LATENCY_MS = 25
+
+
+def make_pr(number: int) -> dict:
+    sha = hashlib.sha1(str(number).encode()).hexdigest()
+    return {"number": number, "headRefOid": sha, "baseRefName": "main", "changedFiles": number % 17 + 1,
+            "additions": number * 3 % 400, "deletions": number * 7 % 150, "isDraft": number % 10 == 0,
+            "updatedAt": f"2025-09-{number % 28 + 1:02d}T12:00:00Z",
+            "labels": {"nodes": [{"name": "bug"}] if number % 4 == 0 else []}}
+
+
+PRS = {n: make_pr(n) for n in range(1, N_PRS + 1)}
+ORDERED = sorted(PRS.values(), key=lambda pr: pr["updatedAt"], reverse=True)
+
+
+class StubGitHub(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, payload):
+        body = json.dumps(payload).encode()
+        time.sleep(LATENCY_MS / 1000)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        m = re.fullmatch(r"/repos/[^/]+/[^/]+/pulls/(\d+)", self.path)
+        pr = PRS.get(int(m.group(1))) if m else None
+        if pr is None:
+            self.send_error(404)
+            return
+        self._send({"number": pr["number"], "head": {"sha": pr["headRefOid"]}})
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        query, variables = request["query"], request["variables"]
+        aliases = re.findall(r"pr(\d+): pullRequest", query)
+        if aliases:
+            # GitHub's shape for unknown numbers: the alias is null, plus a NOT_FOUND error
+            errors = [{"type": "NOT_FOUND", "path": ["repository", f"pr{n}"], "locations": [],
+                       "message": f"Could not resolve to a PullRequest with the number of {n}."}
+                      for n in aliases if int(n) not in PRS]
+            payload = {"data": {"repository": {f"pr{n}": PRS.get(int(n)) for n in aliases}}}
+            self._send({**payload, "errors": errors} if errors else payload)
+            return
+        start = int(variables["after"] or 0)
+        nodes = ORDERED[start:start + variables["first"]]
+        end = start + len(nodes)
+        self._send({"data": {"repository": {"pullRequests": {
+            "pageInfo": {"hasNextPage": end < len(ORDERED), "endCursor": str(end)}, "nodes": nodes}}}})
+
+
+def timed(client, fn):
+    requests_before = client.stats["requests"]
+    start = time.perf_counter()
+    result = fn()
+    return result, client.stats["requests"] - requests_before, time.perf_counter() - start
+
+
+def start_stub():
+    """StubGitHub on a free local port (also used by test_pr_metadata.py); returns (server, api_url)"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubGitHub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def main():
+    server, api_url = start_stub()
+    client = GitHubClient(api_url=api_url, cache_dir=None)
+
+    rest, rest_requests, t_rest = timed(client, lambda: {
+        n: client.get_pr_head_sha("o", "r", n) for n in PRS})
+    open_prs, open_requests, t_open = timed(client, lambda: fetch_open_prs("o", "r", client=client))
+    listed, listed_requests, t_listed = timed(client, lambda: fetch_prs("o", "r", list(PRS), client=client))
+    server.shutdown()
+
+    assert {r.number: r.head_sha for r in open_prs} == rest
+    assert {r.number: r.head_sha for r in listed} == rest
+
+    print(f"{N_PRS} PRs, {LATENCY_MS} ms per request (stub server), head SHAs identical")
+    print(f"{'REST, one call per PR':32} {rest_requests:5d} requests {t_rest:7.2f}s")
+    print(f"{'GraphQL open PRs (paginated)':32} {open_requests:5d} requests {t_open:7.2f}s  ({t_rest / t_open:.0f}x)")
+    print(f"{'GraphQL by number (aliased)':32} {listed_requests:5d} requests {t_listed:7.2f}s  ({t_rest / t_listed:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+# bench_review_heuristics.py
+#
+# Benchmark for review_heuristics (shared scanner) against the per-tool heuristic_metrics
+# it replaced, on an archive of 20k reviews built from the review_pr*_*.txt files.
+# Run: python bench_review_heuristics.py
+#
+# Outputs are checked for equality on the archive and on random keyword soup
+# (case, word boundaries, overlapping section titles, non-ASCII text).
+
+import glob
+import random
+import re
+import time
+from review_heuristics import PROFILES, heuristic_metrics, heuristic_metrics_batch
+
+ARCHIVE_SIZE = 20000
+FUZZ_CASES = 20000
+TOKENS = ["bug", "Bugs", "BUG", "error", "errors", "fail", "failed", "issue", "suggest", "Suggestions",
+          "fix", "fixes", "bugfix", "action", "positive", "Positive Notes", "final review", "code quality",
+          "tests", "summary", "_bug", "x", "- ", "* ", "\n", "  ", "é", "İ", "ſuggest", "•", "\t", "1."]
+
+def legacy_heuristic_metrics(review: str, profile: str = "default"):
+    """The original per-tool implementation (reference)"""
+    words = PROFILES[profile]
+    metrics = {}
+    metrics["length_chars"] = len(review)
+    metrics["length_words"] = len(review.split())
+    metrics["bullet_points"] = len(re.findall(r"^\s*[-•*]\s+", review, flags=re.MULTILINE))
+    metrics["mentions_bug"] = bool(re.search("|".join(rf"\b{w}\b" for w in words["bug_words"]), review, flags=re.I))
+    metrics["mentions_suggest"] = bool(re.search("|".join(rf"\b{w}\b" for w in words["suggest_words"]), review, flags=re.I))
+    lowered = review.lower()
+    metrics["sections_presence"] = {s: (s.lower() in lowered) for s in words["sections"]}
+    return metrics
+
+def best_of(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+def main():
+    rng = random.Random(0)
+    for _ in range(FUZZ_CASES):
+        text = "".join(rng.choice(TOKENS) + rng.choice(["", " ", "\n", ".", "s"]) for _ in range(rng.randint(0, 25)))
+        for profile in PROFILES:
+            assert heuristic_metrics(text, profile) == legacy_heuristic_metrics(text, profile), (text, profile)
+
+    samples = [open(path, encoding="utf-8").read() for path in glob.glob("review_pr*_*.txt")]
+    if not samples:
+        samples = ["## Summary\n- Consider a fix for the error path.\n## Final Review\nLooks good."]
+    archive = [rng.choice(samples) + f"\n{i}" for i in range(ARCHIVE_SIZE)]
+
+    legacy, t_legacy = best_of(lambda: [legacy_heuristic_metrics(r) for r in archive])
+    batch, t_batch = best_of(lambda: heuristic_metrics_batch(archive))
+    _, t_columnar = best_of(lambda: heuristic_metrics_batch(archive, columnar=True))
+    assert batch == legacy
+
+    print(f"{len(archive)} reviews, outputs identical ({FUZZ_CASES} fuzz cases per profile also identical)")
+    print(f"{'legacy heuristic_metrics':28} {t_legacy:7.3f}s")
+    print(f"{'heuristic_metrics_batch':28} {t_batch:7.3f}s  ({t_legacy / t_batch:.1f}x)")
+    print(f"{'  columnar=True':28} {t_columnar:7.3f}s")
+
+if __name__ == "__main__":
+    main()
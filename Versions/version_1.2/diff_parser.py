@@ -0,0 +1,289 @@
+# diff_parser.py
+#
+# Streaming unified-diff parser.
+#
+# parse_diff() walks the diff once and yields one compact FileDiff per file:
+#  - path / old_path, language, status (added, deleted, renamed, modified), binary flag
+#  - additions / deletions
+#  - hunks, each with the added/removed line spans stored in array('I')
+#    (flat [start, end) pairs of new/old file line numbers)
+#  - character offsets into the diff text instead of copies of it
+#    (use FileDiff.text(diff) / Hunk.text(diff) to slice when the text is needed)
+#
+# Parsing is linear in the size of the diff. For str input, body lines are never
+# sliced: the parser only looks at their first character and jumps to the next "\n".
+# Header lines ("diff --git", "---", "+++", "@@", "rename ...") are the only copies made.
+
+import os
+import re
+from array import array
+
+LANGUAGES = {
+    ".py": "python", ".js": "javascript", ".jsx": "javascript", ".ts": "typescript",
+    ".tsx": "typescript", ".java": "java", ".go": "go", ".rb": "ruby", ".rs": "rust",
+    ".c": "c", ".h": "c", ".cc": "cpp", ".cpp": "cpp", ".hpp": "cpp", ".cs": "csharp",
+    ".php": "php", ".kt": "kotlin", ".swift": "swift", ".scala": "scala", ".sh": "shell",
+    ".sql": "sql", ".html": "html", ".css": "css", ".md": "markdown", ".rst": "text",
+    ".txt": "text", ".json": "json", ".yml": "yaml", ".yaml": "yaml", ".xml": "xml",
+    ".toml": "toml", ".ini": "config", ".cfg": "config", ".conf": "config",
+}
+
+_HUNK_HEADER = re.compile(r"@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+def language_for(path: str) -> str:
+    """Best-effort language name from a file extension"""
+    if not path:
+        return "unknown"
+    name = os.path.basename(path)
+    if name.lower() == "dockerfile":
+        return "docker"
+    return LANGUAGES.get(os.path.splitext(name)[1].lower(), "other")
+
+
+class Hunk:
+    __slots__ = ("old_start", "old_count", "new_start", "new_count", "start", "end", "added", "removed")
+
+    def __init__(self, old_start, old_count, new_start, new_count, start):
+        self.old_start = old_start
+        self.old_count = old_count
+        self.new_start = new_start
+        self.new_count = new_count
+        self.start = start          # offset of the "@@" line in the diff text
+        self.end = start            # offset just past the last line of the hunk
+        self.added = array("I")     # [start, end) pairs of new-file line numbers
+        self.removed = array("I")   # [start, end) pairs of old-file line numbers
+
+    def added_spans(self):
+        return list(zip(self.added[::2], self.added[1::2]))
+
+    def removed_spans(self):
+        return list(zip(self.removed[::2], self.removed[1::2]))
+
+    def text(self, diff_text: str) -> str:
+        return diff_text[self.start:self.end]
+
+    def __repr__(self):
+        return (f"Hunk(-{self.old_start},{self.old_count} +{self.new_start},{self.new_count}, "
+                f"added={self.added_spans()}, removed={self.removed_spans()})")
+
+
+class FileDiff:
+    __slots__ = ("path", "old_path", "status", "language", "is_binary",
+                 "additions", "deletions", "hunks", "start", "end")
+
+    def __init__(self, path, old_path, start):
+        self.path = path
+        self.old_path = old_path
+        self.status = "modified"
+        self.language = "unknown"
+        self.is_binary = False
+        self.additions = 0
+        self.deletions = 0
+        self.hunks = []
+        self.start = start          # offset of the file's first header line
+        self.end = start            # offset just past the file's last line
+
+    @property
+    def header_end(self) -> int:
+        """Offset where the first hunk starts (end of the file header)"""
+        return self.hunks[0].start if self.hunks else self.end
+
+    def text(self, diff_text: str) -> str:
+        return diff_text[self.start:self.end]
+
+    def header(self, diff_text: str) -> str:
+        return diff_text[self.start:self.header_end]
+
+    def __repr__(self):
+        return (f"FileDiff({self.path!r}, status={self.status}, language={self.language}, "
+                f"+{self.additions}/-{self.deletions}, hunks={len(self.hunks)})")
+
+
+# -------------------------
+# Line sources
+# -------------------------
+def _lines_from_text(text: str):
+    """Yield (offset, first_char, next_offset) without slicing body lines"""
+    pos = 0
+    size = len(text)
+    find = text.find
+    while pos < size:
+        nl = find("\n", pos)
+        nxt = size if nl < 0 else nl + 1
+        yield pos, text[pos], nxt
+        pos = nxt
+
+
+def _lines_from_iterable(lines):
+    """Adapt an iterable of lines (e.g. a streamed HTTP body) to the (offset, first, next) walk"""
+    held = {}
+
+    def walk():
+        pos = 0
+        for line in lines:
+            if isinstance(line, bytes):
+                line = line.decode("utf-8", errors="replace")
+            if not line.endswith("\n"):
+                line += "\n"
+            held["line"] = line
+            yield pos, line[:1], pos + len(line)
+            pos += len(line)
+
+    return walk(), lambda start, end: held["line"].rstrip("\r\n")
+
+
+def _strip_prefix(path: str) -> str:
+    path = path.strip().strip('"')
+    if path == "/dev/null":
+        return None
+    if path[:2] in ("a/", "b/"):
+        return path[2:]
+    return path
+
+
+# -------------------------
+# Parser
+# -------------------------
+def parse_diff(diff):
+    """Parse a unified diff (str, or an iterable of lines) into FileDiff records, one file at a time"""
+    if isinstance(diff, str):
+        text = diff
+        lines = _lines_from_text(diff)
+        line_at = lambda start, end: text[start:end].rstrip("\r\n")
+    else:
+        lines, line_at = _lines_from_iterable(diff)
+
+    current = None
+    hunk = None
+    old_left = new_left = 0     # lines still expected in the current hunk
+    old_line = new_line = 0     # line numbers of the next old/new line
+
+    for start, first, end in lines:
+        if hunk is not None and (old_left > 0 or new_left > 0):
+            # body line of the current hunk
+            if first == "+":
+                if hunk.added and hunk.added[-1] == new_line:
+                    hunk.added[-1] = new_line + 1
+                else:
+                    hunk.added.extend((new_line, new_line + 1))
+                new_line += 1
+                new_left -= 1
+                current.additions += 1
+            elif first == "-":
+                if hunk.removed and hunk.removed[-1] == old_line:
+                    hunk.removed[-1] = old_line + 1
+                else:
+                    hunk.removed.extend((old_line, old_line + 1))
+                old_line += 1
+                old_left -= 1
+                current.deletions += 1
+            elif first == "\\":
+                pass  # "\ No newline at end of file"
+            else:
+                old_line += 1
+                new_line += 1
+                old_left -= 1
+                new_left -= 1
+            hunk.end = current.end = end
+            continue
+
+        if first == "\\" and hunk is not None:
+            hunk.end = current.end = end
+            continue
+
+        line = line_at(start, end)
+        if line.startswith("diff --git "):
+            if current is not None:
+                yield _finish(current)
+            rest = line[len("diff --git "):]
+            old, sep, new = rest.rpartition(" b/")
+            path = new if sep else rest
+            current = FileDiff(path, _strip_prefix(old) if sep else path, start)
+            hunk = None
+        elif line.startswith("@@"):
+            m = _HUNK_HEADER.match(line)
+            if current is None or not m:
+                continue
+            old_line, new_line = int(m.group(1)), int(m.group(3))
+            old_left = int(m.group(2)) if m.group(2) is not None else 1
+            new_left = int(m.group(4)) if m.group(4) is not None else 1
+            hunk = Hunk(old_line, old_left, new_line, new_left, start)
+            hunk.end = end
+            current.hunks.append(hunk)
+        elif line.startswith("--- "):
+            if current is None or current.hunks:
+                # plain "diff -u" output has no "diff --git" line
+                if current is not None:
+                    yield _finish(current)
+                path = _strip_prefix(line[4:].split("\t")[0])
+                current = FileDiff(path, path, start)
+                hunk = None
+            else:
+                current.old_path = _strip_prefix(line[4:].split("\t")[0])
+                if current.old_path is None:
+                    current.status = "added"
+        elif current is None:
+            continue  # preamble (e.g. mail headers) before the first file
+        elif line.startswith("+++ "):
+            path = _strip_prefix(line[4:].split("\t")[0])
+            if path is None:
+                current.status = "deleted"
+            else:
+                current.path = path
+        elif line.startswith("new file mode"):
+            current.status = "added"
+        elif line.startswith("deleted file mode"):
+            current.status = "deleted"
+        elif line.startswith("rename from "):
+            current.old_path = line[len("rename from "):]
+            current.status = "renamed"
+        elif line.startswith("rename to "):
+            current.path = line[len("rename to "):]
+            current.status = "renamed"
+        elif line.startswith("Binary files ") or line.startswith("GIT binary patch"):
+            current.is_binary = True
+        if current is not None:
+            current.end = end
+
+    if current is not None:
+        yield _finish(current)
+
+
+def primary_language(diff) -> str:
+    """Language of the files with the most changed lines ("unknown" for an empty diff)"""
+    return primary_language_of(parse_diff(diff))
+
+
+def primary_language_of(files) -> str:
+    """primary_language() of per-file records (FileDiff, or pr_metadata.PRFile from a files listing)"""
+    changed = {}
+    for f in files:
+        if not f.is_binary:
+            changed[f.language] = changed.get(f.language, 0) + f.additions + f.deletions
+    return max(changed, key=changed.get) if changed else "unknown"
+
+
+def truncate_diff(diff_text: str, max_chars: int) -> str:
+    """The longest prefix of whole files that fits in `max_chars`.
+
+    If even the first file does not fit, its header and whole hunks up to `max_chars`
+    are kept (at least one hunk), so the result is always a well-formed diff.
+    """
+    if len(diff_text) <= max_chars:
+        return diff_text
+    files = list(parse_diff(diff_text[:max_chars]))
+    if len(files) > 1:
+        return diff_text[:files[-2].end]  # the last file of the prefix is cut off
+    first = next(parse_diff(diff_text), None)
+    if first is None:
+        return ""
+    hunks = [h for h in first.hunks if h.end <= max_chars] or first.hunks[:1]
+    return diff_text[:hunks[-1].end] if hunks else diff_text[:first.end]
+
+
+def _finish(file_diff: FileDiff) -> FileDiff:
+    if file_diff.path is None:
+        file_diff.path = file_diff.old_path
+    file_diff.language = language_for(file_diff.path)
+    return file_diff
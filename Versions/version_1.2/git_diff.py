@@ -0,0 +1,118 @@
+# git_diff.py
+#
+# Diff source backed by a local git clone, as an alternative to the GitHub API
+# (reviewer.fetch_pr_diff uses it with DIFF_SOURCE=git).
+#
+#  - the PR diff is `git diff -M base...head`: merge-base aware like GitHub's PR diff,
+#    with rename detection, and with prefixes / colors / external diff drivers pinned so
+#    local git config cannot change the output
+#  - head is refs/pull/{pr}/head by default (what GitHub publishes for every PR; CI
+#    checkouts and mirrors with `fetch = +refs/pull/*/head:refs/pull/*/head` have it),
+#    base is origin/HEAD; both are templates, e.g. GIT_DIFF_HEAD=HEAD in CI
+#  - with GIT_DIFF_FETCH=1 a missing PR ref is fetched from the remote once
+#  - get_pr_files is `git diff --numstat` over the same range: per-file additions /
+#    deletions without the diff text (the selector's cheap feature tier)
+#  - no network hop or API rate limit for the diff itself, and the whole pipeline can
+#    run offline against a fixture repository
+#
+# Settings (environment): GIT_REPO_PATH (default "."), GIT_DIFF_BASE, GIT_DIFF_HEAD,
+# GIT_DIFF_REMOTE, GIT_DIFF_FETCH, GIT_TIMEOUT_S.
+
+import os
+import subprocess
+import threading
+from typing import Optional
+from diff_parser import truncate_diff
+from pr_metadata import PRFile
+
+GIT_REPO_PATH = os.getenv("GIT_REPO_PATH", ".")
+GIT_DIFF_BASE = os.getenv("GIT_DIFF_BASE", "origin/HEAD")
+GIT_DIFF_HEAD = os.getenv("GIT_DIFF_HEAD", "refs/pull/{pr}/head")
+GIT_DIFF_REMOTE = os.getenv("GIT_DIFF_REMOTE", "origin")
+GIT_DIFF_FETCH = os.getenv("GIT_DIFF_FETCH", "0") == "1"
+GIT_TIMEOUT_S = float(os.getenv("GIT_TIMEOUT_S", "120"))
+
+_GIT_STATUS = {"A": "added", "D": "deleted", "M": "modified", "R": "renamed", "C": "copied", "T": "changed"}
+_DIFF_OPTIONS = ["-M", "--no-color", "--no-ext-diff", "--no-textconv", "--src-prefix=a/", "--dst-prefix=b/"]
+
+
+class GitDiffSource:
+    """PR diffs from a local repository; same call shape as GitHubClient.get_pr_diff"""
+
+    def __init__(self, repo_path: str = GIT_REPO_PATH, base: str = GIT_DIFF_BASE, head: str = GIT_DIFF_HEAD,
+                 remote: str = GIT_DIFF_REMOTE, fetch: bool = GIT_DIFF_FETCH):
+        self.repo_path = repo_path
+        self.base = base
+        self.head = head
+        self.remote = remote
+        self.fetch = fetch
+        self._lock = threading.Lock()  # serializes fetches into the same repository
+
+    def _git(self, *args) -> str:
+        result = subprocess.run(["git", "-C", self.repo_path, *args], capture_output=True, text=True,
+                                encoding="utf-8", errors="replace", timeout=GIT_TIMEOUT_S)
+        if result.returncode != 0:
+            raise Exception(f"git {' '.join(args[:2])} failed ({result.returncode}): {result.stderr.strip()[:500]}")
+        return result.stdout
+
+    def _resolve(self, ref: str) -> Optional[str]:
+        try:
+            return self._git("rev-parse", "--verify", "--quiet", f"{ref}^{{commit}}").strip()
+        except Exception:
+            return None
+
+    def refs(self, pr_number: int):
+        """(base ref, head SHA) of a PR, fetching the PR head once if allowed"""
+        head_ref = self.head.format(pr=pr_number)
+        head_sha = self._resolve(head_ref)
+        if head_sha is None and self.fetch:
+            with self._lock:
+                self._git("fetch", "--quiet", self.remote, f"+pull/{pr_number}/head:refs/pull/{pr_number}/head")
+            head_sha = self._resolve(head_ref)
+        if head_sha is None:
+            raise Exception(f"PR #{pr_number}: '{head_ref}' not found in {self.repo_path} "
+                            f"(fetch it, or set GIT_DIFF_FETCH=1)")
+        return self.base.format(pr=pr_number), head_sha
+
+    def get_pr_diff(self, owner: str, repo: str, pr_number: int, token: Optional[str] = None,
+                    max_chars: Optional[int] = None) -> str:
+        base, head_sha = self.refs(pr_number)
+        diff_text = self._git("diff", *_DIFF_OPTIONS, f"{base}...{head_sha}")
+        return truncate_diff(diff_text, max_chars) if max_chars else diff_text
+
+    def get_pr_files(self, owner: str, repo: str, pr_number: int, token: Optional[str] = None):
+        """Files listing of a PR (PRFile records, diff order) from `git diff --numstat` /
+        `--name-status`; binary files are the ones numstat reports as "-" """
+        base, head_sha = self.refs(pr_number)
+        span = f"{base}...{head_sha}"
+        counts = self._git("diff", "--numstat", "-z", "-M", span).split("\0")
+        statuses = self._git("diff", "--name-status", "-z", "-M", span).split("\0")
+        files = []
+        i = j = 0
+        while i < len(counts) and counts[i]:
+            additions, deletions, path = counts[i].split("\t", 2)
+            if not path:  # rename / copy: "<add>\t<del>\t\0<old path>\0<new path>\0"
+                path = counts[i + 2]
+                i += 2
+            i += 1
+            letter = statuses[j][:1]  # "M\0path\0", "R097\0old\0new\0", ...
+            old_path = statuses[j + 1] if letter in "RC" else None
+            j += 3 if letter in "RC" else 2
+            binary = additions == "-"
+            files.append(PRFile(path, 0 if binary else int(additions), 0 if binary else int(deletions),
+                                _GIT_STATUS.get(letter, "modified"), old_path))
+        return files
+
+    def get_pr_head_sha(self, owner: str, repo: str, pr_number: int, token: Optional[str] = None) -> str:
+        return self.refs(pr_number)[1]
+
+
+_default_source = None
+_default_lock = threading.Lock()
+
+def get_git_source() -> GitDiffSource:
+    global _default_source
+    with _default_lock:
+        if _default_source is None:
+            _default_source = GitDiffSource()
+        return _default_source
@@ -0,0 +1,227 @@
+# github_client.py
+#
+# Shared GitHub REST client used by reviewer.py (and everything that fetches PRs).
+#
+# Responsible for:
+#  - Keeping one pooled requests.Session alive (no new TCP+TLS handshake per call)
+#  - Fetching a PR diff in a single request via the v3 diff media type; with max_chars
+#    the body is streamed and the download stops once that much has arrived (a capped
+#    body is cut back to whole files and is not cached)
+#  - On-disk ETag / Last-Modified cache: unchanged resources come back as 304s,
+#    which GitHub does not count against the rate limit
+#  - Pacing every request through rate_limit.github_limiter
+#  - GraphQL POSTs (post_graphql) for batched queries, e.g. pr_metadata.py; the endpoint
+#    follows GITHUB_API_URL (<host>/api/v3 -> <host>/api/graphql on GitHub Enterprise) unless
+#    GITHUB_GRAPHQL_URL is set, so a local stub server can stand in for both
+
+import hashlib
+import json
+import os
+import threading
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from rate_limit import github_limiter
+from diff_parser import truncate_diff
+
+API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+GRAPHQL_URL = os.getenv("GITHUB_GRAPHQL_URL")
+CACHE_DIR = os.getenv("GITHUB_CACHE_DIR", ".github_cache")
+JSON_MEDIA_TYPE = "application/vnd.github+json"
+DIFF_MEDIA_TYPE = "application/vnd.github.v3.diff"
+RATE_LIMIT_RETRIES = 2
+STREAM_CHUNK_CHARS = 64 * 1024
+
+
+def graphql_url_for(api_url: str) -> str:
+    api_url = api_url.rstrip("/")
+    if api_url.endswith("/v3"):
+        return api_url[:-len("/v3")] + "/graphql"
+    return f"{api_url}/graphql"
+
+
+def _rate_limited(response: requests.Response) -> bool:
+    """Primary (remaining == 0) or secondary (Retry-After) rate limit hit"""
+    if response.status_code not in (403, 429):
+        return False
+    return response.headers.get("X-RateLimit-Remaining") == "0" or "Retry-After" in response.headers
+
+
+def _read_capped(response: requests.Response, max_chars: int):
+    """(body, complete): a streamed body read until EOF or past `max_chars`"""
+    response.encoding = response.encoding or "utf-8"
+    chunks = []
+    size = 0
+    try:
+        for chunk in response.iter_content(chunk_size=STREAM_CHUNK_CHARS, decode_unicode=True):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > max_chars:
+                return "".join(chunks), False
+    finally:
+        response.close()  # drops the connection instead of reading the rest of the body
+    return "".join(chunks), True
+
+
+class GitHubClient:
+    def __init__(self, token: Optional[str] = None, api_url: str = API_URL,
+                 cache_dir: Optional[str] = CACHE_DIR, pool_size: int = 10,
+                 graphql_url: Optional[str] = GRAPHQL_URL):
+        self.token = token
+        self.api_url = api_url.rstrip("/")
+        self.graphql_url = graphql_url or graphql_url_for(self.api_url)
+        self.cache_dir = cache_dir
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.stats = {"requests": 0, "not_modified": 0}
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    # ------------------------------
+    # Conditional-request cache
+    # ------------------------------
+    def _cache_path(self, url: str, accept: str) -> str:
+        key = hashlib.sha1(f"{accept}\n{url}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def _load_cached(self, url: str, accept: str) -> Optional[dict]:
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._cache_path(url, accept), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _store_cached(self, url: str, accept: str, response: requests.Response, body: Optional[str] = None):
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if not self.cache_dir or not (etag or last_modified):
+            return
+        path = self._cache_path(url, accept)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"etag": etag, "last_modified": last_modified,
+                       "body": response.text if body is None else body}, f)
+        os.replace(tmp, path)
+
+    # ------------------------------
+    # Requests
+    # ------------------------------
+    def _headers(self, accept: str, token: Optional[str]) -> dict:
+        headers = {"Accept": accept}
+        token = token or self.token
+        if token:
+            headers["Authorization"] = f"token {token}"
+        return headers
+
+    def get_text(self, path: str, accept: str = JSON_MEDIA_TYPE, token: Optional[str] = None,
+                 params: Optional[dict] = None, max_chars: Optional[int] = None) -> str:
+        """GET an API path, revalidating any cached copy with If-None-Match / If-Modified-Since.
+
+        With `max_chars` the body is streamed and reading stops after more than `max_chars`
+        characters (the caller gets that prefix; only complete bodies are cached).
+        """
+        url = path if path.startswith("http") else f"{self.api_url}{path}"
+        if params:
+            url = requests.Request("GET", url, params=params).prepare().url
+        headers = self._headers(accept, token)
+        cached = self._load_cached(url, accept)
+        if cached:
+            if cached.get("etag"):
+                headers["If-None-Match"] = cached["etag"]
+            if cached.get("last_modified"):
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            github_limiter.acquire()
+            response = self.session.get(url, headers=headers, stream=max_chars is not None)
+            github_limiter.update_from_headers(response.headers, response.status_code)
+            with self._lock:
+                self.stats["requests"] += 1
+                if response.status_code == 304:
+                    self.stats["not_modified"] += 1
+            if not _rate_limited(response):
+                break
+
+        if response.status_code == 304 and cached:
+            return cached["body"]
+        if response.status_code != 200:
+            raise Exception(f"GitHub API Error ({response.status_code}): {response.text[:500]}")
+        if max_chars is None:
+            self._store_cached(url, accept, response)
+            return response.text
+        body, complete = _read_capped(response, max_chars)
+        if complete:
+            self._store_cached(url, accept, response, body)
+        return body
+
+    def get_json(self, path: str, token: Optional[str] = None, params: Optional[dict] = None):
+        return json.loads(self.get_text(path, JSON_MEDIA_TYPE, token, params))
+
+    def post_json(self, path: str, payload: dict, token: Optional[str] = None) -> dict:
+        url = f"{self.api_url}{path}"
+        github_limiter.acquire()
+        response = self.session.post(url, headers=self._headers(JSON_MEDIA_TYPE, token), json=payload)
+        github_limiter.update_from_headers(response.headers, response.status_code)
+        if response.status_code not in (200, 201):
+            raise Exception(f"GitHub API Error ({response.status_code}): {response.text[:500]}")
+        return response.json()
+
+    def post_graphql(self, query: str, variables: Optional[dict] = None, token: Optional[str] = None,
+                     tolerate=None) -> dict:
+        """Run a GraphQL query; returns its "data" (GraphQL errors raise, like HTTP errors).
+
+        `tolerate(error)` marks expected errors (e.g. NOT_FOUND on one aliased field, whose
+        value is then null); the query only fails on the others.
+        """
+        payload = {"query": query, "variables": variables or {}}
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            github_limiter.acquire()
+            response = self.session.post(self.graphql_url, headers=self._headers(JSON_MEDIA_TYPE, token), json=payload)
+            github_limiter.update_from_headers(response.headers, response.status_code)
+            with self._lock:
+                self.stats["requests"] += 1
+            if not _rate_limited(response):
+                break
+        if response.status_code != 200:
+            raise Exception(f"GitHub API Error ({response.status_code}): {response.text[:500]}")
+        body = response.json()
+        errors = [error for error in body.get("errors") or [] if not (tolerate and tolerate(error))]
+        if errors or body.get("data") is None:
+            raise Exception(f"GitHub GraphQL Error: {json.dumps(errors or body.get('errors'))[:500]}")
+        return body["data"]
+
+    # ------------------------------
+    # PR helpers
+    # ------------------------------
+    def get_pr_diff(self, owner: str, repo: str, pr_number: int, token: Optional[str] = None,
+                    max_chars: Optional[int] = None) -> str:
+        """Fetch the unified diff of a PR in one round-trip (only its first whole files
+        up to `max_chars` if given, see diff_parser.truncate_diff)"""
+        diff_text = self.get_text(f"/repos/{owner}/{repo}/pulls/{pr_number}", DIFF_MEDIA_TYPE, token,
+                                  max_chars=max_chars)
+        return truncate_diff(diff_text, max_chars) if max_chars else diff_text
+
+    def get_pr(self, owner: str, repo: str, pr_number: int, token: Optional[str] = None) -> dict:
+        """PR metadata (head / base SHAs, counts, labels); revalidated, so mostly free 304s"""
+        return self.get_json(f"/repos/{owner}/{repo}/pulls/{pr_number}", token)
+
+    def get_pr_head_sha(self, owner: str, repo: str, pr_number: int, token: Optional[str] = None) -> str:
+        return self.get_pr(owner, repo, pr_number, token)["head"]["sha"]
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+def get_client() -> GitHubClient:
+    """Process-wide client so every caller shares the same connection pool and cache"""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = GitHubClient()
+        return _default_client
@@ -0,0 +1,124 @@
+# incremental.py
+#
+# Incremental re-review: when a PR we already reviewed gets new pushes, only the hunks
+# that are new or changed since the last review are sent to the LLM, and the earlier
+# findings for untouched code are carried forward.
+#
+#  - every hunk is identified by a content hash (file path + hunk body + the context
+#    text after "@@"); the line numbers in the "@@ -a,b +c,d @@" header are left out,
+#    so a hunk shifted by an edit above it still matches
+#  - the last review of each (PR, prompt) is kept with its head SHA and hunk hashes
+#    (results_store snapshots)
+#  - same head SHA, or exactly the same hunks: the previous review is reused (no LLM call)
+#  - some hunks new, changed or removed: the sub-diff of new / changed hunks (with their
+#    file headers) is reviewed with the same prompt (map_reduce.review_diff), then one
+#    update call merges it into the previous review; removed hunks count as changes, so
+#    findings about code that is no longer in the PR are dropped
+#  - no snapshot, or more than INCREMENTAL_MAX_CHANGED of the hunks changed: full review
+#
+# Settings (environment): INCREMENTAL_REVIEW=0 disables it, INCREMENTAL_MAX_CHANGED.
+
+import hashlib
+import os
+from langchain.prompts import ChatPromptTemplate
+from diff_parser import parse_diff
+from map_reduce import review_diff
+from reviewer import build_chain
+from results_store import get_store
+
+INCREMENTAL_ENABLED = os.getenv("INCREMENTAL_REVIEW", "1") != "0"
+MAX_CHANGED_FRACTION = float(os.getenv("INCREMENTAL_MAX_CHANGED", "0.5"))
+
+update_prompt = ChatPromptTemplate.from_messages([
+    ("system", "You are a senior software engineer keeping a code review up to date."),
+    ("human",
+     "You reviewed this Pull Request before. The author has since pushed changes to: {files}.\n"
+     "Below are your previous review of the whole PR and a review of ONLY the new or changed hunks.\n"
+     "Hunks removed from the PR since then (in: {removed}) are gone: drop findings that only "
+     "concern their code.\n"
+     "Write the updated review of the whole PR:\n"
+     "- Keep earlier findings about code that was not changed.\n"
+     "- Drop or revise earlier findings about the changed code when the new review shows they "
+     "were fixed or no longer apply.\n"
+     "- Add the new findings.\n"
+     "- Keep the section headings and layout of the previous review.\n"
+     "- Do not mention that the review was updated incrementally.\n\n"
+     "### Previous review\n{previous}\n\n"
+     "### Review of the changed hunks\n{changes}")
+])
+
+
+def _hunk_key(path: str, hunk_text: str) -> str:
+    header, _, body = hunk_text.partition("\n")
+    context = header.split("@@", 2)[-1]  # "@@ -1,2 +1,3 @@ def f():" -> " def f():"
+    digest = hashlib.sha1(f"{path}\n{context}\n{body}".encode("utf-8")).hexdigest()
+    return f"{path}:{digest}"
+
+
+def diff_hunks(diff_text: str):
+    """[(hunk key, FileDiff, hunk or None)] in diff order; files without hunks
+    (binary, pure renames, mode changes) count as one pseudo-hunk keyed by their header"""
+    hunks = []
+    for f in parse_diff(diff_text):
+        if not f.hunks:
+            hunks.append((_hunk_key(f.path, f.text(diff_text)), f, None))
+        for hunk in f.hunks:
+            hunks.append((_hunk_key(f.path, hunk.text(diff_text)), f, hunk))
+    return hunks
+
+
+def changed_subdiff(diff_text: str, hunks, known_keys) -> str:
+    """The hunks whose key is not in `known_keys`, each file with its own header"""
+    known = set(known_keys)
+    parts = []
+    last_file = None
+    for key, f, hunk in hunks:
+        if key in known:
+            continue
+        if hunk is None:
+            parts.append(f.text(diff_text))
+            continue
+        if f is not last_file:
+            parts.append(f.header(diff_text))
+            last_file = f
+        parts.append(hunk.text(diff_text))
+    return "".join(parts)
+
+
+def review_incremental(prompt, prompt_name: str, diff_text: str, repo: str, pr_number, head_sha=None,
+                       store=None, max_changed: float = MAX_CHANGED_FRACTION):
+    """Review `diff_text` with `prompt`, reusing the last review of this PR where possible.
+
+    Returns (review, info) with info = {"mode": "full" | "incremental" | "unchanged",
+    "changed_hunks", "removed_hunks", "total_hunks", "sent_chars"}.
+    """
+    store = store or get_store()
+    hunks = diff_hunks(diff_text)
+    keys = [key for key, _, _ in hunks]
+    snapshot = store.snapshot(repo, pr_number, prompt_name)
+    known = set(snapshot["hunk_hashes"]) if snapshot else set()
+    current = set(keys)
+    changed = [key for key in keys if key not in known]
+    removed = sorted(known - current)
+    info = {"changed_hunks": len(changed), "removed_hunks": len(removed), "total_hunks": len(keys)}
+
+    # the same head SHA means the same diff (also when only a prefix of it was fetched)
+    if snapshot and (current == known or (head_sha is not None and snapshot["head_sha"] == head_sha)):
+        info.update(mode="unchanged", sent_chars=0)
+        review = snapshot["review"]
+    elif snapshot and len(changed) + len(removed) <= max_changed * len(current | known):
+        subdiff = changed_subdiff(diff_text, hunks, known)
+        changes = review_diff(prompt, subdiff) if subdiff else "(no new or changed hunks)"
+        files = sorted({key.rsplit(":", 1)[0] for key in changed + removed})
+        removed_files = sorted({key.rsplit(":", 1)[0] for key in removed})
+        review = build_chain(update_prompt).invoke(
+            {"files": ", ".join(files), "removed": ", ".join(removed_files) or "none",
+             "previous": snapshot["review"], "changes": changes})
+        info.update(mode="incremental", sent_chars=len(subdiff))
+    else:
+        review = review_diff(prompt, diff_text)
+        info.update(mode="full", sent_chars=len(diff_text))
+
+    if info["mode"] != "unchanged" or snapshot["head_sha"] != head_sha:
+        store.save_snapshot(repo, pr_number, prompt_name, head_sha, keys, review)
+    return review, info
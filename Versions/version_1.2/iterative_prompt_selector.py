@@ -2,20 +2,60 @@
 #
 # Implements an iterative detection and estimation system for prompt selection.
 # Uses PR features to predict the best prompt, reducing API calls from 7 to 1.
-# Learns from each PR review to improve future predictions.
+# Learns from each PR review to improve future predictions: an online contextual
+# bandit (LinUCB, selector_engine.py) balances trying prompts against using the best
+# one, and is updated in constant time per PR.
 
 import json
-import re
+import os
 import time
+import queue
+import threading
 import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
-from reviewer import fetch_pr_diff, llm, parser
+from reviewer import DIFF_SOURCE, fetch_pr_diff, fetch_pr_files, fetch_pr_head_sha, llm_metrics
 from config import OWNER, REPO, PR_NUMBER, GITHUB_TOKEN
 from prompts_v2 import get_prompts
-from accuracy_checker import heuristic_metrics, meta_evaluate
+from accuracy_checker import JUDGE_DIFF_CHARS, heuristic_metrics, judge_review, get_judge
+from map_reduce import review_diff
+from pr_features import extract_pr_features, metadata_features, FEATURE_ORDER
+from rate_limit import budgets
+from selector_engine import LinUCBEngine, ALPHA
+from scoring import score_reviews
+from diff_parser import primary_language, primary_language_of
+from results_store import get_store, language_from_features
+from incremental import INCREMENTAL_ENABLED, review_incremental
+from pr_metadata import fetch_open_prs, fetch_prs, pr_queue
+
+# Concurrent diff downloads ahead of the (sequential) LLM stage
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "4"))
+# Two-tier features: prompts are selected from the PR files listing (per-file additions /
+# deletions, no diff text) and the diff is only downloaded for the review, at most
+# REVIEW_MAX_DIFF_CHARS of it (whole files; 0 = no limit). The model is still updated
+# with the diff-walk features of the fetched diff, like its whole history; the listing
+# estimate only picks the prompt. METADATA_FEATURES=0 selects from the full diff as before.
+METADATA_FEATURES = os.getenv("METADATA_FEATURES", "1") != "0"
+MAX_DIFF_CHARS = int(os.getenv("REVIEW_MAX_DIFF_CHARS", "400000"))
+# LinUCB exploration strength (0 = always pick the best-looking prompt)
+SELECTOR_ALPHA = float(os.getenv("SELECTOR_ALPHA", str(ALPHA)))
+
+# Learning state: history + fitted bandit as NumPy arrays (versioned .npz).
+# The old JSON history file is migrated automatically on first load.
+STATE_FILE = "selector_state.npz"
+LEGACY_STATE_FILE = "selector_state.json"
+STATE_VERSION = 1
+
+# Checkpointing: the state (which also holds the work log of completed PRs and the head
+# SHA each was reviewed at) is saved atomically every CHECKPOINT_EVERY reviews, so an
+# interrupted run resumes where it stopped and skips PRs already reviewed at that SHA
+CHECKPOINT_EVERY = int(os.getenv("CHECKPOINT_EVERY", "10"))
+
+# Queue runner: prompts are selected for SELECT_BATCH_SIZE PRs at once, then their
+# reviews run on REVIEW_WORKERS threads (model updates stay in PR order)
+SELECT_BATCH_SIZE = int(os.getenv("SELECT_BATCH_SIZE", "16"))
+REVIEW_WORKERS = int(os.getenv("REVIEW_WORKERS", "4"))
 
 class IterativePromptSelector:
     def __init__(self):
@@ -24,156 +64,167 @@ class IterativePromptSelector:
         self.feature_history = []
         self.prompt_history = []
         self.score_history = []
-        self.model = RandomForestRegressor(n_estimators=50, random_state=42)
-        self.scaler = StandardScaler()
+        self.engine = LinUCBEngine(len(self.prompt_names), len(FEATURE_ORDER), alpha=SELECTOR_ALPHA)
         self.is_trained = False
-        self.min_samples_for_training = 5
+        self.completed = {}  # work log: "owner/repo#pr" -> head SHA it was reviewed at
+        self.run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
         
     def extract_pr_features(self, diff_text):
-        """Extract features from PR diff for model prediction"""
-        features = {}
-        
-        # Basic size features
-        features['num_lines'] = len(diff_text.split('\n'))
-        features['num_files'] = len(re.findall(r'^diff --git', diff_text, re.MULTILINE))
-        features['additions'] = len(re.findall(r'^\+', diff_text, re.MULTILINE))
-        features['deletions'] = len(re.findall(r'^-', diff_text, re.MULTILINE))
-        features['net_changes'] = features['additions'] - features['deletions']
-        
-        # Code complexity features
-        features['has_comments'] = int(bool(re.search(r'#.*|//.*|/\*.*?\*/', diff_text, re.DOTALL)))
-        features['has_functions'] = int(bool(re.search(r'def\s+\w+|\bfunction\b|\bfunc\b', diff_text, re.IGNORECASE)))
-        features['has_imports'] = int(bool(re.search(r'^import\s|^from\s|^#include', diff_text, re.MULTILINE)))
-        
-        # Content type features
-        features['has_test'] = int(bool(re.search(r'test|spec|unittest', diff_text, re.IGNORECASE)))
-        features['has_docs'] = int(bool(re.search(r'readme|doc|comment|documentation', diff_text, re.IGNORECASE)))
-        features['has_config'] = int(bool(re.search(r'\.json$|\.yml$|\.yaml$|\.xml$|\.conf', diff_text, re.IGNORECASE)))
-        
-        # Language detection (simplified)
-        features['is_python'] = int(bool(re.search(r'\.py$', diff_text, re.IGNORECASE)))
-        features['is_js'] = int(bool(re.search(r'\.js$|\.ts$', diff_text, re.IGNORECASE)))
-        features['is_java'] = int(bool(re.search(r'\.java$', diff_text, re.IGNORECASE)))
-        
-        return features
+        """Extract features from PR diff for model prediction (single pass, see pr_features.py)"""
+        return extract_pr_features(diff_text)
+    
+    def extract_metadata_features(self, files):
+        """Cheap tier: the same features estimated from the PR files listing (see pr_features.py),
+        for prompt selection only; update_model gets extract_pr_features of the diff"""
+        return metadata_features(files)
     
     def features_to_vector(self, features):
         """Convert features dict to numerical vector"""
-        feature_order = [
-            'num_lines', 'num_files', 'additions', 'deletions', 'net_changes',
-            'has_comments', 'has_functions', 'has_imports', 'has_test',
-            'has_docs', 'has_config', 'is_python', 'is_js', 'is_java'
-        ]
-        return np.array([features.get(key, 0) for key in feature_order])
+        return np.array([features.get(key, 0) for key in FEATURE_ORDER])
     
     def select_best_prompt(self, features_vector):
-        """Select the best prompt based on current model prediction"""
-        if not self.is_trained or len(self.feature_history) < self.min_samples_for_training:
-            # Not enough data yet, use round-robin or random selection
-            return self.prompt_names[len(self.feature_history) % len(self.prompt_names)]
-        
-        try:
-            # Predict scores for all prompts
-            X = np.tile(features_vector, (len(self.prompt_names), 1))
-            prompt_indices = np.arange(len(self.prompt_names)).reshape(-1, 1)
-            X_with_prompt = np.hstack([X, prompt_indices])
-            
-            predicted_scores = self.model.predict(X_with_prompt)
-            best_index = np.argmax(predicted_scores)
-            return self.prompt_names[best_index]
-        except:
-            # Fallback if model prediction fails
-            return self.prompt_names[0]
+        """Select the prompt with the highest upper confidence bound on its score.
+
+        Untried prompts have the widest bounds, so every prompt is tried early on;
+        after that exploration continues only where the model is still uncertain.
+        """
+        return self.prompt_names[self.engine.select(features_vector)]
+    
+    def select_best_prompts(self, feature_matrix):
+        """Select prompts for a whole queue at once: (n_prs, n_features) -> array of prompt names.
+
+        Rows are scored against the current model in order; each choice narrows that
+        prompt's confidence bound for the rows after it (see LinUCBEngine.select_batch),
+        so a fresh model still tries different prompts within one batch. Scores from
+        reviews of this batch only affect later batches.
+        """
+        if len(feature_matrix) == 0:
+            return np.array([], dtype=object)
+        return np.array(self.prompt_names, dtype=object)[self.engine.select_batch(feature_matrix)]
     
     def update_model(self, features_vector, prompt_name, score):
-        """Update the model with new training data"""
+        """Update the model with new training data (constant time, no refit)"""
         # Store the new data point
+        arm = self.prompt_names.index(prompt_name)
         self.feature_history.append(features_vector)
-        self.prompt_history.append(self.prompt_names.index(prompt_name))
+        self.prompt_history.append(arm)
         self.score_history.append(score)
         
-        if len(self.feature_history) >= self.min_samples_for_training:
-            try:
-                # Prepare training data
-                X = np.array(self.feature_history)
-                prompt_indices = np.array(self.prompt_history).reshape(-1, 1)
-                X_combined = np.hstack([X, prompt_indices])
-                y = np.array(self.score_history)
-                
-                # Train or retrain the model
-                if not self.is_trained:
-                    self.scaler.fit(X_combined)
-                    self.is_trained = True
-                
-                X_scaled = self.scaler.transform(X_combined)
-                self.model.fit(X_scaled, y)
-            except Exception as e:
-                print(f"Model training failed: {e}")
-                self.is_trained = False
+        self.engine.update(features_vector, arm, score / 10.0)
+        self.is_trained = True
     
-    def generate_review(self, diff_text, selected_prompt):
-        """Generate review using the selected prompt"""
-        chain = self.prompts[selected_prompt] | llm | parser
+    def generate_review(self, diff_text, selected_prompt, pr_number=None, head_sha=None, repo=f"{OWNER}/{REPO}"):
+        """Generate review using the selected prompt.
+
+        With a PR number (and INCREMENTAL_REVIEW on), a PR reviewed before only has its
+        new or changed hunks reviewed, merged into the earlier review (incremental.py).
+        """
         start = time.time()
-        review_text = chain.invoke({"diff": diff_text[:4000]})
+        if INCREMENTAL_ENABLED and pr_number is not None:
+            review_text, info = review_incremental(self.prompts[selected_prompt], selected_prompt, diff_text,
+                                                   repo, pr_number, head_sha)
+            if info["mode"] != "full":
+                print(f"PR #{pr_number}: {info['mode']} review, {info['changed_hunks']}/{info['total_hunks']} "
+                      f"hunks changed, {info['removed_hunks']} removed, {info['sent_chars']} of {len(diff_text)} diff chars sent")
+        else:
+            review_text = review_diff(self.prompts[selected_prompt], diff_text)
         elapsed = time.time() - start
         return review_text, elapsed
     
     def evaluate_review(self, diff_text, review_text):
         """Evaluate the generated review"""
         heur = heuristic_metrics(review_text)
-        meta_parsed, meta_raw = meta_evaluate(diff_text, review_text)
+        meta_parsed, meta_raw = judge_review(diff_text, review_text, heur)
         
-        # Calculate overall score
-        if isinstance(meta_parsed, dict) and "error" not in meta_parsed:
-            weights = {"clarity": 0.18, "usefulness": 0.28, "depth": 0.2, 
-                      "actionability": 0.24, "positivity": 0.1}
-            meta_score = sum(meta_parsed.get(k, 5) * w for k, w in weights.items())
-            
-            # Heuristic score
-            sections = heur.get("sections_presence", {})
-            sec_frac = sum(sections.values()) / max(1, len(sections))
-            bullets_score = min(heur.get("bullet_points", 0), 10) / 10.0
-            words = heur.get("length_words", 0)
-            length_score = 1.0 if 80 <= words <= 800 else max(0.0, min(words/80, 1.0 - (words-800)/2000))
-            
-            heur_score = (0.45 * sec_frac + 0.25 * bullets_score + 0.25 * length_score + 
-                         0.05 * heur.get("mentions_bug", False) + 0.05 * heur.get("mentions_suggest", False)) * 10
-            
-            overall_score = round(0.7 * meta_score + 0.3 * heur_score, 2)
-        else:
-            overall_score = 5.0  # Default score if evaluation fails
+        # Calculate overall score (same engine and weights as accuracy_checker, see scoring.py);
+        # heuristics alone if the evaluation failed
+        overall_score = float(score_reviews([meta_parsed], [heur])[2][0])
         
         return overall_score, heur, meta_parsed
     
-    def process_pr(self, pr_number, owner=OWNER, repo=REPO, token=GITHUB_TOKEN):
-        """Process a single PR using iterative prompt selection"""
+    def fetch_diff(self, pr_number, selected_prompt, head_sha=None, owner=OWNER, repo=REPO, token=GITHUB_TOKEN):
+        """Second tier: download the diff once the prompt is chosen, as far as it is consumed.
+
+        If the last review of this PR with this prompt is at the same head SHA, the
+        incremental review reuses it and only the judge reads the diff (its first
+        JUDGE_DIFF_CHARS); otherwise the first MAX_DIFF_CHARS of whole files are fetched.
+        """
+        max_chars = MAX_DIFF_CHARS or None
+        if INCREMENTAL_ENABLED and head_sha is not None:
+            snapshot = get_store().snapshot(f"{owner}/{repo}", pr_number, selected_prompt)
+            if snapshot and snapshot["head_sha"] == head_sha:
+                max_chars = JUDGE_DIFF_CHARS
+        return fetch_pr_diff(owner, repo, pr_number, token, max_chars)
+    
+    def process_pr(self, pr_number, owner=OWNER, repo=REPO, token=GITHUB_TOKEN, diff_text=None):
+        """Process a single PR using iterative prompt selection.
+
+        Without a diff, the prompt is selected from the PR files listing and the diff is
+        only fetched afterwards (fetch_diff).
+        """
         print(f"Processing PR #{pr_number}...")
         
-        # Fetch PR diff
-        diff_text = fetch_pr_diff(owner, repo, pr_number, token)
+        try:
+            head_sha = fetch_pr_head_sha(owner, repo, pr_number, token)
+        except Exception as e:
+            print(f"PR #{pr_number}: could not read the head SHA ({e}); reviewing without resume support")
+            head_sha = None
+        
+        files = None
+        if diff_text is None and METADATA_FEATURES:
+            try:
+                files = fetch_pr_files(owner, repo, pr_number, token)
+            except Exception as e:
+                print(f"PR #{pr_number}: files listing failed ({e}); using the diff for features")
         
-        # Extract features
-        features = self.extract_pr_features(diff_text)
+        # Extract features (files listing, or the diff unless the prefetch stage already has it)
+        if files is not None:
+            features = self.extract_metadata_features(files)
+            language = primary_language_of(files)
+        else:
+            if diff_text is None:
+                diff_text = fetch_pr_diff(owner, repo, pr_number, token, MAX_DIFF_CHARS or None)
+            features = self.extract_pr_features(diff_text)
+            language = primary_language(diff_text)
         features_vector = self.features_to_vector(features)
         
         # Select best prompt
         selected_prompt = self.select_best_prompt(features_vector)
-        print(f"Selected prompt: {selected_prompt}")
+        
+        if diff_text is None:
+            diff_text = self.fetch_diff(pr_number, selected_prompt, head_sha, owner, repo, token)
+            features = self.extract_pr_features(diff_text)  # learn from what the history was trained on
+            features_vector = self.features_to_vector(features)
+        reviewed = self.review_pr(pr_number, diff_text, selected_prompt, head_sha, f"{owner}/{repo}")
+        return self.record_review(pr_number, features, features_vector, selected_prompt, reviewed,
+                                  language=language, head_sha=head_sha, owner=owner, repo=repo)
+    
+    def review_pr(self, pr_number, diff_text, selected_prompt, head_sha=None, repo=f"{OWNER}/{REPO}"):
+        """LLM stage for one PR: generate and evaluate (no model state is touched, safe in threads)"""
+        print(f"PR #{pr_number}: selected prompt: {selected_prompt}")
         
         # Generate review
-        review_text, elapsed = self.generate_review(diff_text, selected_prompt)
-        print(f"Review generated in {elapsed:.2f}s")
+        review_text, elapsed = self.generate_review(diff_text, selected_prompt, pr_number, head_sha, repo)
+        print(f"PR #{pr_number}: review generated in {elapsed:.2f}s")
         
         # Evaluate review
         score, heur, meta_parsed = self.evaluate_review(diff_text, review_text)
-        print(f"Review score: {score}/10")
+        print(f"PR #{pr_number}: review score: {score}/10")
+        return review_text, score, heur, meta_parsed
+    
+    def record_review(self, pr_number, features, features_vector, selected_prompt, reviewed, language=None,
+                      head_sha=None, owner=OWNER, repo=REPO):
+        """Learn from a finished review, save it and log the PR as done at `head_sha`"""
+        review_text, score, heur, meta_parsed = reviewed
         
         # Update model with new data
         self.update_model(features_vector, selected_prompt, score)
         
         # Save results
-        self.save_results(pr_number, features, selected_prompt, review_text, score, heur, meta_parsed)
+        self.save_results(pr_number, features, selected_prompt, review_text, score, heur, meta_parsed, language,
+                          head_sha, owner, repo)
+        if head_sha:
+            self.completed[work_key(owner, repo, pr_number)] = head_sha
         
         return {
             "pr_number": pr_number,
@@ -183,32 +234,24 @@ class IterativePromptSelector:
             "features": features
         }
     
-    def save_results(self, pr_number, features, prompt, review, score, heur, meta_parsed):
-        """Save results to file for analysis"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"iterative_results_pr{pr_number}_{timestamp}.json"
-        
-        result = {
-            "timestamp": timestamp,
-            "pr_number": pr_number,
-            "selected_prompt": prompt,
-            "review_score": score,
-            "features": features,
-            "heuristics": heur,
-            "meta_evaluation": meta_parsed,
-            "training_data_size": len(self.feature_history),
-            "model_trained": self.is_trained
-        }
-        
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(result, f, indent=2)
+    def save_results(self, pr_number, features, prompt, review, score, heur, meta_parsed, language=None,
+                     head_sha=None, owner=OWNER, repo=REPO):
+        """Save results to the results store for analysis (see results_store.py)"""
+        store = get_store()
+        result_id = store.add_result(
+            "iterative", pr_number, prompt, review, score,
+            run_id=self.run_id,
+            repo=f"{owner}/{repo}",
+            head_sha=head_sha,
+            language=language or language_from_features(features),
+            propensity=1.0,  # P(prompt | PR) for replay.py: the selection is a deterministic argmax
+            features=features,
+            heuristics=heur,
+            meta=meta_parsed,
+            extra={"training_data_size": len(self.feature_history), "model_trained": self.is_trained},
+        )
         
-        # Also save the review itself
-        review_filename = f"review_pr{pr_number}_{prompt.replace(' ', '_')}.txt"
-        with open(review_filename, 'w', encoding='utf-8') as f:
-            f.write(review)
-        
-        print(f"Results saved to {filename}")
+        print(f"Results saved to {store.path} (result #{result_id})")
     
     def get_stats(self):
         """Get current statistics about the model"""
@@ -220,70 +263,269 @@ class IterativePromptSelector:
                                   for i, name in enumerate(self.prompt_names)}
         }
 
-    def save_state(self, filename="selector_state.json"):
-        """Save learning state to file"""
-        state = {
-            "feature_history": [f.tolist() for f in self.feature_history],
-            "prompt_history": self.prompt_history,
-            "score_history": self.score_history,
-            "is_trained": self.is_trained,
-            "scaler_mean": self.scaler.mean_.tolist() if self.is_trained else None,
-            "scaler_scale": self.scaler.scale_.tolist() if self.is_trained else None
+    def _reset_state(self):
+        self.feature_history = []
+        self.prompt_history = []
+        self.score_history = []
+        self.engine = LinUCBEngine(len(self.prompt_names), len(FEATURE_ORDER), alpha=SELECTOR_ALPHA)
+        self.is_trained = False
+        self.completed = {}
+
+    def is_done(self, pr_number, head_sha, owner=OWNER, repo=REPO):
+        """Already reviewed at this head SHA (in this run or one it resumes)"""
+        return head_sha is not None and self.completed.get(work_key(owner, repo, pr_number)) == head_sha
+
+    def _replay_history(self):
+        """Rebuild the bandit from the logged (features, prompt, score) triples"""
+        self.engine = LinUCBEngine(len(self.prompt_names), len(FEATURE_ORDER), alpha=SELECTOR_ALPHA)
+        for features_vector, arm, score in zip(self.feature_history, self.prompt_history, self.score_history):
+            self.engine.update(features_vector, arm, score / 10.0)
+        self.is_trained = self.engine.n_updates > 0
+
+    def save_state(self, filename=STATE_FILE):
+        """Save history and the fitted bandit to a versioned .npz file (atomic replace)"""
+        n = len(self.feature_history)
+        arrays = {
+            "version": np.array(STATE_VERSION),
+            "prompt_names": np.array(self.prompt_names),
+            "feature_order": np.array(FEATURE_ORDER),
+            "feature_history": np.array(self.feature_history, dtype=np.float64).reshape(n, len(FEATURE_ORDER)),
+            "prompt_history": np.array(self.prompt_history, dtype=np.int32),
+            "score_history": np.array(self.score_history, dtype=np.float64),
+            "completed_keys": np.array(list(self.completed), dtype=str),
+            "completed_shas": np.array(list(self.completed.values()), dtype=str),
+            **self.engine.to_arrays(),
         }
-        with open(filename, 'w') as f:
-            json.dump(state, f)
+        tmp = f"{filename}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, filename)
 
-    def load_state(self, filename="selector_state.json"):
-        """Load learning state from file"""
+    def load_state(self, filename=STATE_FILE, legacy_filename=LEGACY_STATE_FILE):
+        """Load learning state; a legacy JSON state is migrated to .npz on first load"""
         try:
-            with open(filename, 'r') as f:
-                state = json.load(f)
-            self.feature_history = [np.array(f) for f in state["feature_history"]]
-            self.prompt_history = state["prompt_history"]
-            self.score_history = state["score_history"]
-            self.is_trained = state["is_trained"]
-            
-            # Restore scaler state if trained
-            if self.is_trained and state["scaler_mean"]:
-                self.scaler.mean_ = np.array(state["scaler_mean"])
-                self.scaler.scale_ = np.array(state["scaler_scale"])
-                self.scaler.n_features_in_ = len(state["scaler_mean"])
-                self.scaler.var_ = self.scaler.scale_ ** 2  # Reconstruct variance
+            if not os.path.exists(filename) and legacy_filename and os.path.exists(legacy_filename):
+                self._load_legacy_state(legacy_filename)
+                self.save_state(filename)
+                print(f"Migrated {legacy_filename} -> {filename}")
+            else:
+                with np.load(filename, allow_pickle=False) as state:
+                    if int(state["version"]) > STATE_VERSION:
+                        raise ValueError(f"state version {int(state['version'])} is newer than this code ({STATE_VERSION})")
+                    saved_names = [str(name) for name in state["prompt_names"]]
+                    saved_order = [str(key) for key in state["feature_order"]]
+                    self.feature_history = list(state["feature_history"])
+                    self.score_history = state["score_history"].tolist()
+                    if "completed_keys" in state.files:
+                        self.completed = dict(zip(state["completed_keys"].tolist(), state["completed_shas"].tolist()))
+                    if saved_names == self.prompt_names and saved_order == FEATURE_ORDER:
+                        self.prompt_history = state["prompt_history"].tolist()
+                        self.engine = LinUCBEngine.from_arrays(state)
+                        self.engine.alpha = SELECTOR_ALPHA
+                        self.is_trained = self.engine.n_updates > 0
+                    else:
+                        # prompt set or features changed since the save: keep what still applies, refit
+                        self._remap_history(saved_names, saved_order, state["prompt_history"].tolist())
+                        self._replay_history()
 
             print(f"Loaded state with {len(self.feature_history)} training samples")
         except FileNotFoundError:
             print("No saved state found. Starting fresh.")
         except Exception as e:
             print(f"Error loading state: {e}. Starting fresh.")
-            self.feature_history = []
-            self.prompt_history = []
-            self.score_history = []
-            self.is_trained = False
+            self._reset_state()
+
+    def _load_legacy_state(self, filename):
+        """selector_state.json written before the .npz format"""
+        with open(filename, 'r') as f:
+            state = json.load(f)
+        self.feature_history = [np.array(f, dtype=np.float64) for f in state["feature_history"]]
+        self.prompt_history = state["prompt_history"]
+        self.score_history = state["score_history"]
+        self._replay_history()
+
+    def _remap_history(self, saved_names, saved_order, saved_prompts):
+        columns = [saved_order.index(key) if key in saved_order else None for key in FEATURE_ORDER]
+        features, prompts, scores = [], [], []
+        for vector, arm, score in zip(self.feature_history, saved_prompts, self.score_history):
+            name = saved_names[arm]
+            if name not in self.prompt_names:
+                continue
+            features.append(np.array([vector[c] if c is not None else 0.0 for c in columns]))
+            prompts.append(self.prompt_names.index(name))
+            scores.append(score)
+        self.feature_history, self.prompt_history, self.score_history = features, prompts, scores
+
+def work_key(owner, repo, pr_number) -> str:
+    return f"{owner}/{repo}#{pr_number}"
+
+_PREFETCH_DONE = object()
+
+def prefetch_diffs(pr_numbers, owner=OWNER, repo=REPO, token=GITHUB_TOKEN, max_workers=PREFETCH_WORKERS,
+                   fetch=None):
+    """Download PR diffs concurrently and yield (pr_number, diff_text, error) in input order.
+
+    At most `max_workers` downloads are in flight and at most `max_workers` finished diffs
+    wait in the queue, so a long PR list never holds every diff in memory at once.
+    `fetch(pr_number)` replaces the plain diff download (its return value is yielded).
+    """
+    if fetch is None:
+        fetch = lambda pr_number: fetch_pr_diff(owner, repo, pr_number, token)
+    results = queue.Queue(maxsize=max(1, max_workers))
+
+    def _forward(pr_number, future):
+        try:
+            results.put((pr_number, future.result(), None))
+        except Exception as e:
+            results.put((pr_number, None, e))
+
+    def producer():
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            pending = deque()
+            for pr_number in pr_numbers:
+                pending.append((pr_number, pool.submit(fetch, pr_number)))
+                if len(pending) >= max_workers:
+                    _forward(*pending.popleft())
+            while pending:
+                _forward(*pending.popleft())
+        results.put(_PREFETCH_DONE)
 
-def run_iterative_selector(pr_numbers, load_previous=True):
-    """Run the iterative prompt selector on multiple PRs"""
+    threading.Thread(target=producer, daemon=True).start()
+    while True:
+        item = results.get()
+        if item is _PREFETCH_DONE:
+            return
+        yield item
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def run_iterative_selector(pr_numbers=None, load_previous=True, prefetch_workers=PREFETCH_WORKERS,
+                           batch_size=SELECT_BATCH_SIZE, review_workers=REVIEW_WORKERS,
+                           checkpoint_every=CHECKPOINT_EVERY, owner=OWNER, repo=REPO, token=GITHUB_TOKEN,
+                           use_graphql=DIFF_SOURCE == "github"):
+    """Run the iterative prompt selector on multiple PRs (pr_numbers=None: every open PR).
+
+    With load_previous=True the run resumes from the last checkpoint: PRs whose head SHA
+    was already reviewed are skipped without downloading their diff. With use_graphql,
+    head SHAs for the whole queue come from batched GraphQL metadata queries (100 PRs
+    per request, pr_metadata.py) instead of one REST call per PR.
+
+    With METADATA_FEATURES the prefetch stage only reads each PR's files listing: PRs
+    without changed lines are skipped, prompts are selected from those features, and the
+    diff is downloaded by the review worker, as far as the chosen prompt consumes it; the
+    model update uses the features of that diff.
+    """
     selector = IterativePromptSelector()
 
     if load_previous:
-        selector.load_state()  # Load previous learning
+        selector.load_state()  # Load previous learning (and the work log)
+
+    head_shas = {}
+    if pr_numbers is None:
+        records = fetch_open_prs(owner, repo, token)
+        pr_numbers, head_shas = pr_queue(records, is_done=lambda n, sha: selector.is_done(n, sha, owner, repo))
+        print(f"{len(records)} open PRs, {len(pr_numbers)} queued for review")
+    elif use_graphql:
+        try:
+            head_shas = {record.number: record.head_sha for record in fetch_prs(owner, repo, pr_numbers, token)}
+        except Exception as e:
+            print(f"PR metadata query failed ({e}); reading head SHAs per PR")
 
     results = []
-    
-    for pr_number in pr_numbers:
+    skipped = []
+    since_checkpoint = 0
+
+    def fetch(pr_number):
+        """(head SHA, files listing or diff; None when this SHA was already reviewed)"""
         try:
-            result = selector.process_pr(pr_number)
-            results.append(result)
+            head_sha = head_shas.get(pr_number) or fetch_pr_head_sha(owner, repo, pr_number, token)
+        except Exception as e:
+            print(f"PR #{pr_number}: could not read the head SHA ({e}); reviewing without resume support")
+            head_sha = None
+        if selector.is_done(pr_number, head_sha, owner, repo):
+            return head_sha, None
+        if METADATA_FEATURES:
+            try:
+                return head_sha, fetch_pr_files(owner, repo, pr_number, token)
+            except Exception as e:
+                print(f"PR #{pr_number}: files listing failed ({e}); using the diff for features")
+        return head_sha, fetch_pr_diff(owner, repo, pr_number, token, MAX_DIFF_CHARS or None)
+
+    def review(pr_number, diff_text, prompt, head_sha):
+        """LLM stage of one PR -> (review result, diff-walk features for the model update);
+        a PR selected from its files listing gets its diff only now"""
+        if diff_text is None:
+            diff_text = selector.fetch_diff(pr_number, prompt, head_sha, owner, repo, token)
+        return (selector.review_pr(pr_number, diff_text, prompt, head_sha, f"{owner}/{repo}"),
+                selector.extract_pr_features(diff_text))
+
+    # Files listings (or diffs) are pulled concurrently ahead of time; each batch gets its
+    # prompts from one vectorized selection, then the LLM work for the batch is dispatched
+    # in parallel
+    fetched = prefetch_diffs(pr_numbers, owner, repo, token, max_workers=prefetch_workers, fetch=fetch)
+    try:
+        for batch in _batches(fetched, max(1, batch_size)):
+            queue_items = []
+            for pr_number, fetched_pr, fetch_error in batch:
+                if fetch_error is not None:
+                    print(f"Failed to fetch PR #{pr_number}: {fetch_error}")
+                    continue
+                head_sha, pr_data = fetched_pr
+                if pr_data is None or selector.is_done(pr_number, head_sha, owner, repo):
+                    print(f"PR #{pr_number}: already reviewed at {head_sha[:12]}, skipping")
+                    skipped.append(pr_number)
+                    continue
+                if isinstance(pr_data, str):
+                    diff_text = pr_data
+                    features = selector.extract_pr_features(diff_text)
+                    language = primary_language(diff_text)
+                else:
+                    if all(f.is_binary for f in pr_data):
+                        print(f"PR #{pr_number}: no changed lines to review, skipping")
+                        continue
+                    diff_text = None
+                    features = selector.extract_metadata_features(pr_data)
+                    language = primary_language_of(pr_data)
+                queue_items.append((pr_number, diff_text, features, selector.features_to_vector(features),
+                                    language, head_sha))
+            if not queue_items:
+                continue
+            
+            selected = selector.select_best_prompts(np.array([item[3] for item in queue_items]))
+            
+            with ThreadPoolExecutor(max_workers=max(1, review_workers)) as pool:
+                futures = [pool.submit(review, pr_number, diff_text, prompt, head_sha)
+                           for (pr_number, diff_text, _, _, _, head_sha), prompt in zip(queue_items, selected)]
+                for (pr_number, _, _, _, language, head_sha), prompt, future in zip(queue_items, selected, futures):
+                    try:
+                        reviewed, features = future.result()
+                        result = selector.record_review(pr_number, features, selector.features_to_vector(features),
+                                                        prompt, reviewed, language=language, head_sha=head_sha,
+                                                        owner=owner, repo=repo)
+                        results.append(result)
+                    except Exception as e:
+                        print(f"Failed to process PR #{pr_number}: {e}")
+                        continue
+                    since_checkpoint += 1
+                    if checkpoint_every and since_checkpoint >= checkpoint_every:
+                        selector.save_state()
+                        since_checkpoint = 0
+                        print(f"Checkpoint: {len(selector.completed)} PRs in the work log")
             
             # Print current stats
             stats = selector.get_stats()
             print(f"\nCurrent stats: {stats}\n")
-            
-            # Small delay to avoid rate limiting
-            time.sleep(1)
-            
-        except Exception as e:
-            print(f"Failed to process PR #{pr_number}: {e}")
-            continue
+    finally:
+        # also on Ctrl-C / errors: everything recorded so far survives for the next run
+        selector.save_state()
     
     # Final report
     print("\n" + "="*50)
@@ -296,8 +538,12 @@ def run_iterative_selector(pr_numbers, load_previous=True):
     final_stats = selector.get_stats()
     
     print(f"\nFinal statistics: {final_stats}")
-    
-    selector.save_state()
+    print(f"Rate limit budget: {budgets()}")
+    print(f"LLM backends: {llm_metrics()}")
+    print(f"Judge cascade: {get_judge().summary()}")
+    print(f"Results store: {get_store().stats()}")
+    if skipped:
+        print(f"Skipped {len(skipped)} PRs already reviewed at their current head SHA: {skipped}")
     
     return results, selector
 
@@ -0,0 +1,188 @@
+# json_extract.py
+#
+# Pull JSON out of chatty LLM output and validate judge verdicts.
+#
+#  - extract_json: one linear scan that tracks string literals/escapes and bracket depth,
+#    so it finds the first complete top-level {...} / [...] that parses, even with prose,
+#    code fences or stray braces around it (the old `\{.*\}` regex took everything from
+#    the first "{" to the last "}")
+#  - validate_verdict: the meta-evaluation schema - the five 1-10 fields (numbers or
+#    numeric strings such as "8" / "8/10", clamped to 1-10) plus an `explain` string
+
+import json
+import re
+from typing import Optional
+
+META_FIELDS = ("clarity", "usefulness", "depth", "actionability", "positivity")
+SCORE_MIN, SCORE_MAX = 1, 10
+
+_OPEN = {"{": "}", "[": "]"}
+_NUMBER = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*(?:/\s*10)?\s*$")
+# what can follow an opening bracket in JSON: a key or "}" / a value or "]"
+_JSON_START = re.compile(r'\{\s*["}]|\[\s*[]"{\[\-0-9tfn]')
+
+
+def _match_brackets(text: str, i: int, ends: dict):
+    """Scan from the bracket at `i` to its matching close, skipping brackets inside string
+    literals. Records the end (exclusive, or -1 if unbalanced) of every bracket opened on
+    the way, so later starts inside this span never rescan it."""
+    stack = [(_OPEN[text[i]], i)]
+    n = len(text)
+    j = i + 1
+    in_string = False
+    while j < n and stack:
+        c = text[j]
+        if in_string:
+            if c == "\\":
+                j += 1
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c in _OPEN:
+            stack.append((_OPEN[c], j))
+        elif c == stack[-1][0]:
+            ends[stack.pop()[1]] = j + 1
+        elif c in "}]":
+            break  # mismatched bracket: nothing open here can close
+        j += 1
+    for _, opened in stack:
+        ends[opened] = -1
+
+
+def iter_json_values(text: str):
+    """Yield every top-level JSON object/array embedded in `text` that parses, in order.
+
+    Candidates whose first token cannot follow the bracket ("{placeholder}") are never
+    decoded; the rest are decoded on their own slice (a decode error on the full text
+    costs O(position) to build), and once one fails, the brackets nested inside it that
+    enclose the error position are skipped - they would fail at the same spot. Values
+    nested deeper than the interpreter's recursion limit are skipped as a whole."""
+    decoder = json.JSONDecoder()
+    ends = {}
+    n = len(text)
+    next_open = {"{": -1, "[": -1}
+    failed_at = []  # error positions of failed candidates still ahead of i (innermost last)
+    i = 0
+    while True:
+        # next opening bracket (str.find runs at C speed; each kind is searched forward once)
+        for bracket, position in next_open.items():
+            if position != n and position < i:
+                found = text.find(bracket, i)
+                next_open[bracket] = n if found == -1 else found
+        i = min(next_open.values())
+        if i == n:
+            return
+        if i not in ends:
+            _match_brackets(text, i, ends)
+        end = ends[i]
+        while failed_at and failed_at[-1] <= i:
+            failed_at.pop()
+        if end != -1 and not (failed_at and end > failed_at[-1]) and _JSON_START.match(text, i):
+            try:
+                value, parsed_end = decoder.raw_decode(text[i:end])
+                if parsed_end == end - i:
+                    yield value
+                    i = end
+                    continue
+            except json.JSONDecodeError as e:
+                failed_at.append(i + e.pos)
+            except RecursionError:
+                i = end
+                continue
+            # balanced but not valid JSON (e.g. "{placeholder}" in prose): look inside it
+        i += 1
+
+
+def extract_json(text: str, expect=(dict, list)):
+    """First embedded JSON value of the expected type(s), or None"""
+    if not isinstance(text, str):
+        return None
+    stripped = text.strip()
+    try:
+        value = json.loads(stripped)
+        if isinstance(value, expect):
+            return value
+    except (ValueError, RecursionError):
+        pass
+    for value in iter_json_values(text):
+        if isinstance(value, expect):
+            return value
+    return None
+
+
+def _score(value) -> Optional[int]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        number = float(value)
+    elif isinstance(value, str):
+        m = _NUMBER.match(value)
+        if not m:
+            return None
+        number = float(m.group(1))
+    else:
+        return None
+    if number != number:  # NaN
+        return None
+    return int(min(SCORE_MAX, max(SCORE_MIN, round(number))))
+
+
+def validate_verdict(obj) -> dict:
+    """Schema-checked meta-evaluation dict, or {"error": ...} describing what is wrong"""
+    if not isinstance(obj, dict):
+        return {"error": "verdict is not a JSON object"}
+    verdict = {}
+    missing = []
+    for field in META_FIELDS:
+        score = _score(obj.get(field))
+        if score is None:
+            missing.append(field)
+        else:
+            verdict[field] = score
+    if missing:
+        return {"error": f"missing or non-numeric fields: {', '.join(missing)}"}
+    explain = obj.get("explain", "")
+    verdict["explain"] = explain if isinstance(explain, str) else json.dumps(explain)
+    return verdict
+
+
+def parse_verdict(out: str) -> dict:
+    """Judge output -> validated verdict (errors carry the raw output)"""
+    obj = extract_json(out, expect=dict)
+    if obj is None:
+        return {"error": "no JSON in evaluator output", "raw": out}
+    verdict = validate_verdict(obj)
+    if "error" in verdict:
+        verdict["raw"] = out
+    return verdict
+
+
+def parse_verdict_list(out: str, count: int) -> dict:
+    """Batch judge output -> {review number: validated verdict} for the valid entries.
+
+    Accepts a bare array or an object wrapping it ({"reviews": [...]}, as JSON mode
+    requires a top-level object).
+    """
+    items = None
+    for value in ([] if not isinstance(out, str) else iter_json_values(out)):
+        if isinstance(value, dict):
+            value = next((v for v in value.values() if isinstance(v, list)), None)
+        if isinstance(value, list) and any(isinstance(item, dict) for item in value):
+            items = value
+            break
+    verdicts = {}
+    if items is None:
+        return verdicts
+    for position, item in enumerate(items, 1):
+        if not isinstance(item, dict):
+            continue
+        number = item.get("review", position)
+        if isinstance(number, str) and number.strip().isdigit():
+            number = int(number)
+        if not isinstance(number, int) or isinstance(number, bool) or not 1 <= number <= count:
+            continue
+        verdict = validate_verdict(item)
+        if "error" not in verdict:
+            verdicts.setdefault(number, verdict)
+    return verdicts
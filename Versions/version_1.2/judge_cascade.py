@@ -0,0 +1,228 @@
+# judge_cascade.py
+#
+# Judge cascade: a local regressor scores reviews, the LLM judge only sees the
+# reviews the regressor is unsure about (plus a small calibration sample).
+#
+#  - features: heuristic_metrics() output + a few review-text features (headings,
+#    code blocks, numbered items, lines, file references)
+#  - model: one BayesianRidge per meta field (clarity, usefulness, depth, actionability,
+#    positivity); the uncertainty is the model's own (epistemic) std - the predictive std
+#    from predict(return_std=True) minus the fitted label noise 1/alpha_, which asking
+#    the LLM again would not reduce
+#  - the LLM judge is called when the model has too few samples, when any field's
+#    epistemic std exceeds JUDGE_MAX_STD, or for a JUDGE_CALIBRATION_RATE fraction of
+#    reviews; every LLM verdict becomes a training sample (judge_samples.jsonl) and
+#    calibration calls also record how far the local prediction was off
+#  - with no samples file yet, the reviews in the results store (heuristics +
+#    meta-evaluation + review text, results_store.py) seed the model
+#
+# Settings (environment): JUDGE_CASCADE=0 disables it (always LLM), JUDGE_SAMPLES_PATH,
+# JUDGE_MAX_STD, JUDGE_CALIBRATION_RATE, JUDGE_MIN_SAMPLES.
+
+import json
+import os
+import random
+import re
+import threading
+import numpy as np
+from sklearn.linear_model import BayesianRidge
+from sklearn.preprocessing import StandardScaler
+from review_heuristics import PROFILES
+from json_extract import META_FIELDS, SCORE_MIN, SCORE_MAX
+from results_store import get_store
+
+CASCADE_ENABLED = os.getenv("JUDGE_CASCADE", "1") != "0"
+SAMPLES_PATH = os.getenv("JUDGE_SAMPLES_PATH", "judge_samples.jsonl")
+MAX_STD = float(os.getenv("JUDGE_MAX_STD", "0.5"))
+CALIBRATION_RATE = float(os.getenv("JUDGE_CALIBRATION_RATE", "0.1"))
+MIN_SAMPLES = int(os.getenv("JUDGE_MIN_SAMPLES", "20"))
+MAX_SAMPLES = 5000  # most recent samples kept for fitting
+
+SECTIONS = tuple(PROFILES["default"]["sections"])
+
+_HEADING = re.compile(r"^\s*(?:#{1,6}\s|\*\*[^*\n]+\*\*:?\s*$)", re.MULTILINE)
+_NUMBERED = re.compile(r"^\s*\d+[.)]\s+", re.MULTILINE)
+_FILE_REF = re.compile(r"\b[\w/.-]+\.(?:py|js|ts|java|go|rb|rs|c|cpp|h|json|ya?ml|md)\b")
+
+
+def review_features(review: str, heur: dict) -> np.ndarray:
+    """Numeric feature vector for one review"""
+    sections = heur.get("sections_presence", {})
+    return np.array([
+        np.log1p(heur.get("length_chars", 0)),
+        np.log1p(heur.get("length_words", 0)),
+        min(heur.get("bullet_points", 0), 30),
+        float(bool(heur.get("mentions_bug"))),
+        float(bool(heur.get("mentions_suggest"))),
+        *(float(bool(sections.get(s, False))) for s in SECTIONS),
+        min(len(_HEADING.findall(review)), 20),
+        min(review.count("```") // 2, 10),
+        min(len(_NUMBERED.findall(review)), 30),
+        np.log1p(review.count("\n")),
+        min(len(_FILE_REF.findall(review)), 20),
+    ], dtype=np.float64)
+
+
+def _valid_meta(meta) -> bool:
+    # only in-schema verdicts become training samples (judge answers are validated by
+    # json_extract; this also keeps out-of-range scores in older logs from seeding the model)
+    return isinstance(meta, dict) and "error" not in meta and all(
+        isinstance(meta.get(k), (int, float)) and not isinstance(meta.get(k), bool)
+        and SCORE_MIN <= meta[k] <= SCORE_MAX for k in META_FIELDS)
+
+
+class JudgeCascade:
+    def __init__(self, llm_judge, samples_path: str = SAMPLES_PATH, max_std: float = MAX_STD,
+                 calibration_rate: float = CALIBRATION_RATE, min_samples: int = MIN_SAMPLES,
+                 enabled: bool = CASCADE_ENABLED, seed=None):
+        self.llm_judge = llm_judge  # (diff, review) -> (meta_parsed, meta_raw)
+        self.samples_path = samples_path
+        self.max_std = max_std
+        self.calibration_rate = calibration_rate
+        self.min_samples = min_samples
+        self.enabled = enabled
+        self.X = []
+        self.Y = []
+        self.models = None
+        self.scaler = None
+        self.stats = {"local": 0, "llm_uncertain": 0, "llm_calibration": 0, "llm_cold": 0,
+                      "calibration_abs_error": 0.0}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        if enabled:
+            self._load_samples()
+            self._fit()
+
+    # -------------------------
+    # Training data
+    # -------------------------
+    def _load_samples(self):
+        if os.path.exists(self.samples_path):
+            with open(self.samples_path, encoding="utf-8") as f:
+                for line in f:
+                    sample = json.loads(line)
+                    self.X.append(np.array(sample["x"], dtype=np.float64))
+                    self.Y.append(np.array(sample["y"], dtype=np.float64))
+        else:
+            self._seed_from_logs()
+
+    def _seed_from_logs(self):
+        """Bootstrap from stored reviews that have a valid LLM verdict"""
+        for result in get_store().results(with_review=True):
+            meta = result["meta"]
+            if not result["review"] or not result["heuristics"] or not _valid_meta(meta) or meta.get("source") == "local":
+                continue
+            self.add_sample(result["review"], result["heuristics"], meta)
+
+    def add_sample(self, review: str, heur: dict, meta: dict, persist: bool = True):
+        x = review_features(review, heur)
+        y = np.array([float(meta[k]) for k in META_FIELDS])
+        with self._lock:
+            self.X.append(x)
+            self.Y.append(y)
+            del self.X[:-MAX_SAMPLES], self.Y[:-MAX_SAMPLES]
+            if persist:
+                with open(self.samples_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"x": x.tolist(), "y": y.tolist()}) + "\n")
+
+    def _fit(self):
+        with self._lock:
+            if len(self.X) < self.min_samples:
+                return
+            X, Y = np.array(self.X), np.array(self.Y)
+        scaler = StandardScaler().fit(X)
+        Xs = scaler.transform(X)
+        models = [BayesianRidge().fit(Xs, Y[:, i]) for i in range(len(META_FIELDS))]
+        with self._lock:
+            self.scaler, self.models = scaler, models
+
+    # -------------------------
+    # Judging
+    # -------------------------
+    def predict(self, review: str, heur: dict):
+        """(mean, epistemic std) per meta field from the local model, or None before it is fitted"""
+        with self._lock:
+            scaler, models = self.scaler, self.models
+        if models is None:
+            return None
+        x = scaler.transform(review_features(review, heur)[None, :])
+        preds = [model.predict(x, return_std=True) for model in models]
+        # predictive variance = epistemic + label noise (1 / alpha_); only the first shrinks with samples
+        std = [np.sqrt(max(p[1][0] ** 2 - 1.0 / model.alpha_, 0.0)) for p, model in zip(preds, models)]
+        return np.array([p[0][0] for p in preds]), np.array(std)
+
+    def _route(self, review: str, heur: dict):
+        """(reason, prediction, local verdict or None) for one review"""
+        prediction = self.predict(review, heur)
+        if prediction is None:
+            return "llm_cold", None, None
+        if prediction[1].max() > self.max_std:
+            return "llm_uncertain", prediction, None
+        if self._rng.random() < self.calibration_rate:
+            return "llm_calibration", prediction, None
+        mean, std = prediction
+        meta = {k: round(float(np.clip(v, 1, 10)), 1) for k, v in zip(META_FIELDS, mean)}
+        meta["explain"] = f"Predicted by the local judge (max model std {std.max():.2f})."
+        meta["source"] = "local"
+        return "local", prediction, meta
+
+    def _record(self, reason: str, prediction, review: str, heur: dict, meta_parsed):
+        """Count an LLM verdict and learn from it"""
+        self._count(reason)
+        if not _valid_meta(meta_parsed):
+            return
+        if reason == "llm_calibration":
+            error = np.abs(prediction[0] - [float(meta_parsed[k]) for k in META_FIELDS]).mean()
+            with self._lock:
+                self.stats["calibration_abs_error"] += float(error)
+        self.add_sample(review, heur, meta_parsed)
+
+    def judge(self, diff: str, review: str, heur: dict):
+        """Drop-in for meta_evaluate(diff, review): returns (meta_parsed, meta_raw)"""
+        if not self.enabled:
+            return self.llm_judge(diff, review)
+        reason, prediction, local = self._route(review, heur)
+        if local is not None:
+            self._count("local")
+            return local, None
+
+        meta_parsed, meta_raw = self.llm_judge(diff, review)
+        self._record(reason, prediction, review, heur, meta_parsed)
+        self._fit()
+        return meta_parsed, meta_raw
+
+    def judge_many(self, diff: str, reviews, heurs, llm_judge_batch):
+        """Judge several reviews of one diff; the ones needing the LLM go out in one batch call.
+
+        `llm_judge_batch(diff, reviews)` returns a (meta_parsed, meta_raw) pair per review.
+        """
+        if not self.enabled:
+            return llm_judge_batch(diff, list(reviews))
+        routes = [self._route(review, heur) for review, heur in zip(reviews, heurs)]
+        verdicts = [(local, None) if local is not None else None for _, _, local in routes]
+        pending = [i for i, verdict in enumerate(verdicts) if verdict is None]
+        self._count("local", len(reviews) - len(pending))
+        if pending:
+            answers = llm_judge_batch(diff, [reviews[i] for i in pending])
+            for i, (meta_parsed, meta_raw) in zip(pending, answers):
+                reason, prediction, _ = routes[i]
+                self._record(reason, prediction, reviews[i], heurs[i], meta_parsed)
+                verdicts[i] = (meta_parsed, meta_raw)
+            self._fit()
+        return verdicts
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self.stats[key] += n
+
+    def summary(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            samples = len(self.X)
+        llm_calls = stats["llm_uncertain"] + stats["llm_calibration"] + stats["llm_cold"]
+        total = llm_calls + stats["local"]
+        calibration = stats.pop("calibration_abs_error")
+        stats["calibration_mae"] = round(calibration / stats["llm_calibration"], 2) if stats["llm_calibration"] else None
+        stats["judge_calls_saved"] = f"{stats['local'] / total:.0%}" if total else "0%"
+        stats["samples"] = samples
+        return stats
@@ -0,0 +1,161 @@
+# llm_cache.py
+#
+# Content-addressed on-disk cache for LLM chain outputs (SQLite).
+#
+# Responsible for:
+#  - Keying every call by a hash of the rendered messages + model name + sampling params,
+#    so re-running accuracy_checker / prompt_tester on the same PR costs zero API calls
+#  - Size- and age-based eviction (least recently used entries go first)
+#  - Hit/miss counters (per process, and cumulative in the database)
+#
+# Settings (environment): LLM_CACHE=0 disables it, LLM_CACHE_PATH, LLM_CACHE_MAX_ENTRIES,
+# LLM_CACHE_MAX_MB, LLM_CACHE_MAX_AGE_DAYS.
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+CACHE_ENABLED = os.getenv("LLM_CACHE", "1") != "0"
+CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3")
+CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "20000"))
+CACHE_MAX_BYTES = int(float(os.getenv("LLM_CACHE_MAX_MB", "200")) * 1024 * 1024)
+CACHE_MAX_AGE_S = float(os.getenv("LLM_CACHE_MAX_AGE_DAYS", "30")) * 86400
+
+SAMPLING_PARAMS = ("temperature", "top_p", "max_tokens", "seed", "stop")
+EVICT_EVERY = 100  # puts between eviction sweeps
+
+
+def llm_signature(llm) -> dict:
+    """Model name and sampling parameters of a chat model, as far as they can be read"""
+    model = getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+    params = {}
+    for name in SAMPLING_PARAMS:
+        value = getattr(llm, name, None)
+        if value is not None:
+            params[name] = value
+    return {"model": str(model), "params": params}
+
+
+def cache_key(messages, signature: dict) -> str:
+    rendered = [(getattr(m, "type", "text"), getattr(m, "content", str(m))) for m in messages]
+    payload = json.dumps({"messages": rendered, **signature}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = CACHE_MAX_ENTRIES,
+                 max_bytes: int = CACHE_MAX_BYTES, max_age_s: float = CACHE_MAX_AGE_S):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, model TEXT, response TEXT NOT NULL,"
+                " size INTEGER NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses(last_used)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self.evict()
+
+    def _count(self, name: str):
+        self._db.execute("INSERT INTO counters(name, value) VALUES (?, 1) "
+                         "ON CONFLICT(name) DO UPDATE SET value = value + 1", (name,))
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock, self._db:
+            row = self._db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and now - row[1] > self.max_age_s:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self.misses += 1
+                self._count("misses")
+                return None
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            self._count("hits")
+            return row[0]
+
+    def put(self, key: str, model: str, response: str):
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses(key, model, response, size, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)", (key, model, response, len(response.encode("utf-8")), now, now))
+            self._puts += 1
+            sweep = self._puts % EVICT_EVERY == 0
+        if sweep:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until under the size limits"""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.max_age_s,))
+            count, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            if count <= self.max_entries and total <= self.max_bytes:
+                return
+            drop_count = max(0, count - self.max_entries)
+            drop_bytes = max(0, total - self.max_bytes)
+            victims = []
+            freed = 0
+            for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY last_used"):
+                if len(victims) >= drop_count and freed >= drop_bytes:
+                    break
+                victims.append((key,))
+                freed += size
+            self._db.executemany("DELETE FROM responses WHERE key = ?", victims)
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+            lifetime = dict(self._db.execute("SELECT name, value FROM counters").fetchall())
+        return {"hits": self.hits, "misses": self.misses, "entries": count, "bytes": total,
+                "lifetime_hits": lifetime.get("hits", 0), "lifetime_misses": lifetime.get("misses", 0)}
+
+
+class CachedChain:
+    """Drop-in for `prompt | llm | parser` that answers repeated calls from the cache"""
+
+    def __init__(self, prompt, model_chain, signature: dict, cache: ResponseCache, cacheable=None):
+        self.prompt = prompt
+        self.model_chain = model_chain  # messages -> str (llm | parser)
+        self.signature = signature      # see llm_signature()
+        self.cache = cache
+        self.cacheable = cacheable      # optional () -> bool, checked after each model call
+
+    def invoke(self, inputs: dict, config=None) -> str:
+        messages = self.prompt.format_messages(**inputs)
+        key = cache_key(messages, self.signature)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        output = self.model_chain.invoke(messages, config)
+        if self.cacheable is None or self.cacheable():
+            self.cache.put(key, self.signature["model"], output)
+        return output
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+def get_cache() -> Optional[ResponseCache]:
+    """Process-wide cache (None when disabled with LLM_CACHE=0)"""
+    global _default_cache
+    if not CACHE_ENABLED:
+        return None
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache()
+        return _default_cache
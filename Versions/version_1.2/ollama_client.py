@@ -0,0 +1,50 @@
+# ollama_client.py
+#
+# Minimal client for a local Ollama server (the path version_2.py uses), shaped so it
+# can stand in for ChatGroq inside a `prompt | llm | parser` chain.
+#
+# Settings (environment): OLLAMA_URL, OLLAMA_MODEL.
+
+import os
+
+import requests
+from langchain_core.runnables import RunnableLambda
+
+OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "codellama")
+OLLAMA_TIMEOUT_S = float(os.getenv("OLLAMA_TIMEOUT_S", "300"))
+
+_ROLES = {"system": "system", "human": "user", "ai": "assistant"}
+
+_session = requests.Session()
+
+
+def to_chat_messages(messages):
+    """LangChain messages / PromptValue / str -> Ollama chat messages"""
+    if hasattr(messages, "to_messages"):
+        messages = messages.to_messages()
+    if isinstance(messages, str):
+        return [{"role": "user", "content": messages}]
+    return [{"role": _ROLES.get(getattr(m, "type", "human"), "user"), "content": m.content} for m in messages]
+
+
+def ollama_chat(messages, model: str = OLLAMA_MODEL, temperature: float = 0.25, json_mode: bool = False) -> str:
+    payload = {
+        "model": model,
+        "messages": to_chat_messages(messages),
+        "stream": False,
+        "options": {"temperature": temperature},
+    }
+    if json_mode:
+        payload["format"] = "json"  # constrained decoding: the answer is always valid JSON
+    response = _session.post(f"{OLLAMA_URL}/api/chat", json=payload, timeout=OLLAMA_TIMEOUT_S)
+    if response.status_code != 200:
+        raise Exception(f"Ollama API Error ({response.status_code}): {response.text[:500]}")
+    return response.json()["message"]["content"]
+
+
+def make_ollama_llm(model: str = OLLAMA_MODEL, temperature: float = 0.25, json_mode: bool = False):
+    llm = RunnableLambda(lambda messages: ollama_chat(messages, model, temperature, json_mode))
+    llm.model_name = model  # read by llm_cache.llm_signature
+    llm.temperature = temperature
+    return llm
@@ -0,0 +1,194 @@
+# pr_features.py
+#
+# Single-pass PR feature extraction for the prompt selector.
+#
+# extract_pr_features() returns exactly the same 14-feature dict as the original
+# regex version of IterativePromptSelector.extract_pr_features, but walks the diff
+# lines once instead of running ~14 full-text scans (one of which, the DOTALL
+# block-comment regex, could backtrack across the whole diff).
+#
+#  - counters (lines, files, additions, deletions) are updated on every line
+#  - boolean features stop being checked as soon as they are found
+#  - case-insensitive keywords use str.lower() + `in` on ASCII lines and fall back to
+#    the original IGNORECASE regex on non-ASCII lines, where Unicode case folding differs
+#  - the old patterns `\.py$`, `\.json$`, ... had no MULTILINE flag, so `$` only ever
+#    matched at the very end of the diff; that quirk is kept so features stay comparable
+#    with already-logged results
+#
+# metadata_features() is the cheap tier: the same dict estimated from a PR files
+# listing (pr_metadata.PRFile records), so a prompt can be selected before the diff is
+# downloaded. The estimate is systematically off for content-dependent features, so it
+# is only used to select: the model is updated with extract_pr_features() of the diff.
+
+import re
+
+FEATURE_ORDER = [
+    'num_lines', 'num_files', 'additions', 'deletions', 'net_changes',
+    'has_comments', 'has_functions', 'has_imports', 'has_test',
+    'has_docs', 'has_config', 'is_python', 'is_js', 'is_java'
+]
+
+# exact per-line equivalents of the original patterns (used on non-ASCII lines)
+_FUNC_RE = re.compile(r'def\s+\w+|\bfunction\b|\bfunc\b', re.IGNORECASE)
+_DEF_AT_END_RE = re.compile(r'def\s*$', re.IGNORECASE)
+_TEST_RE = re.compile(r'test|spec|unittest', re.IGNORECASE)
+_DOCS_RE = re.compile(r'readme|doc|comment|documentation', re.IGNORECASE)
+_CONF_RE = re.compile(r'\.conf', re.IGNORECASE)
+# fast paths on lowered ASCII lines
+_FUNC_LOWER_RE = re.compile(r'def\s+\w|\bfunc(?:tion)?\b')
+_DEF_AT_END_LOWER_RE = re.compile(r'def\s*$')
+
+# end-of-diff patterns, applied to the last few characters only
+_TAIL_CONFIG_RE = re.compile(r'\.json$|\.yml$|\.yaml$|\.xml$', re.IGNORECASE)
+_TAIL_PYTHON_RE = re.compile(r'\.py$', re.IGNORECASE)
+_TAIL_JS_RE = re.compile(r'\.js$|\.ts$', re.IGNORECASE)
+_TAIL_JAVA_RE = re.compile(r'\.java$', re.IGNORECASE)
+
+
+def _starts_with_word(line: str, word: str, is_last: bool) -> bool:
+    """`^word\\s` in MULTILINE mode: the newline after the line counts as whitespace"""
+    if not line.startswith(word):
+        return False
+    if len(line) > len(word):
+        return line[len(word)].isspace()
+    return not is_last
+
+
+def extract_pr_features(diff_text: str) -> dict:
+    """Extract the selector's PR features in one walk over the diff lines"""
+    lines = diff_text.split('\n')
+    last_index = len(lines) - 1
+
+    num_files = additions = deletions = 0
+    has_comments = has_functions = has_imports = has_test = has_docs = has_conf = False
+    block_open = False      # saw "/*", waiting for a later "*/"
+    pending_def = False     # "def" followed only by whitespace so far (\s+ spans newlines)
+
+    for i, line in enumerate(lines):
+        first = line[:1]
+        if first == '+':
+            additions += 1
+        elif first == '-':
+            deletions += 1
+        elif first == 'd' and line.startswith('diff --git'):
+            num_files += 1
+
+        if has_comments and has_functions and has_imports and has_test and has_docs and has_conf:
+            continue
+
+        if not has_comments:
+            if '#' in line or '//' in line:
+                has_comments = True
+            elif block_open:
+                has_comments = '*/' in line
+            else:
+                pos = line.find('/*')
+                if pos >= 0:
+                    block_open = True
+                    has_comments = line.find('*/', pos + 2) >= 0
+
+        if not has_imports and first in ('i', 'f', '#'):
+            has_imports = (_starts_with_word(line, 'import', i == last_index)
+                           or _starts_with_word(line, 'from', i == last_index)
+                           or line.startswith('#include'))
+
+        if has_functions and has_test and has_docs and has_conf:
+            continue
+
+        ascii_line = line.isascii()
+        low = line.lower() if ascii_line else line
+
+        if not has_functions:
+            if pending_def:
+                stripped = line.lstrip()
+                if stripped:
+                    pending_def = False
+                    has_functions = stripped[0].isalnum() or stripped[0] == '_'
+            if not has_functions:
+                if ascii_line:
+                    if 'def' in low or 'func' in low:
+                        has_functions = _FUNC_LOWER_RE.search(low) is not None
+                        pending_def = pending_def or _DEF_AT_END_LOWER_RE.search(low) is not None
+                else:
+                    has_functions = _FUNC_RE.search(line) is not None
+                    pending_def = pending_def or _DEF_AT_END_RE.search(line) is not None
+
+        if ascii_line:
+            if not has_test:
+                has_test = 'test' in low or 'spec' in low
+            if not has_docs:
+                has_docs = 'readme' in low or 'doc' in low or 'comment' in low
+            if not has_conf:
+                has_conf = '.conf' in low
+        else:
+            if not has_test:
+                has_test = _TEST_RE.search(line) is not None
+            if not has_docs:
+                has_docs = _DOCS_RE.search(line) is not None
+            if not has_conf:
+                has_conf = _CONF_RE.search(line) is not None
+
+    tail = diff_text[-8:]
+    features = {}
+    features['num_lines'] = len(lines)
+    features['num_files'] = num_files
+    features['additions'] = additions
+    features['deletions'] = deletions
+    features['net_changes'] = additions - deletions
+    features['has_comments'] = int(has_comments)
+    features['has_functions'] = int(has_functions)
+    features['has_imports'] = int(has_imports)
+    features['has_test'] = int(has_test)
+    features['has_docs'] = int(has_docs)
+    features['has_config'] = int(has_conf or _TAIL_CONFIG_RE.search(tail) is not None)
+    features['is_python'] = int(_TAIL_PYTHON_RE.search(tail) is not None)
+    features['is_js'] = int(_TAIL_JS_RE.search(tail) is not None)
+    features['is_java'] = int(_TAIL_JAVA_RE.search(tail) is not None)
+    return features
+
+
+# "diff --git", "index", "---", "+++", and typically one "@@" line with ~6 context lines per file
+FILE_OVERHEAD_LINES = 11
+# languages whose diffs contain the def / function / func keywords has_functions looks for
+_CODE_LANGUAGES = {
+    'python', 'javascript', 'typescript', 'java', 'go', 'ruby', 'rust', 'c', 'cpp', 'csharp',
+    'php', 'kotlin', 'swift', 'scala', 'shell'
+}
+
+
+def metadata_features(files) -> dict:
+    """Estimate extract_pr_features() from a PR files listing, without the diff text.
+
+    - additions / deletions include the "+++" / "---" header line of every text file,
+      as the diff walk counts them; num_lines adds FILE_OVERHEAD_LINES per file (context
+      lines are not in the listing, so they are a typical amount; the selector
+      log-compresses counts anyway)
+    - has_test / has_docs / has_config use the same keywords on the file paths, i.e.
+      what the diff walk finds in the "diff --git" headers alone
+    - has_comments / has_functions depend on the changed lines, which the listing does
+      not have: they are guessed as set when text / source files changed
+    - has_imports and is_python / is_js / is_java are 0: the diff walk only matches them
+      on unprefixed lines and at the very end of the diff, which a GitHub diff never has
+    """
+    files = list(files)
+    text_files = [f for f in files if not f.is_binary]
+    additions = sum(f.additions for f in files) + len(text_files)
+    deletions = sum(f.deletions for f in files) + len(text_files)
+    paths = [p.lower() for f in files for p in {f.path, f.old_path} if p]
+
+    features = {}
+    features['num_lines'] = additions + deletions + (FILE_OVERHEAD_LINES - 2) * len(files) + 1
+    features['num_files'] = len(files)
+    features['additions'] = additions
+    features['deletions'] = deletions
+    features['net_changes'] = additions - deletions
+    features['has_comments'] = int(bool(text_files))
+    features['has_functions'] = int(any(f.language in _CODE_LANGUAGES for f in text_files))
+    features['has_imports'] = 0
+    features['has_test'] = int(any('test' in p or 'spec' in p for p in paths))
+    features['has_docs'] = int(any('readme' in p or 'doc' in p or 'comment' in p for p in paths))
+    features['has_config'] = int(any('.conf' in p for p in paths))
+    features['is_python'] = 0
+    features['is_js'] = 0
+    features['is_java'] = 0
+    return features
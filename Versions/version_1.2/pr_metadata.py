@@ -0,0 +1,189 @@
+# pr_metadata.py
+#
+# Batched PR metadata over the GitHub GraphQL API: head SHA, changed-file count,
+# additions / deletions, labels, draft flag and last update for up to 100 PRs per
+# request, instead of one REST call per PR.
+#
+#  - fetch_open_prs: every open PR of a repository, 100 per page, cursor pagination
+#  - fetch_prs: specific PR numbers, 100 aliased pullRequest(number:) fields per query
+#  - pr_queue: drafts / excluded labels / PRs already reviewed at their head SHA are
+#    dropped, the rest ordered for run_iterative_selector (most recently updated first)
+#  - fetch_pr_files: the files listing of one PR (path, change type, additions /
+#    deletions per file, 100 files per page) without any diff text; the selector's cheap
+#    feature tier (pr_features.metadata_features) is computed from it
+#
+# The endpoint comes from github_client (GITHUB_GRAPHQL_URL / GITHUB_API_URL), so a
+# local stub server can stand in for the API (see bench_pr_metadata.py).
+
+import re
+from diff_parser import language_for
+from github_client import get_client
+
+PAGE_SIZE = 100   # GraphQL maximum for `first`
+MAX_LABELS = 20
+
+_PR_FIELDS = f"""
+    number
+    headRefOid
+    baseRefName
+    changedFiles
+    additions
+    deletions
+    isDraft
+    updatedAt
+    labels(first: {MAX_LABELS}) {{ nodes {{ name }} }}
+"""
+
+OPEN_PRS_QUERY = """
+query($owner: String!, $name: String!, $first: Int!, $after: String) {
+  repository(owner: $owner, name: $name) {
+    pullRequests(states: OPEN, first: $first, after: $after, orderBy: {field: UPDATED_AT, direction: DESC}) {
+      pageInfo { hasNextPage endCursor }
+      nodes { %s }
+    }
+  }
+}
+""" % _PR_FIELDS
+
+PR_FILES_QUERY = """
+query($owner: String!, $name: String!, $number: Int!, $first: Int!, $after: String) {
+  repository(owner: $owner, name: $name) {
+    pullRequest(number: $number) {
+      files(first: $first, after: $after) {
+        pageInfo { hasNextPage endCursor }
+        nodes { path additions deletions changeType }
+      }
+    }
+  }
+}
+"""
+
+
+class PRMeta:
+    """Compact metadata record of one PR"""
+    __slots__ = ("number", "head_sha", "base_ref", "changed_files", "additions", "deletions",
+                 "labels", "is_draft", "updated_at")
+
+    def __init__(self, node: dict):
+        self.number = node["number"]
+        self.head_sha = node["headRefOid"]
+        self.base_ref = node.get("baseRefName")
+        self.changed_files = node.get("changedFiles", 0)
+        self.additions = node.get("additions", 0)
+        self.deletions = node.get("deletions", 0)
+        self.labels = tuple(label["name"] for label in (node.get("labels") or {}).get("nodes", []))
+        self.is_draft = bool(node.get("isDraft"))
+        self.updated_at = node.get("updatedAt")
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return (f"PRMeta(#{self.number}, head={self.head_sha[:12]}, files={self.changed_files}, "
+                f"+{self.additions}/-{self.deletions}, labels={list(self.labels)})")
+
+
+class PRFile:
+    """One entry of a PR files listing; same fields as diff_parser.FileDiff minus the hunks.
+
+    `status` is the change type in GitHub's words (added, deleted, modified, renamed,
+    copied, changed). Not every source reports binary files (GraphQL does not), so every
+    source uses the same rule: a file without changed lines that was not renamed or
+    copied counts as binary, i.e. has nothing to review.
+    """
+    __slots__ = ("path", "old_path", "status", "language", "is_binary", "additions", "deletions")
+
+    def __init__(self, path: str, additions: int, deletions: int, status: str = "modified", old_path=None):
+        self.path = path
+        self.old_path = old_path or path
+        self.status = status
+        self.language = language_for(path)
+        self.is_binary = additions == 0 and deletions == 0 and status not in ("renamed", "copied")
+        self.additions = additions
+        self.deletions = deletions
+
+    def __repr__(self):
+        return f"PRFile({self.path!r}, status={self.status}, +{self.additions}/-{self.deletions})"
+
+
+def fetch_open_prs(owner: str, repo: str, token=None, limit=None, client=None):
+    """Metadata of the open PRs, most recently updated first (one request per 100 PRs)"""
+    client = client or get_client()
+    records = []
+    cursor = None
+    while limit is None or len(records) < limit:
+        first = PAGE_SIZE if limit is None else min(PAGE_SIZE, limit - len(records))
+        data = client.post_graphql(OPEN_PRS_QUERY, {"owner": owner, "name": repo, "first": first, "after": cursor},
+                                   token)
+        page = data["repository"]["pullRequests"]
+        records.extend(PRMeta(node) for node in page["nodes"])
+        if not page["pageInfo"]["hasNextPage"]:
+            break
+        cursor = page["pageInfo"]["endCursor"]
+    return records
+
+
+def _missing_pr(error: dict) -> bool:
+    """GitHub's answer for `prN: pullRequest(number: N)` when PR N does not exist"""
+    path = error.get("path") or []
+    return error.get("type") == "NOT_FOUND" and bool(path) and re.fullmatch(r"pr\d+", str(path[-1])) is not None
+
+
+def fetch_prs(owner: str, repo: str, pr_numbers, token=None, client=None):
+    """Metadata of specific PRs in input order (missing PRs are left out, the rest of
+    their batch is kept)"""
+    client = client or get_client()
+    numbers = list(dict.fromkeys(int(n) for n in pr_numbers))
+    by_number = {}
+    for offset in range(0, len(numbers), PAGE_SIZE):
+        batch = numbers[offset:offset + PAGE_SIZE]
+        fields = "\n".join(f"pr{n}: pullRequest(number: {n}) {{ {_PR_FIELDS} }}" for n in batch)
+        query = f"query($owner: String!, $name: String!) {{ repository(owner: $owner, name: $name) {{ {fields} }} }}"
+        data = client.post_graphql(query, {"owner": owner, "name": repo}, token, tolerate=_missing_pr)
+        for node in data["repository"].values():
+            if node:
+                by_number[node["number"]] = PRMeta(node)
+    return [by_number[n] for n in numbers if n in by_number]
+
+
+def pr_queue(records, is_done=None, skip_drafts: bool = True, exclude_labels=(), max_changes=None):
+    """(PR numbers, {number: head SHA}) to review, most recently updated first.
+
+    `is_done(pr_number, head_sha)` (e.g. IterativePromptSelector.is_done) drops PRs that
+    were already reviewed at their current head; `max_changes` drops PRs with more
+    added + deleted lines than that.
+    """
+    excluded = set(exclude_labels)
+    queue = []
+    for record in records:
+        if skip_drafts and record.is_draft:
+            continue
+        if excluded.intersection(record.labels):
+            continue
+        if max_changes is not None and record.additions + record.deletions > max_changes:
+            continue
+        if is_done is not None and is_done(record.number, record.head_sha):
+            continue
+        queue.append(record)
+    queue.sort(key=lambda record: record.updated_at or "", reverse=True)
+    return [record.number for record in queue], {record.number: record.head_sha for record in queue}
+
+
+def fetch_pr_files(owner: str, repo: str, pr_number: int, token=None, client=None):
+    """Files listing of one PR (no diff text), in diff order"""
+    client = client or get_client()
+    files = []
+    cursor = None
+    while True:
+        data = client.post_graphql(PR_FILES_QUERY, {"owner": owner, "name": repo, "number": int(pr_number),
+                                                    "first": PAGE_SIZE, "after": cursor}, token)
+        pr = data["repository"]["pullRequest"]
+        if pr is None:
+            raise Exception(f"PR #{pr_number} not found in {owner}/{repo}")
+        page = pr["files"]
+        for node in page["nodes"]:
+            additions, deletions = node.get("additions", 0), node.get("deletions", 0)
+            files.append(PRFile(node["path"], additions, deletions, (node.get("changeType") or "modified").lower()))
+        if not page["pageInfo"]["hasNextPage"]:
+            return files
+        cursor = page["pageInfo"]["endCursor"]
@@ -0,0 +1,161 @@
+# rate_limit.py
+#
+# Rate-limit-aware request scheduling (replaces the fixed time.sleep() throttles).
+#
+# One token bucket per upstream (GitHub, LLM provider). Callers block in acquire()
+# only while the bucket is empty or the server told us to back off:
+#  - GitHub: X-RateLimit-Remaining / X-RateLimit-Reset re-pace the bucket so the
+#    remaining quota is spread over the time left in the window; Remaining == 0
+#    pauses until the reset time
+#  - Groq (and GitHub secondary limits): 429 / Retry-After pause the bucket for
+#    exactly the requested time
+#
+# budget() exposes the current state for logging.
+
+import email.utils
+import os
+import re
+import threading
+import time
+from typing import Optional
+
+# GitHub REST: 5000 requests/hour for a token. Groq free tier: 30 requests/minute.
+GITHUB_RATE_PER_S = float(os.getenv("GITHUB_RATE_PER_S", str(5000 / 3600)))
+GITHUB_BURST = int(os.getenv("GITHUB_BURST", "20"))
+LLM_RATE_PER_S = float(os.getenv("LLM_RATE_PER_S", "0.5"))
+LLM_BURST = int(os.getenv("LLM_BURST", "8"))
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+def parse_duration(value) -> Optional[float]:
+    """Seconds from '12', '1.5', '2m59.56s', '350ms' or an HTTP date"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if parts:
+        scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+        return sum(float(n) * scale[unit] for n, unit in parts)
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    def __init__(self, name: str, rate_per_s: float, burst: int):
+        self.name = name
+        self.base_rate = rate_per_s
+        self.rate = rate_per_s
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.remaining = None          # server-reported quota left, if known
+        self.reset_at = None           # wall-clock time the server quota resets
+        self.blocked_until = 0.0       # monotonic time before which nothing is sent
+        self.waited_s = 0.0
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> float:
+        """Block until a request may be sent; returns the seconds spent waiting"""
+        waited = 0.0
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    self.waited_s += waited
+                    return waited
+                if now < self.blocked_until:
+                    delay = self.blocked_until - now
+                else:
+                    delay = (1 - self.tokens) / self.rate if self.rate > 0 else 1.0
+                self._cond.wait(delay)
+                waited += time.monotonic() - now
+
+    def pause(self, seconds: float):
+        """Send nothing for `seconds` (Retry-After, exhausted quota)"""
+        with self._cond:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + max(0.0, seconds))
+            self._cond.notify_all()
+
+    def update_from_headers(self, headers, status_code: Optional[int] = None):
+        """Adjust pacing from rate-limit response headers (GitHub and OpenAI/Groq style)"""
+        if headers is None:
+            return
+        get = headers.get
+        retry_after = parse_duration(get("Retry-After") or get("retry-after"))
+        remaining = get("X-RateLimit-Remaining") or get("x-ratelimit-remaining-requests")
+        reset = get("X-RateLimit-Reset")
+        reset_in = parse_duration(get("x-ratelimit-reset-requests"))
+
+        with self._cond:
+            if remaining is not None:
+                try:
+                    self.remaining = int(float(remaining))
+                except ValueError:
+                    self.remaining = None
+            if reset is not None:
+                try:
+                    self.reset_at = float(reset)  # GitHub: epoch seconds
+                except ValueError:
+                    pass
+            elif reset_in is not None:
+                self.reset_at = time.time() + reset_in
+
+            seconds_left = max(1.0, self.reset_at - time.time()) if self.reset_at else None
+            if self.remaining is not None and seconds_left is not None:
+                if self.remaining <= 0:
+                    retry_after = max(retry_after or 0.0, seconds_left)
+                else:
+                    # spread what is left evenly over the window, never slower than needed
+                    self.rate = max(self.base_rate, self.remaining / seconds_left)
+                    self.tokens = min(self.tokens, float(self.remaining))
+            self._cond.notify_all()
+
+        if retry_after and (status_code in (403, 429) or self.remaining == 0):
+            self.pause(retry_after)
+
+    def budget(self) -> dict:
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            return {
+                "tokens": round(self.tokens, 2),
+                "rate_per_s": round(self.rate, 3),
+                "server_remaining": self.remaining,
+                "reset_in_s": round(self.reset_at - time.time(), 1) if self.reset_at else None,
+                "blocked_for_s": round(max(0.0, self.blocked_until - now), 2),
+                "total_waited_s": round(self.waited_s, 2),
+            }
+
+
+github_limiter = RateLimiter("github", GITHUB_RATE_PER_S, GITHUB_BURST)
+llm_limiter = RateLimiter("llm", LLM_RATE_PER_S, LLM_BURST)
+
+
+def budgets() -> dict:
+    return {limiter.name: limiter.budget() for limiter in (github_limiter, llm_limiter)}
+
+
+def rate_limit_info(error: Exception):
+    """(is_rate_limited, retry_after_s, headers) for an exception raised by an LLM client"""
+    status = getattr(error, "status_code", None)
+    response = getattr(error, "response", None)
+    if status is None and response is not None:
+        status = getattr(response, "status_code", None)
+    headers = getattr(response, "headers", None)
+    if status != 429 and "rate limit" not in str(error).lower():
+        return False, None, headers
+    retry_after = parse_duration(headers.get("retry-after")) if headers is not None else None
+    return True, retry_after, headers
@@ -0,0 +1,244 @@
+# replay.py
+#
+# Offline replay / counterfactual evaluation of prompt-selection policies.
+# Run: python replay.py [log_dir]      (no network, no LLM calls)
+#
+# Reads what the iterative selector logged - the results store (results.sqlite3), any
+# not yet migrated iterative_results_pr*_*.json files and the selector state
+# (selector_state.npz, or the legacy selector_state.json) - and
+# estimates the average review score each candidate policy would have reached on
+# those PRs:
+#
+#  - DM:    direct method; a reward model (per-prompt ridge regression on the PR
+#           features, around the global mean) predicts the score of the chosen prompt
+#  - replay: average logged score over the PRs where the policy picks the logged prompt
+#  - IPS:   inverse propensity scoring over the PRs where the policy picks the logged
+#           prompt; SNIPS is its self-normalized variant
+#  - DR:    doubly robust; DM corrected by the IPS-weighted reward-model error
+#
+# IPS / SNIPS / DR need the logging policy's probability of each logged prompt (the
+# "propensity" the selector stores with every result: 1.0, its choice is a deterministic
+# argmax). They are computed over the log entries that have one, and only for policies
+# with support there: a deterministic logger (propensity 1.0) never tried the other
+# prompts, so a policy that deviates on such a PR gets N/A, not a made-up estimate.
+# Entries without a propensity (older logs) only count for DM and replay.
+# Learning policies (LinUCB variants) are replayed in log order and only learn from
+# PRs where they agree with the log (Li et al. replay method).
+#
+# Every policy reviews each PR with one prompt, i.e. one review + one judge call per
+# PR; run_all (every prompt on every PR) is reported for comparison.
+
+import glob
+import json
+import os
+import sys
+import numpy as np
+from datetime import datetime
+from pr_features import FEATURE_ORDER
+from results_store import RESULTS_DB, ResultsStore
+from selector_engine import LinUCBEngine, transform_features
+
+ALPHAS = [0.0, 0.5, 1.0, 2.0]
+MIN_PROPENSITY = 0.01
+CALLS_PER_REVIEW = 2  # generate + judge
+
+# Prompt set of prompts_v2.get_prompts(), in order (kept here so replay needs no LLM stack)
+PROMPT_NAMES = ["Zero-shot", "Few-shot", "Chain-of-Thought", "Tree-of-Thought",
+                "Self-Consistency", "Reflection", "Meta"]
+
+
+class LoggedData:
+    def __init__(self, features, actions, rewards, propensities, prompt_names):
+        self.features = features          # (n, d) raw PR features
+        self.actions = actions            # (n,) logged prompt index
+        self.rewards = rewards            # (n,) logged score 0-10
+        self.propensities = propensities  # (n,) P(logged prompt | PR) under the logging policy, NaN if not logged
+        self.prompt_names = prompt_names
+
+    def __len__(self):
+        return len(self.actions)
+
+
+def load_logs(log_dir: str = ".", prompt_names=PROMPT_NAMES) -> LoggedData:
+    """Results files plus selector history, de-duplicated, in time order"""
+    events = []  # (order, features, prompt name, score, propensity)
+    seen = set()
+
+    def add(order, features, prompt, score, propensity=None):
+        key = (tuple(float(v) for v in features), prompt, round(float(score), 2))
+        if prompt in prompt_names and key not in seen:
+            seen.add(key)
+            events.append((order, features, prompt, float(score), propensity))
+
+    store_path = os.path.join(log_dir, os.path.basename(RESULTS_DB))
+    if os.path.exists(store_path):
+        for result in ResultsStore(store_path).results(source="iterative"):
+            if result["features"] is None or result["score"] is None:
+                continue
+            order = datetime.fromtimestamp(result["created"]).strftime("%Y%m%d_%H%M%S")
+            features = [result["features"].get(key, 0) for key in FEATURE_ORDER]
+            add(order, features, result["prompt"], result["score"], result["propensity"])
+
+    for path in sorted(glob.glob(os.path.join(log_dir, "iterative_results_pr*_*.json"))):
+        with open(path, encoding="utf-8") as f:
+            result = json.load(f)
+        features = [result["features"].get(key, 0) for key in FEATURE_ORDER]
+        add(result.get("timestamp", ""), features, result["selected_prompt"], result["review_score"],
+            result.get("propensity"))
+
+    npz_path = os.path.join(log_dir, "selector_state.npz")
+    json_path = os.path.join(log_dir, "selector_state.json")
+    if os.path.exists(npz_path):
+        with np.load(npz_path, allow_pickle=False) as state:
+            names = [str(name) for name in state["prompt_names"]]
+            order = [str(key) for key in state["feature_order"]]
+            columns = [order.index(key) if key in order else None for key in FEATURE_ORDER]
+            for i, (vector, arm, score) in enumerate(zip(state["feature_history"], state["prompt_history"],
+                                                         state["score_history"])):
+                add(f"~{i:09d}", [vector[c] if c is not None else 0 for c in columns], names[arm], score)
+    elif os.path.exists(json_path):
+        with open(json_path, encoding="utf-8") as f:
+            state = json.load(f)
+        for i, (vector, arm, score) in enumerate(zip(state["feature_history"], state["prompt_history"],
+                                                     state["score_history"])):
+            add(f"~{i:09d}", vector, prompt_names[arm], score)
+
+    events.sort(key=lambda e: e[0])
+    n = len(events)
+    features = np.array([e[1] for e in events], dtype=np.float64).reshape(n, len(FEATURE_ORDER))
+    actions = np.array([prompt_names.index(e[2]) for e in events], dtype=np.int64)
+    rewards = np.array([e[3] for e in events], dtype=np.float64)
+    propensities = np.array([e[4] if e[4] is not None else np.nan for e in events], dtype=np.float64)
+    return LoggedData(features, actions, rewards, propensities, list(prompt_names))
+
+
+class RewardModel:
+    """Per-prompt ridge regression of the score on the PR features, around the global mean"""
+
+    def __init__(self, data: LoggedData):
+        self.mean = float(data.rewards.mean()) if len(data) else 5.0
+        self.engine = LinUCBEngine(len(data.prompt_names), data.features.shape[1], alpha=0.0)
+        for x, a, r in zip(data.features, data.actions, data.rewards):
+            self.engine.update(x, a, r - self.mean)
+
+    def predict(self, features) -> np.ndarray:
+        """(n, n_prompts) predicted scores"""
+        return self.mean + transform_features(features) @ self.engine.theta.T
+
+
+# -------------------------
+# Policies: choose(x) -> prompt index, update(x, prompt index, score)
+# -------------------------
+class FixedPrompt:
+    def __init__(self, arm: int, name: str):
+        self.arm = arm
+        self.name = f"always {name}"
+
+    def choose(self, x):
+        return self.arm
+
+    def update(self, x, arm, score):
+        pass
+
+
+class RoundRobin:
+    name = "round-robin"
+
+    def __init__(self, n_arms: int):
+        self.n_arms = n_arms
+        self.step = 0
+
+    def choose(self, x):
+        arm = self.step % self.n_arms
+        self.step += 1
+        return arm
+
+    def update(self, x, arm, score):
+        pass
+
+
+class LinUCBPolicy:
+    """IterativePromptSelector's engine, as configured by SELECTOR_ALPHA"""
+
+    def __init__(self, n_arms: int, alpha: float):
+        self.engine = LinUCBEngine(n_arms, len(FEATURE_ORDER), alpha=alpha)
+        self.name = f"LinUCB alpha={alpha:g}"
+
+    def choose(self, x):
+        return self.engine.select(x)
+
+    def update(self, x, arm, score):
+        self.engine.update(x, arm, score / 10.0)
+
+
+def evaluate_policy(policy, data: LoggedData, reward_model: RewardModel) -> dict:
+    n = len(data)
+    q_hat = reward_model.predict(data.features)
+    choices = np.empty(n, dtype=np.int64)
+    for i in range(n):
+        choices[i] = policy.choose(data.features[i])
+        if choices[i] == data.actions[i]:
+            policy.update(data.features[i], data.actions[i], data.rewards[i])
+
+    rows = np.arange(n)
+    matched = choices == data.actions
+    q_chosen = q_hat[rows, choices]
+    q_logged = q_hat[rows, data.actions]
+    result = {
+        "policy": policy.name,
+        "DM": round(float(q_chosen.mean()), 3),
+        "replay": round(float(data.rewards[matched].mean()), 3) if matched.any() else None,
+        "IPS": None, "SNIPS": None, "DR": None,
+        "matched": int(matched.sum()),
+        "llm_calls": n * CALLS_PER_REVIEW,
+    }
+
+    # off-policy estimates only where the logging policy gave the policy's choice a chance
+    logged = ~np.isnan(data.propensities)
+    supported = matched | (data.propensities < 1.0)
+    if not logged.any() or not supported[logged].all():
+        return result
+    p = np.maximum(data.propensities[logged], MIN_PROPENSITY)
+    weights = matched[logged] / p
+    rewards = data.rewards[logged]
+    result["IPS"] = round(float((weights * rewards).mean()), 3)
+    if weights.sum():
+        result["SNIPS"] = round(float((weights * rewards).sum() / weights.sum()), 3)
+    result["DR"] = round(float((q_chosen[logged] + weights * (rewards - q_logged[logged])).mean()), 3)
+    return result
+
+
+def default_policies(prompt_names, alphas=ALPHAS):
+    policies = [LinUCBPolicy(len(prompt_names), alpha) for alpha in alphas]
+    policies.append(RoundRobin(len(prompt_names)))
+    policies.extend(FixedPrompt(i, name) for i, name in enumerate(prompt_names))
+    return policies
+
+
+def run_replay(log_dir: str = ".", policies=None):
+    data = load_logs(log_dir)
+    if not len(data):
+        print(f"No logged selector results found in {log_dir}")
+        return []
+    reward_model = RewardModel(data)
+    policies = policies if policies is not None else default_policies(data.prompt_names)
+    results = [evaluate_policy(policy, data, reward_model) for policy in policies]
+
+    with_propensity = int((~np.isnan(data.propensities)).sum())
+    print(f"Replayed {len(data)} logged reviews (logged average score {data.rewards.mean():.2f}, "
+          f"{with_propensity} with a logged propensity)")
+    print(f"{'policy':28} | {'DM':>6} | {'replay':>6} | {'IPS':>6} | {'SNIPS':>6} | {'DR':>6} | "
+          f"{'matched':>7} | {'LLM calls':>9}")
+    cell = lambda value: f"{value:6.2f}" if value is not None else f"{'N/A':>6}"
+    for r in sorted(results, key=lambda r: r["DR"] if r["DR"] is not None else r["DM"], reverse=True):
+        print(f"{r['policy']:28} | {cell(r['DM'])} | {cell(r['replay'])} | {cell(r['IPS'])} | {cell(r['SNIPS'])} | "
+              f"{cell(r['DR'])} | {r['matched']:7d} | {r['llm_calls']:9d}")
+    if with_propensity < len(data):
+        print("(IPS / SNIPS / DR use only entries with a logged propensity and need support there; "
+              "N/A otherwise)")
+    print(f"(run_all, every prompt on every PR: {len(data) * len(data.prompt_names) * CALLS_PER_REVIEW} LLM calls)")
+    return results
+
+
+if __name__ == "__main__":
+    run_replay(sys.argv[1] if len(sys.argv) > 1 else ".")
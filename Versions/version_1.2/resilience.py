@@ -0,0 +1,143 @@
+# resilience.py
+#
+# Resilient LLM invocation: retries, circuit breakers and backend fallback.
+#
+#  - every backend call is retried with jittered exponential backoff
+#  - 429s wait exactly as long as the provider asks (via the backend's rate limiter)
+#    and do not count as breaker failures
+#  - each backend has a circuit breaker: after `failure_threshold` consecutive failures
+#    it opens and calls skip straight to the next backend (e.g. ChatGroq -> local
+#    Ollama) until `reset_timeout_s` has passed and a trial call succeeds
+#  - calls, successes, failures, retries, fallbacks and breaker trips are counted
+#    per backend in `metrics()`
+
+import random
+import threading
+import time
+from rate_limit import rate_limit_info
+
+RETRIES = 3
+BASE_DELAY_S = 1.0
+MAX_DELAY_S = 20.0
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout_s: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """May a call go through? An open breaker lets one trial call in after the timeout"""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout_s:
+                self.state = self.HALF_OPEN
+                return True
+            return self.state == self.CLOSED
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self) -> bool:
+        """Count a failure; returns True if this opened the breaker"""
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                was_open = self.state == self.OPEN
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                return not was_open
+            return False
+
+
+def backoff_delay(attempt: int, base: float = BASE_DELAY_S, cap: float = MAX_DELAY_S) -> float:
+    """Full-jitter exponential backoff"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class ResilientLLM:
+    """Invoke a list of (name, llm, limiter) backends in priority order.
+
+    `json_llms` maps backend names to a JSON-mode variant of the same model, used by
+    invoke(..., json_mode=True); both variants share the backend's breaker and counters.
+    """
+
+    def __init__(self, backends, retries: int = RETRIES, failure_threshold: int = 5,
+                 reset_timeout_s: float = 60.0, json_llms=None):
+        self.backends = list(backends)
+        self.json_llms = dict(json_llms or {})
+        self.retries = retries
+        self.breakers = {name: CircuitBreaker(failure_threshold, reset_timeout_s) for name, _, _ in self.backends}
+        self._metrics = {name: {"calls": 0, "successes": 0, "failures": 0, "retries": 0,
+                                "rate_limited": 0, "fallbacks": 0, "short_circuits": 0, "breaker_opens": 0}
+                         for name, _, _ in self.backends}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _count(self, name: str, key: str):
+        with self._lock:
+            self._metrics[name][key] += 1
+
+    def served_by_primary(self) -> bool:
+        """Did the last call on this thread get its answer from the first backend?"""
+        return getattr(self._local, "backend", None) == self.backends[0][0]
+
+    def invoke(self, messages, json_mode: bool = False):
+        last_error = None
+        for index, (name, llm, limiter) in enumerate(self.backends):
+            if json_mode:
+                llm = self.json_llms.get(name, llm)
+            breaker = self.breakers[name]
+            if not breaker.allow():
+                self._count(name, "short_circuits")
+                continue
+            if index > 0:
+                self._count(name, "fallbacks")
+            for attempt in range(self.retries + 1):
+                if limiter is not None:
+                    limiter.acquire()
+                self._count(name, "calls")
+                try:
+                    output = llm.invoke(messages)
+                except Exception as e:
+                    last_error = e
+                    limited, retry_after, headers = rate_limit_info(e)
+                    if limited:
+                        self._count(name, "rate_limited")
+                        if limiter is not None:
+                            limiter.update_from_headers(headers, 429)
+                            limiter.pause(retry_after if retry_after else backoff_delay(attempt))
+                    else:
+                        self._count(name, "failures")
+                        if breaker.record_failure():
+                            self._count(name, "breaker_opens")
+                            print(f"Circuit breaker opened for LLM backend '{name}': {e}")
+                        if not breaker.allow():
+                            break  # fall back to the next backend right away
+                    if attempt < self.retries:
+                        self._count(name, "retries")
+                        if not limited:
+                            time.sleep(backoff_delay(attempt))
+                    continue
+                breaker.record_success()
+                self._count(name, "successes")
+                self._local.backend = name
+                return output
+        self._local.backend = None
+        if last_error is None:
+            raise Exception("All LLM backends are unavailable (circuit breakers open)")
+        raise last_error
+
+    def metrics(self) -> dict:
+        with self._lock:
+            metrics = {name: dict(values) for name, values in self._metrics.items()}
+        for name, breaker in self.breakers.items():
+            metrics[name]["breaker"] = breaker.state
+        return metrics
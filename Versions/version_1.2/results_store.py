@@ -0,0 +1,307 @@
+# results_store.py
+#
+# Queryable store for review results (SQLite), replacing the per-PR
+# iterative_results_pr{n}_{timestamp}.json / review_pr{n}_{prompt}.txt files and the
+# per-prompt review_{prompt}_PR{n}.md files of run_all.
+#
+#  - one row per review: source (iterative / accuracy), run, PR (+ head SHA), prompt, language,
+#    scores, features / heuristics / meta-evaluation (JSON) and the review text and raw
+#    judge answer (zlib-compressed)
+#  - indexes on PR, prompt, score and language
+#  - queries: results(...) with filters, prompt_scores(...), best_prompt_by_language()
+#  - snapshots: the last review of each (PR, prompt) with its hunk hashes, for
+#    incremental re-review (incremental.py)
+#  - migrate_files(): imports the old result files (idempotent, keyed by file name);
+#    get_store() runs it once when it creates the database
+#
+# Run: python results_store.py [migrate [log_dir] [--remove] | best]
+#
+# Settings (environment): RESULTS_DB (default results.sqlite3).
+
+import csv
+import glob
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from datetime import datetime
+from typing import Optional
+
+RESULTS_DB = os.getenv("RESULTS_DB", "results.sqlite3")
+COMPRESS_LEVEL = 6
+
+_COLUMNS = ("id", "source", "run_id", "created", "repo", "pr_number", "head_sha", "prompt", "language",
+            "score", "heur_score", "meta_score", "time_s", "propensity", "features", "heuristics",
+            "meta", "extra")
+_JSON_COLUMNS = ("features", "heuristics", "meta", "extra")
+
+
+def _pack(text: Optional[str]) -> Optional[bytes]:
+    return None if text is None else zlib.compress(text.encode("utf-8"), COMPRESS_LEVEL)
+
+
+def _unpack(blob: Optional[bytes]) -> Optional[str]:
+    return None if blob is None else zlib.decompress(blob).decode("utf-8")
+
+
+def language_from_features(features: Optional[dict]) -> str:
+    """Coarse fallback when only the selector features are known (old logs)"""
+    features = features or {}
+    for flag, language in (("is_python", "python"), ("is_js", "javascript"), ("is_java", "java")):
+        if features.get(flag):
+            return language
+    return "unknown"
+
+
+class ResultsStore:
+    def __init__(self, path: str = RESULTS_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " id INTEGER PRIMARY KEY, source TEXT NOT NULL, run_id TEXT, created REAL NOT NULL,"
+                " repo TEXT, pr_number INTEGER, head_sha TEXT, prompt TEXT NOT NULL, language TEXT,"
+                " score REAL, heur_score REAL, meta_score REAL, time_s REAL, propensity REAL,"
+                " features TEXT, heuristics TEXT, meta TEXT, extra TEXT,"
+                " review BLOB, meta_raw BLOB, legacy_file TEXT UNIQUE)")
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(results)")}
+            if "head_sha" not in columns:  # databases created before head SHAs were recorded
+                self._db.execute("ALTER TABLE results ADD COLUMN head_sha TEXT")
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_results_pr ON results(pr_number)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_results_prompt ON results(prompt)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_results_score ON results(score)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_results_language ON results(language, prompt)")
+            # last review of each (PR, prompt) with its per-hunk content hashes (incremental.py)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots ("
+                " repo TEXT NOT NULL, pr_number INTEGER NOT NULL, prompt TEXT NOT NULL, head_sha TEXT,"
+                " hunk_hashes TEXT NOT NULL, review BLOB NOT NULL, created REAL NOT NULL,"
+                " PRIMARY KEY (repo, pr_number, prompt))")
+
+    # -------------------------
+    # Writing
+    # -------------------------
+    def add_result(self, source: str, pr_number, prompt: str, review: Optional[str], score, *,
+                   run_id=None, repo=None, head_sha=None, language=None, heur_score=None, meta_score=None,
+                   time_s=None, propensity=None, features=None, heuristics=None, meta=None,
+                   meta_raw=None, extra=None, created=None, legacy_file=None) -> Optional[int]:
+        """Store one review; returns its id (None if `legacy_file` was already imported)"""
+        row = (source, run_id, created if created is not None else time.time(), repo, pr_number, head_sha, prompt,
+               language, score, heur_score, meta_score, time_s, propensity,
+               *(None if value is None else json.dumps(value) for value in (features, heuristics, meta, extra)),
+               _pack(review), _pack(meta_raw), legacy_file)
+        with self._lock, self._db:
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO results(source, run_id, created, repo, pr_number, head_sha, prompt, language,"
+                " score, heur_score, meta_score, time_s, propensity, features, heuristics, meta, extra,"
+                " review, meta_raw, legacy_file) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                row)
+            return cursor.lastrowid if cursor.rowcount else None
+
+    # -------------------------
+    # Queries
+    # -------------------------
+    @staticmethod
+    def _where(source=None, pr_number=None, prompt=None, language=None, min_score=None, run_id=None,
+               head_sha=None):
+        clauses, params = [], []
+        for column, value in (("source", source), ("pr_number", pr_number), ("prompt", prompt),
+                              ("language", language), ("run_id", run_id), ("head_sha", head_sha)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if min_score is not None:
+            clauses.append("score >= ?")
+            params.append(min_score)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def results(self, source=None, pr_number=None, prompt=None, language=None, min_score=None,
+                run_id=None, head_sha=None, with_review: bool = False, order_by: str = "created", limit=None):
+        """Result rows as dicts (JSON columns decoded), oldest first by default"""
+        if order_by not in ("created", "score", "pr_number"):
+            raise ValueError(f"Cannot order results by '{order_by}'")
+        where, params = self._where(source, pr_number, prompt, language, min_score, run_id, head_sha)
+        columns = _COLUMNS + (("review", "meta_raw") if with_review else ())
+        sql = f"SELECT {', '.join(columns)} FROM results{where} ORDER BY {order_by}" + (" DESC" if order_by == "score" else "")
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        with self._lock:
+            rows = self._db.execute(sql, params).fetchall()
+        results = []
+        for row in rows:
+            result = dict(zip(columns, row))
+            for key in _JSON_COLUMNS:
+                if result[key] is not None:
+                    result[key] = json.loads(result[key])
+            if with_review:
+                result["review"] = _unpack(result["review"])
+                result["meta_raw"] = _unpack(result["meta_raw"])
+            results.append(result)
+        return results
+
+    def review(self, result_id: int) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT review FROM results WHERE id = ?", (result_id,)).fetchone()
+        return _unpack(row[0]) if row else None
+
+    def prompt_scores(self, language=None, source=None):
+        """[{prompt, mean_score, best_score, count}] best first, over scored reviews"""
+        where, params = self._where(source=source, language=language)
+        where += (" AND" if where else " WHERE") + " score IS NOT NULL"
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT prompt, AVG(score), MAX(score), COUNT(*) FROM results{where}"
+                " GROUP BY prompt ORDER BY AVG(score) DESC", params).fetchall()
+        return [{"prompt": p, "mean_score": round(mean, 2), "best_score": best, "count": n}
+                for p, mean, best, n in rows]
+
+    def best_prompt_by_language(self, source=None, min_count: int = 1) -> dict:
+        """{language: {prompt, mean_score, count}} - the prompt with the highest mean score"""
+        where, params = self._where(source=source)
+        where += (" AND" if where else " WHERE") + " score IS NOT NULL"
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT COALESCE(language, 'unknown'), prompt, AVG(score), COUNT(*) FROM results{where}"
+                " GROUP BY 1, prompt HAVING COUNT(*) >= ?", params + [min_count]).fetchall()
+        best = {}
+        for language, prompt, mean, count in rows:
+            if language not in best or mean > best[language]["mean_score"]:
+                best[language] = {"prompt": prompt, "mean_score": round(mean, 2), "count": count}
+        return dict(sorted(best.items()))
+
+    # -------------------------
+    # Review snapshots (incremental re-review)
+    # -------------------------
+    def save_snapshot(self, repo: str, pr_number, prompt: str, head_sha, hunk_hashes, review: str):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO snapshots(repo, pr_number, prompt, head_sha, hunk_hashes, review, created)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (repo, pr_number, prompt, head_sha, json.dumps(list(hunk_hashes)), _pack(review), time.time()))
+
+    def snapshot(self, repo: str, pr_number, prompt: str) -> Optional[dict]:
+        """{head_sha, hunk_hashes, review, created} of the last review of this PR with this prompt"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT head_sha, hunk_hashes, review, created FROM snapshots"
+                " WHERE repo = ? AND pr_number = ? AND prompt = ?", (repo, pr_number, prompt)).fetchone()
+        if row is None:
+            return None
+        return {"head_sha": row[0], "hunk_hashes": json.loads(row[1]), "review": _unpack(row[2]), "created": row[3]}
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, prs, size = self._db.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT pr_number), COALESCE(SUM(LENGTH(review)), 0) FROM results").fetchone()
+        return {"results": count, "prs": prs, "compressed_review_bytes": size}
+
+    # -------------------------
+    # Migration of the old per-PR files
+    # -------------------------
+    def migrate_files(self, log_dir: str = ".", remove: bool = False) -> int:
+        """Import iterative_results_pr*_*.json (+ review_pr*.txt) and run_all's
+        review_reports_all_prompts_PR*.csv (+ review_*_PR*.md); returns rows added"""
+        added = 0
+        imported = set()
+        results = []
+        for path in sorted(glob.glob(os.path.join(log_dir, "iterative_results_pr*_*.json"))):
+            with open(path, encoding="utf-8") as f:
+                result = json.load(f)
+            try:
+                created = datetime.strptime(result["timestamp"], "%Y%m%d_%H%M%S").timestamp()
+            except (KeyError, ValueError):
+                created = os.path.getmtime(path)
+            review_path = os.path.join(
+                log_dir, f"review_pr{result['pr_number']}_{result['selected_prompt'].replace(' ', '_')}.txt")
+            results.append((created, path, result, review_path))
+        # save_results overwrote review_pr{n}_{prompt}.txt on every run, so it only holds the
+        # review of the newest result for that PR and prompt
+        newest = {}
+        for created, path, _, review_path in results:
+            newest[review_path] = max(newest.get(review_path, (created, path)), (created, path))
+
+        for created, path, result, review_path in results:
+            review = None
+            if newest[review_path] == (created, path) and os.path.exists(review_path):
+                with open(review_path, encoding="utf-8") as f:
+                    review = f.read()
+                imported.add(review_path)
+            extra = {"training_data_size": result.get("training_data_size"), "model_trained": result.get("model_trained")}
+            if self.add_result("iterative", result["pr_number"], result["selected_prompt"], review,
+                               result.get("review_score"), run_id="legacy", created=created,
+                               language=language_from_features(result.get("features")),
+                               propensity=result.get("propensity"), features=result.get("features"),
+                               heuristics=result.get("heuristics"), meta=result.get("meta_evaluation"),
+                               extra=extra, legacy_file=os.path.basename(path)) is not None:
+                added += 1
+            imported.add(path)
+
+        for path in sorted(glob.glob(os.path.join(log_dir, "review_reports_all_prompts_PR*.csv"))):
+            pr_number = int(os.path.basename(path)[len("review_reports_all_prompts_PR"):-len(".csv")])
+            created = os.path.getmtime(path)
+            with open(path, newline="", encoding="utf-8") as f:
+                rows = list(csv.DictReader(f))
+            for row in rows:
+                review, meta_raw = None, None
+                md_path = os.path.join(log_dir, f"review_{row['prompt'].replace('/', '_')}_PR{pr_number}.md")
+                if os.path.exists(md_path):
+                    with open(md_path, encoding="utf-8") as f:
+                        text = f.read()
+                    body, _, meta_raw = text.partition("\n\n-- meta_raw:\n")
+                    review = body.split("\n\n", 1)[1] if "\n\n" in body else body
+                    imported.add(md_path)
+                if self.add_result("accuracy", pr_number, row["prompt"], review, _number(row.get("final_score")),
+                                   run_id="legacy", created=created, heur_score=_number(row.get("heur_score")),
+                                   meta_score=_number(row.get("meta_score")), time_s=_number(row.get("time_s")),
+                                   meta_raw=meta_raw or None,
+                                   legacy_file=f"{os.path.basename(path)}#{row['prompt']}") is not None:
+                    added += 1
+
+        if remove:
+            for path in sorted(imported):
+                os.remove(path)
+        return added
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+_default_store = None
+_default_lock = threading.Lock()
+
+def get_store() -> ResultsStore:
+    """Process-wide store; a new database first imports the old result files next to it"""
+    global _default_store
+    with _default_lock:
+        if _default_store is None:
+            created = not os.path.exists(RESULTS_DB)
+            _default_store = ResultsStore(RESULTS_DB)
+            if created:
+                added = _default_store.migrate_files(os.path.dirname(os.path.abspath(RESULTS_DB)))
+                if added:
+                    print(f"Imported {added} results from the old result files into {RESULTS_DB}")
+        return _default_store
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "best"
+    store = get_store()
+    if command == "migrate":
+        args = [arg for arg in sys.argv[2:] if arg != "--remove"]
+        added = store.migrate_files(args[0] if args else ".", remove="--remove" in sys.argv)
+        print(f"Imported {added} results into {store.path}")
+    print(f"Results store: {store.stats()}")
+    print("Best prompt per language:")
+    for language, best in store.best_prompt_by_language().items():
+        print(f"  {language:12} {best['prompt']:18} mean {best['mean_score']:5.2f} over {best['count']}")
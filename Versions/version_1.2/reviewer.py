@@ -1,57 +1,107 @@
 # reviewer.py
 #
 # Responsible for:
-#  - Fetching PR diff from GitHub
+#  - Fetching PR diff from GitHub (via github_client), or from a local clone with
+#    DIFF_SOURCE=git (git_diff.py)
+#  - Fetching the PR files listing (per-file additions / deletions, no diff text) from
+#    the same source: GraphQL (pr_metadata.py) or `git diff --numstat`
 #  - Posting review comments (if permitted)
-#  - LLM initialization
+#  - LLM initialization (backends come from llm_backends, chains go through
+#    build_chain, cached by llm_cache)
+#  - Resilient invocation: retries + circuit breaker on the primary backend, falling
+#    back to the secondary one (resilience.py); LLM_FALLBACK_BACKEND=none disables it
+#  - JSON-mode chains (build_chain(prompt, json_mode=True)) for prompts that must answer
+#    with JSON, on backends that support it (LLM_JSON_MODE=0 disables it)
 #
 # Note: posting can fail due to permissions; prompt_tester gracefully handles this.
 
-import requests
+import os
 from langchain.schema.output_parser import StrOutputParser
-from langchain_groq import ChatGroq
-from config import GITHUB_TOKEN, OWNER, REPO, PR_NUMBER, GROQ_API_KEY
+from config import GITHUB_TOKEN, OWNER, REPO, PR_NUMBER
+from github_client import get_client
+from git_diff import get_git_source
+from pr_metadata import fetch_pr_files as fetch_github_pr_files
+from llm_backends import get_backends, get_json_llms
+from llm_cache import CachedChain, get_cache, llm_signature
+from resilience import ResilientLLM
+from langchain_core.runnables import RunnableLambda
 from typing import Optional
 
 # ------------------------------
 # GitHub helpers
 # ------------------------------
-def fetch_pr_diff(owner: str, repo: str, pr_number: int, token: str) -> str:
-    url = f"https://api.github.com/repos/{owner}/{repo}/pulls/{pr_number}"
-    headers = {"Authorization": f"token {token}"}
-    response = requests.get(url, headers=headers)
-    if response.status_code != 200:
-        raise Exception(f"GitHub API Error: {response.json()}")
-    pr_data = response.json()
-    diff_url = pr_data.get("diff_url")
-    if not diff_url:
-        raise Exception("No diff_url found in PR data.")
-    diff_resp = requests.get(diff_url, headers=headers)
-    if diff_resp.status_code != 200:
-        raise Exception(f"Failed to fetch diff from diff_url: {diff_resp.status_code}")
-    return diff_resp.text
+# where PR diffs come from: "github" (REST API) or "git" (local clone, see git_diff.py)
+DIFF_SOURCE = os.getenv("DIFF_SOURCE", "github")
+
+def get_diff_source():
+    if DIFF_SOURCE == "git":
+        return get_git_source()
+    if DIFF_SOURCE != "github":
+        raise ValueError(f"Unknown DIFF_SOURCE '{DIFF_SOURCE}' (choose from: github, git)")
+    return get_client()
+
+def fetch_pr_diff(owner: str, repo: str, pr_number: int, token: str, max_chars: Optional[int] = None) -> str:
+    # GitHub: single conditional request through the shared pooled client (see github_client.py);
+    # max_chars: only the first whole files up to that size (streamed, the rest is never read)
+    return get_diff_source().get_pr_diff(owner, repo, pr_number, token, max_chars=max_chars)
+
+def fetch_pr_files(owner: str, repo: str, pr_number: int, token: str):
+    """Files listing of a PR (pr_metadata.PRFile records) without downloading the diff"""
+    if DIFF_SOURCE == "github":
+        return fetch_github_pr_files(owner, repo, pr_number, token)
+    return get_diff_source().get_pr_files(owner, repo, pr_number, token)
+
+def fetch_pr_head_sha(owner: str, repo: str, pr_number: int, token: str) -> str:
+    return get_diff_source().get_pr_head_sha(owner, repo, pr_number, token)
 
 def post_review_comment(owner: str, repo: str, pr_number: int, token: str, review_body: str) -> dict:
-    url = f"https://api.github.com/repos/{owner}/{repo}/issues/{pr_number}/comments"
-    headers = {"Authorization": f"token {token}", "Accept": "application/vnd.github+json"}
-    payload = {"body": review_body}
-    response = requests.post(url, headers=headers, json=payload)
-    if response.status_code not in (200, 201):
-        raise Exception(f"❌ Failed to post comment: {response.json()}")
-    return response.json()
+    try:
+        return get_client().post_json(f"/repos/{owner}/{repo}/issues/{pr_number}/comments",
+                                      {"body": review_body}, token)
+    except Exception as e:
+        raise Exception(f"❌ Failed to post comment: {e}")
 
 # ------------------------------
 # LLM initialization
 # ------------------------------
-llm = ChatGroq(
-    model="llama-3.3-70b-versatile",
-    temperature=0.25,
-    api_key=GROQ_API_KEY,
-)
+# primary (+ fallback) backend, chosen with LLM_BACKEND / LLM_FALLBACK_BACKEND
+backends = get_backends()
+llm = backends[0][1]
 
 # simple parser that returns string output
 parser = StrOutputParser()
 
+resilient_llm = ResilientLLM(backends, json_llms=get_json_llms(backends))
+
+def invoke_llm(messages, json_mode: bool = False):
+    """Call the LLM with retries, circuit breaking and fallback (see resilience.py)"""
+    return resilient_llm.invoke(messages, json_mode=json_mode)
+
+def llm_metrics() -> dict:
+    """Per-backend call / failure / fallback counters"""
+    return resilient_llm.metrics()
+
+def build_chain(prompt, json_mode: bool = False):
+    """Single place where prompt chains are assembled (prompt -> llm -> string).
+
+    json_mode=True asks the provider for a JSON-only answer where it supports that; the
+    prompt must still ask for JSON (and for an object - JSON mode rejects bare arrays).
+    """
+    if json_mode:
+        model_chain = RunnableLambda(lambda messages: invoke_llm(messages, json_mode=True)) | parser
+    else:
+        model_chain = RunnableLambda(invoke_llm) | parser
+    cache = get_cache()
+    if cache is None:
+        return prompt | model_chain
+    # identical prompt + model + sampling params are answered from the on-disk cache;
+    # answers from a fallback backend are not stored under the primary model's key
+    signature = llm_signature(llm)
+    if json_mode and backends[0][0] in resilient_llm.json_llms:
+        signature["params"]["json_mode"] = True
+    return CachedChain(prompt, model_chain, signature, cache,
+                       cacheable=resilient_llm.served_by_primary)
+
 # ------------------------------
 # Utility: safe save
 # ------------------------------
@@ -0,0 +1,115 @@
+# scoring.py
+#
+# Review scoring engine: meta-evaluation fields + heuristics -> 0-10 scores, computed on
+# columnar NumPy arrays so a whole corpus is (re-)scored in one shot.
+#
+# Live scoring (accuracy_checker.meta_to_score / heuristics_to_score, the iterative
+# selector's evaluate_review) goes through the same functions with one row, so live and
+# offline scores can't drift apart.
+#
+# Weights are plain dicts (see DEFAULT_WEIGHTS); pass a modified copy to re-score
+# historical results under a new weighting.
+
+import copy
+import numpy as np
+
+META_FIELDS = ("clarity", "usefulness", "depth", "actionability", "positivity")
+NEUTRAL_META = 5.0  # stands in for a missing / non-numeric meta field
+
+DEFAULT_WEIGHTS = {
+    "meta": {"clarity": 0.18, "usefulness": 0.28, "depth": 0.2, "actionability": 0.24, "positivity": 0.1},
+    "heuristics": {"sections": 0.45, "bullets": 0.25, "length": 0.25, "mentions_bug": 0.1, "mentions_suggest": 0.1},
+    "final": {"meta": 0.7, "heuristics": 0.3},
+    "bullets_cap": 10,
+    "length_range": (80, 800),
+    "length_decay_words": 2000,
+}
+
+
+def weights_with(**overrides) -> dict:
+    """DEFAULT_WEIGHTS with some groups replaced, e.g. weights_with(final={"meta": 0.5, "heuristics": 0.5})"""
+    weights = copy.deepcopy(DEFAULT_WEIGHTS)
+    for key, value in overrides.items():
+        if isinstance(value, dict):
+            weights[key].update(value)
+        else:
+            weights[key] = value
+    return weights
+
+
+# -------------------------
+# Columnar inputs
+# -------------------------
+def meta_columns(metas) -> np.ndarray:
+    """(n, 5) float matrix from meta-evaluation dicts; NaN marks a missing field,
+    and a whole NaN row marks a failed evaluation (not a dict, or has "error")"""
+    matrix = np.full((len(metas), len(META_FIELDS)), np.nan)
+    for i, meta in enumerate(metas):
+        if not isinstance(meta, dict) or "error" in meta:
+            continue
+        matrix[i] = [meta[k] if isinstance(meta.get(k), (int, float)) else NEUTRAL_META for k in META_FIELDS]
+    return matrix
+
+
+def heuristic_columns(heurs) -> dict:
+    """Columns in the layout of review_heuristics.heuristic_metrics_batch(columnar=True)"""
+    n = len(heurs)
+    columns = {
+        "length_words": np.array([h.get("length_words", 0) for h in heurs], dtype=np.float64).reshape(n),
+        "bullet_points": np.array([h.get("bullet_points", 0) for h in heurs], dtype=np.float64).reshape(n),
+        "mentions_bug": np.array([bool(h.get("mentions_bug")) for h in heurs], dtype=bool).reshape(n),
+        "mentions_suggest": np.array([bool(h.get("mentions_suggest")) for h in heurs], dtype=bool).reshape(n),
+    }
+    # fraction of sections found; a review with no section info at all counts as 0
+    columns["section_fraction"] = np.array(
+        [sum(1 for v in h.get("sections_presence", {}).values() if v) / max(1, len(h.get("sections_presence", {})))
+         for h in heurs], dtype=np.float64).reshape(n)
+    return columns
+
+
+# -------------------------
+# Scores
+# -------------------------
+def meta_scores(meta_matrix, weights: dict = DEFAULT_WEIGHTS) -> np.ndarray:
+    """Weighted average of the meta fields (0-10); NaN where the evaluation failed"""
+    meta_matrix = np.asarray(meta_matrix, dtype=np.float64)
+    w = np.array([weights["meta"][k] for k in META_FIELDS])
+    failed = np.isnan(meta_matrix).all(axis=1)
+    scores = np.where(np.isnan(meta_matrix), NEUTRAL_META, meta_matrix) @ w
+    return np.where(failed, np.nan, np.round(scores, 2))
+
+
+def heuristic_scores(columns: dict, weights: dict = DEFAULT_WEIGHTS) -> np.ndarray:
+    """0-10 heuristics score: sections found, bullets, length in range, bug/suggestion mentions"""
+    w = weights["heuristics"]
+    if "section_fraction" in columns:
+        sec_frac = np.asarray(columns["section_fraction"], dtype=np.float64)
+    else:
+        sections = np.asarray(columns["sections"], dtype=np.float64)
+        sec_frac = sections.mean(axis=1) if sections.shape[1] else np.zeros(len(sections))
+    bullets_score = np.minimum(np.asarray(columns["bullet_points"], dtype=np.float64), weights["bullets_cap"]) / weights["bullets_cap"]
+    # length: full score inside the range, linear decay below, gentle decay above
+    words = np.asarray(columns["length_words"], dtype=np.float64)
+    low, high = weights["length_range"]
+    length_score = np.where(words < low, np.maximum(0.0, words / low),
+                            np.where(words <= high, 1.0, np.maximum(0.0, 1.0 - (words - high) / weights["length_decay_words"])))
+    mix = (w["sections"] * sec_frac + w["bullets"] * bullets_score + w["length"] * length_score
+           + w["mentions_bug"] * np.asarray(columns["mentions_bug"], dtype=np.float64)
+           + w["mentions_suggest"] * np.asarray(columns["mentions_suggest"], dtype=np.float64))
+    return np.round(np.clip(mix, 0.0, 1.0) * 10, 2)
+
+
+def final_scores(meta, heur, weights: dict = DEFAULT_WEIGHTS) -> np.ndarray:
+    """Blend of meta and heuristics scores; heuristics alone where the meta score is NaN"""
+    meta = np.asarray(meta, dtype=np.float64)
+    heur = np.asarray(heur, dtype=np.float64)
+    w = weights["final"]
+    blended = w["meta"] * np.where(np.isnan(meta), 0.0, meta) + w["heuristics"] * heur
+    return np.round(np.where(np.isnan(meta), heur, blended), 2)
+
+
+def score_reviews(metas, heurs, weights: dict = DEFAULT_WEIGHTS):
+    """(meta, heuristics, final) score arrays for parallel lists of meta dicts and heuristics dicts"""
+    meta = meta_scores(meta_columns(metas), weights)
+    heur = heuristic_scores(heuristic_columns(heurs), weights)
+    return meta, heur, final_scores(meta, heur, weights)
@@ -0,0 +1,104 @@
+# selector_engine.py
+#
+# Online contextual bandit (disjoint LinUCB) behind IterativePromptSelector.
+#
+# Every prompt ("arm") keeps a ridge regression of review score on the PR feature
+# vector. Selection takes the arm with the highest upper confidence bound
+#     theta_a . x + alpha * sqrt(x' A_a^-1 x)
+# so prompts that have been tried rarely (or never on PRs like this one) still get
+# explored, and well-measured good prompts get exploited.
+#
+# Updates are Sherman-Morrison rank-one updates of A_a^-1: O(d^2) per reviewed PR,
+# independent of how many PRs came before (no refit over the history).
+
+import numpy as np
+
+ALPHA = 1.0      # exploration strength (rewards are scores / 10, i.e. in [0, 1])
+RIDGE = 1.0      # prior precision of every arm's regression
+
+
+def transform_features(features_vector) -> np.ndarray:
+    """Compress raw counts (lines, additions, ...) with a signed log1p and add a bias term.
+
+    Works on a single vector (d,) or a matrix of vectors (n, d).
+    """
+    x = np.asarray(features_vector, dtype=np.float64)
+    x = np.sign(x) * np.log1p(np.abs(x))
+    bias = np.ones(x.shape[:-1] + (1,))
+    return np.concatenate([x, bias], axis=-1)
+
+
+class LinUCBEngine:
+    def __init__(self, n_arms: int, n_features: int, alpha: float = ALPHA, ridge: float = RIDGE):
+        self.n_arms = n_arms
+        self.dim = n_features + 1  # + bias
+        self.alpha = alpha
+        self.ridge = ridge
+        self.A_inv = np.repeat(np.eye(self.dim)[None, :, :] / ridge, n_arms, axis=0)  # (arms, d, d)
+        self.b = np.zeros((n_arms, self.dim))
+        self.theta = np.zeros((n_arms, self.dim))
+        self.counts = np.zeros(n_arms, dtype=np.int64)
+
+    @property
+    def n_updates(self) -> int:
+        return int(self.counts.sum())
+
+    def scores(self, features_vector):
+        """(expected reward, confidence width) per arm for one raw feature vector"""
+        x = transform_features(features_vector)
+        mean = self.theta @ x
+        width = np.sqrt(np.einsum("i,aij,j->a", x, self.A_inv, x))
+        return mean, width
+
+    def select(self, features_vector) -> int:
+        mean, width = self.scores(features_vector)
+        return int(np.argmax(mean + self.alpha * width))
+
+    def select_batch(self, feature_matrix) -> np.ndarray:
+        """Arm per row of an (n, d) raw feature matrix, rows chosen in order.
+
+        Rewards of the batch are not known yet, so the means stay as they are; but every
+        choice applies the reward-free covariance update of its arm (on a copy) before
+        the next row is scored. A prompt picked for a PR therefore looks less uncertain
+        for the similar PRs after it, and exploration spreads over the prompts instead of
+        every row of a batch taking the same arm.
+        """
+        X = transform_features(np.atleast_2d(feature_matrix))
+        mean = X @ self.theta.T                                              # (n, arms)
+        A_inv = self.A_inv.copy()
+        width = np.sqrt(np.einsum("ni,aij,nj->na", X, A_inv, X))           # (n, arms)
+        arms = np.empty(len(X), dtype=np.int64)
+        for i, x in enumerate(X):
+            arm = int(np.argmax(mean[i] + self.alpha * width[i]))
+            arms[i] = arm
+            Ax = A_inv[arm] @ x
+            A_inv[arm] -= np.outer(Ax, Ax) / (1.0 + x @ Ax)
+            rest = X[i + 1:]
+            width[i + 1:, arm] = np.sqrt(np.maximum(np.einsum("ni,ij,nj->n", rest, A_inv[arm], rest), 0.0))
+        return arms
+
+    def update(self, features_vector, arm: int, reward: float):
+        x = transform_features(features_vector)
+        A_inv = self.A_inv[arm]
+        Ax = A_inv @ x
+        A_inv -= np.outer(Ax, Ax) / (1.0 + x @ Ax)
+        self.b[arm] += reward * x
+        self.theta[arm] = A_inv @ self.b[arm]
+        self.counts[arm] += 1
+
+    def to_arrays(self, prefix: str = "engine_") -> dict:
+        return {
+            f"{prefix}A_inv": self.A_inv, f"{prefix}b": self.b, f"{prefix}theta": self.theta,
+            f"{prefix}counts": self.counts, f"{prefix}params": np.array([self.alpha, self.ridge]),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, prefix: str = "engine_") -> "LinUCBEngine":
+        alpha, ridge = (float(v) for v in arrays[f"{prefix}params"])
+        n_arms, dim = arrays[f"{prefix}b"].shape
+        engine = cls(n_arms, dim - 1, alpha=alpha, ridge=ridge)
+        engine.A_inv = np.array(arrays[f"{prefix}A_inv"], dtype=np.float64)
+        engine.b = np.array(arrays[f"{prefix}b"], dtype=np.float64)
+        engine.theta = np.array(arrays[f"{prefix}theta"], dtype=np.float64)
+        engine.counts = np.array(arrays[f"{prefix}counts"], dtype=np.int64)
+        return engine
@@ -0,0 +1,63 @@
+# test_pr_metadata.py
+#
+# pr_metadata against the stub GitHub server of bench_pr_metadata.py (no network).
+# Run: python -m pytest -q test_pr_metadata.py
+
+import pytest
+import bench_pr_metadata as stub
+from github_client import GitHubClient
+from pr_metadata import PAGE_SIZE, PRMeta, fetch_open_prs, fetch_prs, pr_queue
+
+
+@pytest.fixture(scope="module")
+def client():
+    server, api_url = stub.start_stub()
+    yield GitHubClient(api_url=api_url, cache_dir=None)
+    server.shutdown()
+
+
+def requests_made(client, fn):
+    before = client.stats["requests"]
+    result = fn()
+    return result, client.stats["requests"] - before
+
+
+def test_fetch_open_prs_follows_cursor_pages(client):
+    records, requests = requests_made(client, lambda: fetch_open_prs("o", "r", client=client))
+    assert requests == -(-stub.N_PRS // PAGE_SIZE)
+    assert [r.number for r in records] == [pr["number"] for pr in stub.ORDERED]
+    assert all(r.head_sha == stub.PRS[r.number]["headRefOid"] for r in records)
+
+
+def test_fetch_open_prs_limit_stops_paging(client):
+    records, requests = requests_made(client, lambda: fetch_open_prs("o", "r", limit=150, client=client))
+    assert len(records) == 150
+    assert requests == 2
+
+
+def test_fetch_prs_leaves_out_missing_pr_and_keeps_batch(client):
+    missing = stub.N_PRS + 1
+    records, requests = requests_made(client, lambda: fetch_prs("o", "r", [3, missing, 1, 3], client=client))
+    assert [r.number for r in records] == [3, 1]
+    assert requests == 1
+
+
+def test_fetch_prs_batches_by_page_size(client):
+    numbers = list(stub.PRS)[:PAGE_SIZE + 1]
+    records, requests = requests_made(client, lambda: fetch_prs("o", "r", numbers, client=client))
+    assert [r.number for r in records] == numbers
+    assert requests == 2
+
+
+def test_pr_queue_filters_and_orders():
+    records = [PRMeta(stub.make_pr(n)) for n in range(1, 41)]
+    done = {1: records[0].head_sha, 2: "an older sha"}
+    numbers, head_shas = pr_queue(records, is_done=lambda n, sha: done.get(n) == sha,
+                                  exclude_labels=("bug",), max_changes=200)
+    kept = [r for r in records
+            if not r.is_draft and "bug" not in r.labels and r.additions + r.deletions <= 200 and r.number != 1]
+    assert sorted(numbers) == sorted(r.number for r in kept)
+    assert 2 in numbers and 10 not in numbers and 4 not in numbers and 21 not in numbers
+    updated = [stub.PRS[n]["updatedAt"] for n in numbers]
+    assert updated == sorted(updated, reverse=True)
+    assert head_shas == {r.number: r.head_sha for r in kept}
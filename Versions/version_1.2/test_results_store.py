@@ -0,0 +1,34 @@
+# test_results_store.py
+#
+# ResultsStore.migrate_files on a temporary directory of old per-PR result files.
+# Run: python -m pytest -q test_results_store.py
+
+import json
+import os
+from results_store import ResultsStore
+
+
+def write_result(log_dir, timestamp, score):
+    path = os.path.join(log_dir, f"iterative_results_pr5_{timestamp}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"pr_number": 5, "selected_prompt": "Zero-shot", "review_score": score,
+                   "timestamp": timestamp}, f)
+    return path
+
+
+def test_review_text_goes_to_newest_result_and_files_are_removed_once(tmp_path):
+    log_dir = str(tmp_path / "logs")
+    os.mkdir(log_dir)
+    write_result(log_dir, "20250920_160430", 8.0)
+    write_result(log_dir, "20250920_155242", 6.0)
+    with open(os.path.join(log_dir, "review_pr5_Zero-shot.txt"), "w", encoding="utf-8") as f:
+        f.write("latest review")
+
+    store = ResultsStore(str(tmp_path / "results.sqlite3"))
+    assert store.migrate_files(log_dir, remove=True) == 2
+
+    rows = store.results(pr_number=5, with_review=True)
+    assert {row["score"]: row["review"] for row in rows} == {6.0: None, 8.0: "latest review"}
+    assert os.listdir(log_dir) == []
+    # already imported: nothing added on a second run
+    assert store.migrate_files(log_dir) == 0
@@ -1,9 +1,13 @@
 import requests
 import os
+import re
+import time
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from langchain.prompts import ChatPromptTemplate
 from langchain.schema.output_parser import StrOutputParser
-from langchain_groq import ChatGroq
+from langchain_core.runnables import RunnableLambda
 
 # 1. Load API Keys
 load_dotenv()
@@ -11,10 +15,8 @@ load_dotenv()
 # GitHub Personal Access Token
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
 
-# Groq API Key
+# Groq API Key (only needed with LLM_BACKEND=groq)
 GROQ_API_KEY = os.getenv("API_KEY")
-if not GROQ_API_KEY:
-    raise ValueError("❌ GROQ_API_KEY not found. Please set it in .env file.")
 
 # 2. GitHub PR Config
 owner = os.getenv("OWNER")
@@ -22,18 +24,22 @@ repo = os.getenv("REPO")
 pr_number = os.getenv("PR_NUMBER")
 
 # 3. Fetch PR Diff from GitHub
+# one pooled session for every call, and the diff media type so the diff comes back
+# in a single request instead of PR JSON -> diff_url
+session = requests.Session()
+
 def fetch_pr_diff(owner, repo, pr_number, token):
     url = f"https://api.github.com/repos/{owner}/{repo}/pulls/{pr_number}"
-    headers = {"Authorization": f"token {token}"}
+    headers = {
+        "Authorization": f"token {token}",
+        "Accept": "application/vnd.github.v3.diff"
+    }
 
-    response = requests.get(url, headers=headers)
+    response = session.get(url, headers=headers)
     if response.status_code != 200:
-        raise Exception(f"GitHub API Error: {response.json()}")
+        raise Exception(f"GitHub API Error: {response.status_code} {response.text[:500]}")
 
-    pr_data = response.json()
-    diff_url = pr_data["diff_url"]
-    diff = requests.get(diff_url, headers=headers).text
-    return diff
+    return response.text
 
 # 4. Post Review Comment to GitHub
 def post_review_comment(owner, repo, pr_number, token, review_body):
@@ -44,19 +50,57 @@ def post_review_comment(owner, repo, pr_number, token, review_body):
     }
 
     payload = {"body": review_body}
-    response = requests.post(url, headers=headers, json=payload)
+    response = session.post(url, headers=headers, json=payload)
 
     if response.status_code not in [200, 201]:
         raise Exception(f"❌ Failed to post comment: {response.json()}")
 
     return response.json()
 
-# 5. Initialize Groq AI Reviewer
-llm = ChatGroq(
-    model="llama-3.3-70b-versatile",
-    temperature=0.3,
-    api_key=GROQ_API_KEY,
-)
+# 5. Initialize the AI Reviewer
+# LLM_BACKEND picks the model: groq (default), ollama (local server, OLLAMA_URL /
+# OLLAMA_MODEL) or fake (offline, deterministic, FAKE_LLM_LATENCY_MS per call) for
+# timing the script without a provider. version_1.1 / 1.2 use llm_backends.py instead.
+LLM_BACKEND = os.getenv("LLM_BACKEND", "groq")
+TEMPERATURE = 0.3
+
+def make_groq_llm():
+    from langchain_groq import ChatGroq
+    if not GROQ_API_KEY:
+        raise ValueError("❌ GROQ_API_KEY not found. Please set it in .env file.")
+    return ChatGroq(model="llama-3.3-70b-versatile", temperature=TEMPERATURE, api_key=GROQ_API_KEY)
+
+def make_ollama_llm():
+    url = os.getenv("OLLAMA_URL", "http://localhost:11434")
+    model = os.getenv("OLLAMA_MODEL", "codellama")
+
+    def chat(prompt_value):
+        messages = [{"role": "system" if m.type == "system" else "user", "content": m.content}
+                    for m in prompt_value.to_messages()]
+        response = session.post(f"{url}/api/chat", json={
+            "model": model, "messages": messages, "stream": False, "options": {"temperature": TEMPERATURE}})
+        if response.status_code != 200:
+            raise Exception(f"Ollama API Error: {response.status_code} {response.text[:500]}")
+        return response.json()["message"]["content"]
+
+    return RunnableLambda(chat)
+
+def make_fake_llm():
+    latency_s = float(os.getenv("FAKE_LLM_LATENCY_MS", "800")) / 1000
+
+    def answer(prompt_value):
+        text = prompt_value.to_string()
+        time.sleep(latency_s)
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:8]
+        return (f"## Summary\n- Reviewed {text.count(chr(10)) + 1} lines of input (fake backend, id {digest}).\n\n"
+                "## Suggestions\n- Add tests for the changed code.")
+
+    return RunnableLambda(answer)
+
+BACKENDS = {"groq": make_groq_llm, "ollama": make_ollama_llm, "fake": make_fake_llm}
+if LLM_BACKEND not in BACKENDS:
+    raise ValueError(f"Unknown LLM backend '{LLM_BACKEND}' (choose from: {', '.join(BACKENDS)})")
+llm = BACKENDS[LLM_BACKEND]()
 
 parser = StrOutputParser()
 
@@ -68,6 +112,42 @@ review_prompt = ChatPromptTemplate.from_messages([
 
 review_chain = review_prompt | llm | parser
 
+# Large diffs are reviewed file by file (map) and the partial reviews merged (reduce),
+# instead of only sending the first 4000 characters.
+MAX_CHUNK_CHARS = 4000
+
+merge_prompt = ChatPromptTemplate.from_messages([
+    ("system", "You are a senior software engineer consolidating a code review."),
+    ("human", "These are reviews of different parts of the same Pull Request:\n\n{reviews}\n\n"
+              "Merge them into ONE review of the whole PR. Merge duplicate findings and keep file names "
+              "and concrete details.")
+])
+
+merge_chain = merge_prompt | llm | parser
+
+def split_diff(diff, max_chars=MAX_CHUNK_CHARS):
+    chunks, current = [], ""
+    for file_diff in re.split(r"^(?=diff --git )", diff, flags=re.MULTILINE):
+        # files bigger than one chunk are cut into max_chars slices
+        for start in range(0, max(len(file_diff), 1), max_chars):
+            piece = file_diff[start:start + max_chars]
+            if current and len(current) + len(piece) > max_chars:
+                chunks.append(current)
+                current = ""
+            current += piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+def review_diff(diff):
+    chunks = split_diff(diff)
+    if len(chunks) <= 1:
+        return review_chain.invoke({"diff": diff})
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        partials = list(pool.map(lambda chunk: review_chain.invoke({"diff": chunk}), chunks))
+    reviews = "\n\n".join(f"### Part {i + 1}\n{text}" for i, text in enumerate(partials))
+    return merge_chain.invoke({"reviews": reviews})
+
 # 6. Main Logic
 if __name__ == "__main__":
     try:
@@ -76,7 +156,7 @@ if __name__ == "__main__":
         print("✅ Diff fetched successfully. Sending to AI reviewer...\n")
 
         # AI Review
-        review = review_chain.invoke({"diff": diff_text[:4000]})
+        review = review_diff(diff_text)
         print("=== AI REVIEW RESULT ===")
         print(review)
         print("========================")